@@ -0,0 +1,482 @@
+"""Batch quote validation over CSV or JSONL files.
+
+Quotes are read, validated and written one at a time, so memory stays flat
+however large the input is.
+
+JSONL input holds one quote per line::
+
+    {"quote_id": "Q1", "product": "Rice Mill",
+     "components": [{"name": "CBA20001 - Battery 5kWh", "quantity": 2}]}
+
+``product`` is either a catalog product name or an object with ``name`` plus
+any of ``voltage``, ``rating``, ``power_watts``, ``price`` and ``weight``.
+Component objects take ``name`` plus any of COMPONENT_FIELDS.
+
+CSV input holds one component line per row. Consecutive rows with the same
+``quote_id`` form one quote; the product columns (``product``,
+``product_voltage``, ``product_rating``, ``product_power_watts``,
+``product_price``, ``product_weight``) are read from the first row. A quote
+without components is a single row with an empty ``component`` column.
+
+A quote that is not valid JSON, refers to something the catalog lacks or has
+a malformed field (a quantity below 1, text where a number belongs) gets a
+result row with only ``quote_id`` and ``error``; the rest of the batch runs on.
+
+Usage::
+
+    python batch.py orders.csv -o results.jsonl
+    python batch.py quote_book.jsonl -o results.jsonl --workers 16 --stats
+    python batch.py quote_book.jsonl -o results.jsonl --vectorized
+
+With ``--workers`` the input is cut into chunks of raw lines (CSV chunks end
+on a quote boundary) that a process pool parses, validates and formats;
+output is merged back in input order with a bounded number of chunks in
+flight, so memory stays flat in parallel mode too.
+
+With ``--vectorized`` each chunk of quotes is validated through
+vectorized.validate_many, which evaluates the arithmetic power rules as NumPy
+array operations; results are identical to the default path.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import load_catalog
+from engine import make_component, make_product, validate_cached
+from vectorized import validate_many
+
+# Optional per-line overrides, in the order they appear as CSV columns
+COMPONENT_FIELDS = (
+    "quantity", "price", "rating", "power_rating", "inverter_capacity",
+    "capacity_ah", "battery_voltage", "charge_c_rating", "discharge_c_rating",
+)
+PRODUCT_FIELDS = ("voltage", "rating", "power_watts", "price", "weight")
+# Fields that take text; rating is a number or a list like "12, 24", the others are numbers
+TEXT_FIELDS = {"voltage": (str,), "rating": (int, float, str)}
+# Bounds on numeric fields, far beyond any real system; larger numbers overflow float arithmetic
+MAX_QUANTITY = 10_000
+MAX_NUMBER = 10 ** 9
+
+RESULT_FIELDS = (
+    "quote_id", "product", "viable", "status_color", "status_message",
+    "total_cost", "total_weight", "messages", "warnings", "error",
+)
+
+
+class QuoteError(ValueError):
+    """A quote refers to something the catalog cannot resolve, or is malformed"""
+
+
+# What building or validating one bad quote can raise; it becomes that quote's error row
+QUOTE_ERRORS = (QuoteError, KeyError, TypeError, ValueError, AttributeError, OverflowError)
+
+
+def check_field(owner, field, value):
+    """Raise QuoteError unless value suits a product or component field"""
+    if field == "quantity":
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= MAX_QUANTITY:
+            raise QuoteError(f"{owner}: quantity must be a whole number from 1 to {MAX_QUANTITY}, not {value!r}")
+    elif not isinstance(value, TEXT_FIELDS.get(field, (int, float))) or isinstance(value, bool):
+        raise QuoteError(f"{owner}: invalid {field} {value!r}")
+    elif isinstance(value, (int, float)) and not -MAX_NUMBER <= value <= MAX_NUMBER:  # also rejects nan and inf
+        raise QuoteError(f"{owner}: {field} out of range: {value!r}")
+
+
+def _number(value):
+    """Parse a CSV cell as int or float; blank cells become None, other text is kept"""
+    if value is None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _csv_quotes(rows):
+    for quote_id, group in itertools.groupby(rows, key=lambda row: row.get("quote_id", "")):
+        first = next(group)
+        product = {"name": first.get("product", "").strip()}
+        for field in PRODUCT_FIELDS:
+            value = _number(first.get(f"product_{field}"))
+            if value is not None:
+                product[field] = value
+        components = []
+        for row in itertools.chain((first,), group):
+            name = (row.get("component") or "").strip()
+            if not name:
+                continue
+            component = {"name": name}
+            for field in COMPONENT_FIELDS:
+                value = _number(row.get(field))
+                if value is not None:
+                    component[field] = value
+            components.append(component)
+        yield {"quote_id": quote_id, "product": product, "components": components}
+
+
+def read_quote_line(line, line_number):
+    """Decoded quote of one JSONL line (quote_id defaults to the line number)
+
+    A line that is not a JSON object gives a stand-in quote whose validation
+    reports the problem as the line's error row.
+    """
+    try:
+        quote = json.loads(line)
+    except (ValueError, RecursionError) as exc:  # RecursionError: nested too deeply
+        return {"quote_id": str(line_number), "error": f"Invalid JSON: {exc}"}
+    if not isinstance(quote, dict):
+        return {"quote_id": str(line_number), "error": "A quote must be a JSON object"}
+    quote.setdefault("quote_id", str(line_number))
+    return quote
+
+
+def _jsonl_quotes(lines, first_line=1):
+    for line_number, line in enumerate(lines, first_line):
+        line = line.strip()
+        if line:
+            yield read_quote_line(line, line_number)
+
+
+def detect_format(path):
+    """Guess "csv" or "jsonl" from a file name"""
+    return "csv" if str(path).lower().endswith(".csv") else "jsonl"
+
+
+def read_quotes(stream, fmt):
+    """Iterate quotes from an open text stream in "csv" or "jsonl" format"""
+    if fmt == "csv":
+        return _csv_quotes(csv.DictReader(stream))
+    if fmt == "jsonl":
+        return _jsonl_quotes(stream)
+    raise ValueError(f"Unknown quote format: {fmt}")
+
+
+def build_product(product, catalog):
+    """product_info dict from a product name or a product object"""
+    if isinstance(product, str):
+        product = {"name": product}
+    if not isinstance(product, dict):
+        raise QuoteError(f"Invalid product: {product!r}")
+    name = product.get("name")
+    if not isinstance(name, str) or name not in catalog.products:
+        raise QuoteError(f"Unknown product: {name}")
+    overrides = {field: product[field] for field in PRODUCT_FIELDS if product.get(field) is not None}
+    for field, value in overrides.items():
+        check_field(name, field, value)
+    return make_product(name, catalog.products[name], **overrides)
+
+
+def build_component(record, catalog):
+    """Component line from a component object, using the same defaults as the UI"""
+    if not isinstance(record, dict):
+        raise QuoteError(f"Invalid component: {record!r}")
+    name = record.get("name")
+    spec = catalog.components.get(name) if isinstance(name, str) else None
+    if spec is None:
+        raise QuoteError(f"Unknown component: {name}")
+
+    options = {field: record[field] for field in COMPONENT_FIELDS if record.get(field) is not None}
+    for field, value in options.items():
+        check_field(name, field, value)
+    capacity = options.pop("inverter_capacity", None)
+    if capacity is not None:
+        choices = [o for o in spec.get("capacity_options", []) if o["capacity"] == capacity]
+        if not choices:
+            raise QuoteError(f"{name} has no {capacity}W capacity option")
+        options["inverter_option"] = choices[0]
+    return make_component(name, spec, **options)
+
+
+def build_configuration(quote, catalog):
+    """(product_info, component lines) for a decoded quote"""
+    if not isinstance(quote, dict):
+        raise QuoteError("A quote must be a JSON object")
+    if "error" in quote:  # an input line read_quotes could not decode
+        raise QuoteError(quote["error"])
+    product_info = build_product(quote.get("product"), catalog)
+    records = quote.get("components", [])
+    if not isinstance(records, list):
+        raise QuoteError("components must be a list")
+    components = [build_component(record, catalog) for record in records]
+    return product_info, components
+
+
+def _result_row(row, product_info, components, result):
+    row.update({
+        "product": product_info["name"],
+        "viable": result.viable,
+        "status_color": result.status_color if components else None,
+        "status_message": result.status_message if components else None,
+        "total_cost": result.total_cost,
+        "total_weight": result.total_weight,
+        "messages": result.messages,
+        "warnings": result.warnings,
+    })
+    return row
+
+
+def quote_id(quote):
+    """A decoded quote's quote_id, or None when it has none (or is not an object)"""
+    return quote.get("quote_id") if isinstance(quote, dict) else None
+
+
+def validate_quote(quote, catalog=None):
+    """Validate one decoded quote and return a JSON-serialisable result row
+
+    A quote that cannot be built or validated gets a row with its error
+    instead, so one bad quote never stops a batch.
+    """
+    catalog = catalog or load_catalog()
+    row = {"quote_id": quote_id(quote)}
+    try:
+        product_info, components = build_configuration(quote, catalog)
+        result = validate_cached(product_info, components)
+    except QUOTE_ERRORS as exc:
+        row["error"] = str(exc)
+        return row
+    return _result_row(row, product_info, components, result)
+
+
+def _validate_vectorized(quotes, catalog, chunk_size):
+    """validate_quotes() in chunks, with Rules 5, 6, 9 and 11 evaluated as array operations"""
+    quotes = iter(quotes)
+    while True:
+        chunk = list(itertools.islice(quotes, chunk_size))
+        if not chunk:
+            return
+        rows = []
+        configurations = []
+        for quote in chunk:
+            row = {"quote_id": quote_id(quote)}
+            try:
+                configuration = build_configuration(quote, catalog)
+            except QUOTE_ERRORS as exc:
+                row["error"] = str(exc)
+                configuration = None
+            else:
+                configurations.append(configuration)
+            rows.append((quote, row, configuration))
+        try:
+            results = iter(validate_many(configurations))
+        except QUOTE_ERRORS:
+            # Some quote in the chunk cannot be validated: fall back to one at a time to find it
+            yield from (validate_quote(quote, catalog) for quote, _, _ in rows)
+            continue
+        for _, row, configuration in rows:
+            if configuration is None:
+                yield row
+            else:
+                yield _result_row(row, *configuration, next(results))
+
+
+def validate_quotes(quotes, catalog=None, vectorized=False, chunk_size=500):
+    """Lazily validate an iterable of quotes, yielding result rows in input order
+
+    With vectorized=True quotes are validated chunk_size at a time through
+    vectorized.validate_many instead of one by one; the rows are identical.
+    """
+    catalog = catalog or load_catalog()
+    if vectorized:
+        yield from _validate_vectorized(quotes, catalog, chunk_size)
+        return
+    for quote in quotes:
+        yield validate_quote(quote, catalog)
+
+
+def write_results(rows, stream, fmt, header=True):
+    """Write result rows to a text stream as "jsonl" or "csv", one row at a time
+
+    Returns the number of rows written.
+    """
+    count = 0
+    if fmt == "jsonl":
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False))
+            stream.write("\n")
+            count += 1
+        return count
+    if fmt != "csv":
+        raise ValueError(f"Unknown result format: {fmt}")
+    writer = csv.DictWriter(stream, fieldnames=RESULT_FIELDS)
+    if header:
+        writer.writeheader()
+    for row in rows:
+        row = dict(row)
+        for key in ("messages", "warnings"):
+            if key in row:
+                row[key] = " | ".join(row[key])
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+# --- Parallel mode ---
+
+class WorkerStats:
+    """Quotes validated and busy time per worker process for one parallel run"""
+
+    def __init__(self):
+        self.workers = {}
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record(self, pid, quotes, busy):
+        totals = self.workers.setdefault(pid, [0, 0.0])
+        totals[0] += quotes
+        totals[1] += busy
+
+    @property
+    def quotes(self):
+        return sum(quotes for quotes, _ in self.workers.values())
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def report(self):
+        """Human-readable throughput summary, one line per worker plus a total"""
+        lines = []
+        for pid, (quotes, busy) in sorted(self.workers.items()):
+            rate = quotes / busy if busy else 0.0
+            lines.append(f"worker {pid}: {quotes} quotes, {busy:.2f}s busy, {rate:.0f} quotes/s")
+        rate = self.quotes / self.elapsed if self.elapsed else 0.0
+        lines.append(f"total: {self.quotes} quotes in {self.elapsed:.2f}s with {len(self.workers)} workers, {rate:.0f} quotes/s")
+        return "\n".join(lines)
+
+
+def _raw_chunks(stream, fmt, chunk_size):
+    """Cut the input into (fieldnames, first_line, records) chunks of about chunk_size quotes
+
+    JSONL records are raw lines; CSV records are lists of cells and a chunk only
+    ends where the quote_id changes, so no quote is split across workers.
+    """
+    if fmt == "jsonl":
+        line_number = 1
+        while True:
+            lines = list(itertools.islice(stream, chunk_size))
+            if not lines:
+                return
+            yield None, line_number, lines
+            line_number += len(lines)
+    if fmt != "csv":
+        raise ValueError(f"Unknown quote format: {fmt}")
+
+    reader = csv.reader(stream)
+    fieldnames = next(reader, None)
+    if fieldnames is None:
+        return
+    key = fieldnames.index("quote_id") if "quote_id" in fieldnames else None
+    records = []
+    quotes = 0
+    previous = object()
+    for record in reader:
+        quote_id = record[key] if key is not None and key < len(record) else ""
+        if quote_id != previous:
+            if quotes >= chunk_size:
+                yield fieldnames, 0, records
+                records = []
+                quotes = 0
+            quotes += 1
+            previous = quote_id
+        records.append(record)
+    if records:
+        yield fieldnames, 0, records
+
+
+def _validate_chunk(input_format, fieldnames, first_line, records, output_format, vectorized=False):
+    """Worker entry point: parse, validate and format one chunk of raw input"""
+    started = time.perf_counter()
+    if input_format == "csv":
+        quotes = _csv_quotes(dict(zip(fieldnames, record)) for record in records)
+    else:
+        quotes = _jsonl_quotes(records, first_line)
+    out = io.StringIO()
+    count = write_results(validate_quotes(quotes, vectorized=vectorized, chunk_size=len(records)),
+                          out, output_format, header=False)
+    return os.getpid(), count, time.perf_counter() - started, out.getvalue()
+
+
+def validate_parallel(source, target, input_format, output_format, workers=None, chunk_size=500, vectorized=False):
+    """Validate a quote stream on a process pool, writing results to target in input order
+
+    At most two chunks per worker are in flight, so memory does not grow with
+    the input. Returns the run's WorkerStats.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = WorkerStats()
+    if output_format == "csv":
+        csv.DictWriter(target, fieldnames=RESULT_FIELDS).writeheader()
+
+    def drain(future):
+        pid, count, busy, text = future.result()
+        stats.record(pid, count, busy)
+        target.write(text)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_catalog) as pool:
+        pending = deque()
+        for fieldnames, first_line, records in _raw_chunks(source, input_format, chunk_size):
+            pending.append(pool.submit(_validate_chunk, input_format, fieldnames, first_line, records, output_format, vectorized))
+            if len(pending) >= 2 * workers:
+                drain(pending.popleft())
+        while pending:
+            drain(pending.popleft())
+    stats.finish()
+    return stats
+
+
+def _open(path, mode):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a CSV or JSONL file of quotes against Rules 1-12.")
+    parser.add_argument("input", help="quote file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="result file, or - for stdout (default)")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"), help="default: from the input file extension")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), help="default: from the output file extension")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes; 0 means one per CPU (default: 1, no pool)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="quotes per worker task in parallel mode")
+    parser.add_argument("--vectorized", action="store_true", help="evaluate Rules 5, 6, 9 and 11 as array operations over chunks")
+    parser.add_argument("--stats", action="store_true", help="print per-worker throughput to stderr (parallel mode)")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or ("jsonl" if args.output == "-" else detect_format(args.output))
+
+    source = _open(args.input, "r")
+    target = _open(args.output, "w")
+    try:
+        if args.workers == 1:
+            rows = validate_quotes(read_quotes(source, input_format), vectorized=args.vectorized, chunk_size=args.chunk_size)
+            write_results(rows, target, output_format)
+        else:
+            stats = validate_parallel(source, target, input_format, output_format,
+                                      workers=args.workers or None, chunk_size=args.chunk_size,
+                                      vectorized=args.vectorized)
+            if args.stats:
+                print(stats.report(), file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Benchmarks for the configurator's hot paths on synthetic configurations.
+
+Each size is a configuration of that many component lines, cycling through
+the catalog with seeded random quantities. Every stage is timed on it:
+
+    expand    building the component lines (engine.make_component per line)
+    scan      build_context: the role index, has_* flags and load totals
+    rule_<id> each of Rules 1-12 on a prepared context
+    rules     all rules through the compiled plan (engine.RULE_PLAN)
+    status    get_system_status
+    summary   group_by_category, the Configuration Summary grouping
+    validate  engine.validate end to end
+    apptest   a full rerun of solarcomp.py under Streamlit's AppTest
+
+The UI holds at most one line per catalog component, so the apptest stage
+checks up to that many components and spreads the size over their
+quantities as units.
+
+Results are written as JSON. Use --compare to report per-stage ratios
+against an earlier run, and --fail-above to make a slowdown fail the run.
+
+Usage::
+
+    python bench.py -o bench.json
+    python bench.py --sizes 1 100 10000 --no-apptest -o after.json --compare bench.json --fail-above 1.25
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from catalog import load_catalog
+from configstore import ConfigStore
+from engine import (RULE_PLAN, RULES, RuleReport, build_context, get_system_status, group_by_category,
+                    make_component, make_product, validate)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solarcomp.py")
+DEFAULT_SIZES = (1, 10, 100, 1000, 10000)
+
+
+def synthetic_lines(size, catalog, seed=0):
+    """(name, spec, quantity) for size lines cycling through the catalog components"""
+    rng = random.Random(seed)
+    names = list(catalog.components)
+    return [(names[i % len(names)], catalog.components[names[i % len(names)]], rng.randint(1, 3))
+            for i in range(size)]
+
+
+def measure(fn, repeat=5, min_time=0.05):
+    """{"median_s", "min_s", "loops"}: per-call time over repeat rounds of enough loops to last min_time"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    rounds = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - started) / loops)
+    return {"median_s": statistics.median(rounds), "min_s": min(rounds), "loops": loops}
+
+
+def bench_engine(size, catalog, product, repeat, min_time):
+    """Stage timings for one configuration size"""
+    lines = synthetic_lines(size, catalog)
+    product_info = make_product(product, catalog.products[product])
+    components = [make_component(name, spec, quantity=q) for name, spec, q in lines]
+    ctx = build_context(product_info, components)
+
+    def run_rules():
+        RULE_PLAN.run(ctx, RuleReport())
+
+    def run_rule(rule):
+        return lambda: rule(ctx, RuleReport())
+
+    stages = {
+        "expand": lambda: [make_component(name, spec, quantity=q) for name, spec, q in lines],
+        "scan": lambda: build_context(product_info, components),
+    }
+    for rule_id, rule in RULES:
+        stages[f"rule_{rule_id}"] = run_rule(rule)
+    stages.update({
+        "rules": run_rules,
+        "status": lambda: get_system_status(ctx.has_battery, ctx.has_inverter, ctx.has_solar_inverter,
+                                            ctx.has_solar_panels, ctx.has_controller, ctx.batteries),
+        "summary": lambda: group_by_category(components),
+        "validate": lambda: validate(product_info, components),
+    })
+    return {stage: measure(fn, repeat, min_time) for stage, fn in stages.items()}
+
+
+def bench_apptest(size, catalog, repeat):
+    """Median and min of full script reruns with the UI showing size units over up to one line per component"""
+    from streamlit.testing.v1 import AppTest
+
+    # AppTest logs a warning per run in bare mode
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    # The checkbox components in picker order, restored through the URL as a page reload would
+    names = [name for category in catalog.categories if category not in ("Controllers", "Power Conversion")
+             for name in catalog.by_category[category]][:size]
+    store = ConfigStore(catalog)
+    for i, name in enumerate(names):
+        store.select(name, quantity=size // len(names) + (i < size % len(names)))
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.query_params["config"] = store.encode()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"solarcomp.py raised during the benchmark: {at.exception}")
+
+    rounds = []
+    key = f"qty_{names[0]}"
+    for i in range(repeat):
+        # Nudge a quantity so every rerun has an input change to process, as a user edit would
+        widget = at.number_input(key=key)
+        widget.set_value(widget.value + (1 if i % 2 == 0 else -1))
+        started = time.perf_counter()
+        at.run()
+        rounds.append(time.perf_counter() - started)
+    return {"median_s": statistics.median(rounds), "min_s": min(rounds), "loops": 1,
+            "lines": len(names), "units": size}
+
+
+def environment():
+    """Where the numbers came from, so runs on different machines are not compared blindly"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(APP_PATH), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "catalog_version": load_catalog().version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run(sizes=DEFAULT_SIZES, apptest=True, repeat=5, min_time=0.05, product=None, log=None):
+    """{"environment": ..., "results": {size: {stage: timing}}} for every size"""
+    catalog = load_catalog()
+    product = product or next(iter(catalog.products))
+    results = {}
+    for size in sizes:
+        started = time.perf_counter()
+        timings = bench_engine(size, catalog, product, repeat, min_time)
+        if apptest:
+            timings["apptest"] = bench_apptest(size, catalog, repeat)
+        results[str(size)] = timings
+        if log:
+            print(f"{size} lines: {time.perf_counter() - started:.1f}s", file=log)
+    return {"environment": environment(), "product": product, "results": results}
+
+
+def compare(current, baseline):
+    """[(size, stage, baseline_s, current_s, ratio)] for stages present in both runs (ratio > 1 is slower)"""
+    rows = []
+    for size, stages in current["results"].items():
+        for stage, timing in stages.items():
+            before = baseline["results"].get(size, {}).get(stage)
+            if before and before["median_s"] > 0:
+                rows.append((size, stage, before["median_s"], timing["median_s"], timing["median_s"] / before["median_s"]))
+    return rows
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds * 1e9:.3g}ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the configurator's hot paths on synthetic configurations.")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="component lines per configuration")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per stage (median reported)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds each round should last at least")
+    parser.add_argument("--product", help="catalog product to configure (default: the first)")
+    parser.add_argument("--no-apptest", action="store_true", help="skip the full Streamlit rerun stage")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results JSON to report ratios against")
+    parser.add_argument("--fail-above", type=float, help="exit 1 if any stage is slower than BASELINE by this ratio")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, not args.no_apptest, args.repeat, args.min_time, args.product, log=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for size, stages in report["results"].items():
+        print(f"{size} lines: " + ", ".join(f"{stage} {_format_time(t['median_s'])}" for stage, t in stages.items()))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            rows = compare(report, json.load(f))
+        slower = []
+        for size, stage, before, after, ratio in rows:
+            print(f"{size:>6} {stage:<10} {_format_time(before):>9} -> {_format_time(after):>9}  x{ratio:.2f}")
+            if args.fail_above and ratio > args.fail_above:
+                slower.append(f"{size}/{stage}")
+        if slower:
+            print(f"Slower than x{args.fail_above}: {', '.join(slower)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Product and component catalog backed by catalog.json.
+
+The file is parsed once per process by load_catalog(); the returned Catalog
+carries precomputed indexes so callers never re-filter the component dict.
+"""
+
+import json
+import os
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import lru_cache
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+
+
+def tokens(text):
+    """Lowercase alphanumeric tokens of a catalog name ("CSP12501 - Solar panel 125W" -> csp12501, solar, panel, 125w)"""
+    return re.findall(r"[0-9a-z]+", text.lower())
+
+
+class TokenIndex:
+    """Search-as-you-type over catalog names: every query token must be a prefix of some token of a hit
+
+    Tokens are kept sorted, so a prefix is a bisect plus a scan over the
+    tokens that share it. Results come back in catalog order and are cached
+    per query token set.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.position = {name: i for i, name in enumerate(self.names)}
+        postings = {}
+        for name in self.names:
+            for token in set(tokens(name)):
+                postings.setdefault(token, []).append(name)
+        self.tokens = sorted(postings)
+        self.postings = {token: frozenset(names) for token, names in postings.items()}
+        self._cache = {}
+
+    def _prefix(self, prefix):
+        hits = set()
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            hits |= self.postings[self.tokens[i]]
+            i += 1
+        return hits
+
+    def search(self, query):
+        """Names matching every token of query, in catalog order (all names for a blank query)"""
+        terms = tuple(sorted(set(tokens(query)), key=len, reverse=True))  # longest, most selective first
+        if not terms:
+            return self.names
+        found = self._cache.get(terms)
+        if found is None:
+            hits = self._prefix(terms[0])
+            for term in terms[1:]:
+                if not hits:
+                    break
+                hits &= self._prefix(term)
+            found = tuple(sorted(hits, key=self.position.__getitem__))
+            if len(self._cache) >= 1024:
+                self._cache.clear()
+            self._cache[terms] = found
+        return found
+
+
+@dataclass(frozen=True)
+class Catalog:
+    """Parsed catalog plus lookup indexes (all index values are tuples of component names)"""
+    version: str
+    products: dict
+    components: dict
+    categories: tuple
+    by_category: dict
+    by_code: dict
+    by_voltage: dict
+    search_index: TokenIndex
+
+    def in_category(self, category):
+        """Components of one category as a name -> spec dict, in catalog order"""
+        return {name: self.components[name] for name in self.by_category.get(category, ())}
+
+    def search(self, query, category=None):
+        """Component names matching a search-as-you-type query (SKU code or name prefixes), in catalog order"""
+        hits = self.search_index.search(query)
+        if category is None:
+            return hits
+        in_category = self.by_category.get(category, ())
+        if len(hits) < len(in_category):
+            return tuple(name for name in hits if self.components[name]["category"] == category)
+        if hits is self.search_index.names:
+            return in_category
+        hit_set = set(hits)
+        return tuple(name for name in in_category if name in hit_set)
+
+
+def sku_code(name):
+    """SKU code prefix of a catalog name ("CSP12501 - Solar panel 125W" -> "CSP12501")"""
+    code, sep, _ = name.partition(" - ")
+    return code if sep else None
+
+
+def nominal_voltage(spec):
+    """DC system voltage a component is built for, or None for voltage-agnostic parts"""
+    for key in ("default_rating", "voltage", "dc_input_voltage"):
+        value = spec.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def build_catalog(data):
+    """Build a Catalog and its indexes from the decoded catalog file"""
+    components = data["components"]
+    by_category = {}
+    by_code = {}
+    by_voltage = {}
+    for name, spec in components.items():
+        by_category.setdefault(spec["category"], []).append(name)
+        code = sku_code(name)
+        if code is not None:
+            by_code.setdefault(code, []).append(name)
+        voltage = nominal_voltage(spec)
+        if voltage is not None:
+            by_voltage.setdefault(voltage, []).append(name)
+
+    def freeze(index):
+        return {key: tuple(names) for key, names in index.items()}
+
+    return Catalog(
+        version=str(data["version"]),
+        products=data["products"],
+        components=components,
+        categories=tuple(sorted(by_category)),
+        by_category=freeze(by_category),
+        by_code=freeze(by_code),
+        by_voltage=freeze(by_voltage),
+        search_index=TokenIndex(components),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    """Load and index the catalog file; cached so each path is parsed once per process"""
+    with open(path, encoding="utf-8") as f:
+        return build_catalog(json.load(f))
@@ -0,0 +1,168 @@
+"""Compatibility between catalog SKUs, decided once per catalog version.
+
+Whether two SKUs can share a system is settled by a few rules: voltage
+matching between batteries and controllers or inverters (Rules 4 and 4.5),
+no Solar Inverter next to a plain Inverter (Rule 12), and the companion
+appliance motor attachments and cooker accessories need (Rules 7 and 8).
+
+CompatibilityMatrix runs those rules on every SKU pair that can trip them,
+at the catalog's default ratings, so the matrix agrees with validation by
+construction. Each relation is kept as bitsets: bit j of row i is set when
+SKUs i and j are in it. pair(a, b) combines the relations into the pair's
+flags. The component picker tests a SKU against a whole selection with one
+AND; a line whose rating the user changed gets its row computed the same
+way, once per rating.
+"""
+
+from engine import RULE_PLAN, Role, RuleReport, build_context, classify, make_component
+
+# Flags of a SKU pair
+VOLTAGE = 1  # voltages do not match (Rules 4 and 4.5)
+REDUNDANT = 2  # Solar Inverter with a plain Inverter (Rule 12)
+COMPANION = 4  # the second SKU is a companion the first requires (Rules 7 and 8)
+
+CONFLICT_RULES = {VOLTAGE: ("4", "4.5"), REDUNDANT: ("12",)}
+COMPANION_RULES = ("7", "8")
+
+# Roles whose SKUs each conflict relation pairs up
+CONFLICT_PAIRS = {
+    VOLTAGE: ((Role.BATTERY, Role.CONTROLLER), (Role.BATTERY, Role.INVERTER), (Role.BATTERY, Role.SOLAR_INVERTER)),
+    REDUNDANT: ((Role.SOLAR_INVERTER, Role.INVERTER),),
+}
+# The companion rules only look among the appliances
+COMPANION_ROLES = (Role.APPLIANCE,)
+
+# None of the rules above read the product
+_PRODUCT = {"name": "", "price": 0, "voltage": "DC", "rating": 24, "power_watts": 0, "weight": 0}
+
+
+def _bits(indexes):
+    bits = 0
+    for i in indexes:
+        bits |= 1 << i
+    return bits
+
+
+def _bits_or(rows):
+    bits = 0
+    for row in rows:
+        bits |= row
+    return bits
+
+
+class CompatibilityMatrix:
+    """Conflicts and required companions between the SKUs of a catalog, as bitsets over catalog order"""
+
+    def __init__(self, catalog):
+        self.version = catalog.version
+        self.names = tuple(catalog.components)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.roles = {name: classify(spec) for name, spec in catalog.components.items()}
+        self.lines = {name: make_component(name, spec) for name, spec in catalog.components.items()}
+        self._plans = {flag: RULE_PLAN.subset(rule_ids) for flag, rule_ids in CONFLICT_RULES.items()}
+        self._companion_plan = RULE_PLAN.subset(COMPANION_RULES)
+        self._alone = {}
+        self._rows = {}  # (name, repr(rating)) -> conflict row, for lines off their default rating
+
+        n = len(self.names)
+        self.conflicts = {flag: [0] * n for flag in CONFLICT_RULES}
+        for flag, role_pairs in CONFLICT_PAIRS.items():
+            rows = self.conflicts[flag]
+            for first, second in role_pairs:
+                for a in self._with_role(first):
+                    for b in self._with_role(second):
+                        if self._conflict(flag, self.lines[a], self.lines[b]):
+                            i, j = self.index[a], self.index[b]
+                            rows[i] |= 1 << j
+                            rows[j] |= 1 << i
+
+        # needs[i]: the SKUs any one of which satisfies SKU i's requirement; 0 when it has none
+        self.needs = [0] * n
+        candidates = [name for role in COMPANION_ROLES for name in self._with_role(role)]
+        for name in self.names:
+            missing = self._messages(self._companion_plan, [self.lines[name]])
+            if missing:
+                self.needs[self.index[name]] = _bits(
+                    self.index[other] for other in candidates
+                    if not missing & self._messages(self._companion_plan, [self.lines[name], self.lines[other]]))
+
+    def _with_role(self, role):
+        return [name for name in self.names if self.roles[name] is role]
+
+    @staticmethod
+    def _messages(plan, lines):
+        report = RuleReport()
+        plan.run(build_context(_PRODUCT, lines), report)
+        return set(report.messages)
+
+    def _conflict(self, flag, a, b):
+        """Whether the pair fails a rule of the relation that neither line fails on its own"""
+        plan = self._plans[flag]
+        alone = set()
+        for line in (a, b):
+            key = (flag, line["name"], repr(line["rating"]))
+            if key not in self._alone:
+                self._alone[key] = self._messages(plan, [line])
+            alone |= self._alone[key]
+        return bool(self._messages(plan, [a, b]) - alone)
+
+    def pair(self, a, b):
+        """Flags of two SKUs at their default ratings (COMPANION when b satisfies a's requirement)"""
+        i, j = self.index[a], self.index[b]
+        flags = 0
+        for flag, rows in self.conflicts.items():
+            if rows[i] >> j & 1:
+                flags |= flag
+        if self.needs[i] >> j & 1:
+            flags |= COMPANION
+        return flags
+
+    def conflict_row(self, line):
+        """SKUs that conflict with a component line, at its own rating"""
+        name = line["name"]
+        i = self.index[name]
+        if repr(line["rating"]) == repr(self.lines[name]["rating"]):
+            return _bits_or(rows[i] for rows in self.conflicts.values())
+        key = (name, repr(line["rating"]))
+        row = self._rows.get(key)
+        if row is None:
+            role = self.roles[name]
+            row = 0
+            for flag, role_pairs in CONFLICT_PAIRS.items():
+                partners = [second if first is role else first for first, second in role_pairs if role in (first, second)]
+                for other in (other for partner in partners for other in self._with_role(partner)):
+                    if self._conflict(flag, line, self.lines[other]):
+                        row |= 1 << self.index[other]
+            self._rows[key] = row
+        return row
+
+    def selection(self, names):
+        """Bitset of the given SKUs"""
+        return _bits(self.index[name] for name in names)
+
+    def conflicting(self, lines):
+        """Bitset of the SKUs that conflict with any of the component lines"""
+        return _bits_or(self.conflict_row(line) for line in lines if line["name"] in self.index)
+
+    def blocked(self, name, conflicts, selected):
+        """Why a SKU does not fit a selection (conflicting() and selection() bitsets), or None when it does
+
+        Returns "conflict" when it conflicts with a selected line, "companion"
+        when none of the SKUs it needs is selected.
+        """
+        i = self.index[name]
+        if conflicts >> i & 1:
+            return "conflict"
+        if self.needs[i] and not self.needs[i] & selected:
+            return "companion"
+        return None
+
+    def partners(self, name, lines):
+        """Names of the component lines a SKU conflicts with"""
+        i = self.index[name]
+        return [line["name"] for line in lines if line["name"] in self.index and self.conflict_row(line) >> i & 1]
+
+    def companions(self, name):
+        """Names of the SKUs one of which a SKU needs in the system"""
+        needs = self.needs[self.index[name]]
+        return [other for j, other in enumerate(self.names) if needs >> j & 1]
@@ -0,0 +1,177 @@
+"""The configurator's component lines, kept current one change at a time.
+
+A ConfigStore holds the line of every selected component, built by
+engine.make_component from the settings the user changed. Widget on_change
+callbacks call select(), deselect() and update(), and each call rebuilds
+only the affected line. The role index and the running cost and weight
+totals are adjusted by the difference, so a rerun reads the configuration
+instead of rebuilding it from every widget.
+
+The settings also round-trip through encode()/decode(), a compact URL-safe
+string. The UI keeps that string in a query parameter, so the configuration
+survives a page reload.
+"""
+
+import base64
+import json
+import zlib
+from bisect import bisect_left, insort
+from fractions import Fraction
+
+from engine import Role, make_component, quantity
+
+# make_component keyword arguments a user can change, with the types their widgets produce
+SETTING_TYPES = {
+    "price": (int,),
+    "quantity": (int,),
+    "rating": (int, str),
+    "inverter_option": (dict,),
+    "capacity_ah": (int,),
+    "battery_voltage": (int,),
+    "charge_c_rating": (int, float),
+    "discharge_c_rating": (int, float),
+}
+# Largest numbers a decoded setting may hold, far beyond any real system; bigger ones overflow the totals
+MAX_QUANTITY = 10_000
+MAX_NUMBER = 10 ** 9
+ENCODING_VERSION = 1
+# Largest decompressed payload decode() accepts
+MAX_PAYLOAD = 1 << 20
+
+
+def _valid_setting(field, value):
+    """Whether a decoded value could have come from the field's widget"""
+    if isinstance(value, bool) or not isinstance(value, SETTING_TYPES.get(field, ())):
+        return False
+    if isinstance(value, (int, float)):  # the range test also rejects nan and inf
+        return (1 if field == "quantity" else 0) <= value <= (MAX_QUANTITY if field == "quantity" else MAX_NUMBER)
+    return True
+
+
+class RunningTotal:
+    """Exact sum that terms can be added to and taken back out of without float drift
+
+    value is an int while every term is, otherwise the correctly rounded float.
+    """
+
+    def __init__(self):
+        self._sum = Fraction(0)
+        self._floats = 0  # float terms currently in the sum
+
+    def add(self, term, sign=1):
+        self._sum += sign * Fraction(term)
+        if isinstance(term, float):
+            self._floats += sign
+
+    @property
+    def value(self):
+        if self._floats:
+            return float(self._sum)
+        return int(self._sum) if self._sum.denominator == 1 else float(self._sum)
+
+
+class ConfigStore:
+    """Selected component lines with their role index and running totals (product excluded)"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        # Lines are listed in the component picker's order: by category, then catalog order
+        self.order = {name: i for i, name in enumerate(
+            name for category in catalog.categories for name in catalog.by_category[category])}
+        self.settings = {}  # name -> make_component keyword arguments the user changed
+        self.lines = {}  # name -> component line
+        self.by_role = {role: {} for role in Role}  # role -> {name: line}
+        self.total_cost = RunningTotal()
+        self.total_weight = RunningTotal()
+        self._keys = []  # (order, name) of the selected components, kept sorted
+        self._components = None
+
+    def __contains__(self, name):
+        return name in self.lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _put(self, name, line):
+        previous = self.lines.get(name)
+        if previous is not None:
+            self._count(previous, -1)
+        else:
+            insort(self._keys, (self.order[name], name))
+        self.lines[name] = line
+        self.by_role[line["role"]][name] = line
+        self._count(line, 1)
+        self._components = None
+
+    def _count(self, line, sign):
+        self.total_cost.add(line["price"] * quantity(line), sign)
+        self.total_weight.add(line["weight"] * quantity(line), sign)
+
+    def select(self, name, **settings):
+        """Add a component with the widget defaults, overridden by settings"""
+        self.settings[name] = dict(settings)
+        self._put(name, make_component(name, self.catalog.components[name], **settings))
+
+    def update(self, name, **changes):
+        """Apply changed settings to a selected component, rebuilding only its line"""
+        self.settings[name].update(changes)
+        self._put(name, make_component(name, self.catalog.components[name], **self.settings[name]))
+
+    def deselect(self, name):
+        line = self.lines.pop(name, None)
+        if line is None:
+            return
+        del self.settings[name]
+        del self.by_role[line["role"]][name]
+        del self._keys[bisect_left(self._keys, (self.order[name], name))]
+        self._count(line, -1)
+        self._components = None
+
+    def deselect_category(self, category):
+        for name in [name for name in self.lines if self.lines[name]["category"] == category]:
+            self.deselect(name)
+
+    def first(self, role):
+        """Name of the first selected component with this role, or None"""
+        return next(iter(self.by_role[role]), None)
+
+    def components(self):
+        """Component lines in picker order; the same list until the next change, so treat it as read-only"""
+        if self._components is None:
+            self._components = [self.lines[name] for _, name in self._keys]
+        return self._components
+
+    def encode(self):
+        """Settings of every selected component as a compact URL-safe string"""
+        payload = {"v": ENCODING_VERSION, "lines": {name: self.settings[name] for _, name in self._keys}}
+        packed = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+        return base64.urlsafe_b64encode(packed).decode("ascii").rstrip("=")
+
+    @classmethod
+    def from_settings(cls, catalog, lines):
+        """Store with the given {name: settings}; components or settings the catalog no longer has are dropped"""
+        store = cls(catalog)
+        for name, settings in lines.items():
+            spec = catalog.components.get(name)
+            if spec is None or not isinstance(settings, dict):
+                continue
+            kept = {field: value for field, value in settings.items() if _valid_setting(field, value)}
+            if kept.get("inverter_option") not in spec.get("capacity_options", ()):
+                kept.pop("inverter_option", None)
+            store.select(name, **kept)
+        return store
+
+    @classmethod
+    def decode(cls, catalog, text):
+        """Store restored from encode() output, as from_settings(); text that does not decode gives an empty store"""
+        try:
+            packed = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+            inflate = zlib.decompressobj()
+            data = inflate.decompress(packed, MAX_PAYLOAD)
+            if inflate.unconsumed_tail:
+                raise ValueError("configuration too large")
+            payload = json.loads(data)
+            lines = payload["lines"] if payload.get("v") == ENCODING_VERSION else {}
+        except (ValueError, TypeError, KeyError, AttributeError, RecursionError, zlib.error):
+            lines = {}
+        return cls.from_settings(catalog, lines if isinstance(lines, dict) else {})
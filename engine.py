@@ -0,0 +1,1171 @@
+"""Headless validation engine for the solar configurator.
+
+Pure Python, no Streamlit: takes a product plus a list of component dicts
+and returns viability, messages, system status and the system limits.
+"""
+
+import hashlib
+import re
+import string
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from functools import lru_cache
+
+
+class Role(Enum):
+    """What a component line does in the system, derived from its catalog entry"""
+    APPLIANCE = "appliance"
+    CONTROLLER = "controller"
+    BATTERY = "battery"
+    INVERTER = "inverter"
+    SOLAR_INVERTER = "solar_inverter"
+    SOLAR_PANEL = "solar_panel"
+    CABLE = "cable"
+    ICEBOX = "icebox"
+    ACCESSORY = "accessory"
+    COOKER_ACCESSORY = "cooker_accessory"
+    MOTOR_ATTACHMENT = "motor_attachment"
+    OTHER = "other"
+
+
+CATEGORY_ROLES = {
+    "Appliances": Role.APPLIANCE,
+    "Controllers": Role.CONTROLLER,
+    "Batteries": Role.BATTERY,
+    "Solar Panels": Role.SOLAR_PANEL,
+    "Cables & Mounting": Role.CABLE,
+    "Accessories": Role.ACCESSORY,
+    "Cooker Accessories": Role.COOKER_ACCESSORY,
+    "Motor Attachments": Role.MOTOR_ATTACHMENT,
+}
+
+
+def classify(spec):
+    """Role of a catalog entry or component line, from its category and flags"""
+    category = spec.get("category")
+    if category == "Power Conversion":
+        return Role.SOLAR_INVERTER if spec.get("is_solar_inverter", False) else Role.INVERTER
+    if category == "Accessories" and spec.get("is_icebox", False):
+        return Role.ICEBOX
+    return CATEGORY_ROLES.get(category, Role.OTHER)
+
+
+class ComponentIndex:
+    """Component lines bucketed by role in a single pass"""
+
+    def __init__(self, components):
+        self.by_role = {role: [] for role in Role}
+        for component in components:
+            role = component.get("role") or classify(component)
+            self.by_role[role].append(component)
+
+    def __getitem__(self, role):
+        return self.by_role[role]
+
+    def has(self, role):
+        return bool(self.by_role[role])
+
+    def first(self, role):
+        lines = self.by_role[role]
+        return lines[0] if lines else None
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of running Rules 1-12 and the status check on a configuration"""
+    viable: bool
+    messages: list
+    warnings: list
+    status_color: str
+    status_message: str
+    system_limits: dict
+    total_cost: float
+    total_weight: float
+    index: ComponentIndex
+
+    # Derived figures used by the power summary and recommendations
+    all_ac_loads: list = field(default_factory=list)
+    biggest_ac_load_power: float = 0
+    biggest_ac_load_name: str = ""
+    total_ac_load_power: float = 0
+    total_appliance_power: float = 0
+    recommendations: list = field(default_factory=list)
+
+
+def make_product(name, spec, voltage=None, rating=None, power_watts=None, price=None, weight=None):
+    """Build a product_info dict, falling back to the catalog defaults"""
+    return {
+        "name": name,
+        "price": spec["base_price"] if price is None else price,
+        "voltage": spec["default_voltage"] if voltage is None else voltage,
+        "rating": spec["default_rating"] if rating is None else rating,
+        "power_watts": spec["default_power_watts"] if power_watts is None else power_watts,
+        "weight": spec["weight"] if weight is None else weight,
+    }
+
+
+def default_rating(name, spec):
+    """Voltage rating a component gets when the user keeps the widget defaults"""
+    voltage_type = spec.get("voltage", "DC")
+    voltage_value = spec.get("default_rating", 24)
+    role = classify(spec)
+
+    if role is Role.CONTROLLER and "Beast" not in name:
+        return "12, 24"
+    if voltage_type != "N/A" and role not in (Role.BATTERY, Role.INVERTER, Role.SOLAR_PANEL) and "default_voltage" not in spec:
+        if isinstance(voltage_value, str):
+            try:
+                voltage_value = int(voltage_value)
+            except ValueError:
+                voltage_value = 24
+        return int(voltage_value)
+    if "default_rating" in spec:
+        return spec["default_rating"]
+    return voltage_value
+
+
+def make_component(name, spec, price=None, quantity=1, rating=None, power_rating=None,
+                   inverter_option=None, capacity_ah=None, battery_voltage=None,
+                   charge_c_rating=None, discharge_c_rating=None):
+    """Build the component dict the rules read, applying the same defaults as the UI"""
+    price = spec["base_price"] if price is None else price
+    role = classify(spec)
+
+    if power_rating is None:
+        power_rating = spec.get("power_rating", 0)
+        if power_rating == 0 and "default_power" in spec:
+            power_rating = spec["default_power"]
+
+    if "capacity_options" in spec:
+        if inverter_option is None:
+            inverter_option = spec["capacity_options"][0]
+        power_rating = inverter_option["capacity"]
+        price += inverter_option["price_adjust"]
+
+    battery_capacity_wh = 0
+    battery_capacity_ah = 0
+    battery_volts = 24
+    battery_charge_c = 1.0
+    battery_discharge_c = 1.0
+    if role is Role.BATTERY:
+        battery_capacity_ah = spec.get("capacity_ah", 0)
+        battery_volts = spec.get("voltage", 24)
+        battery_charge_c = spec.get("charge_c_rating", 1.0)
+        battery_discharge_c = spec.get("discharge_c_rating", 1.0)
+        if battery_capacity_ah <= 0:
+            # Custom battery - user supplies Ah and voltage
+            battery_capacity_ah = 100 if capacity_ah is None else capacity_ah
+            battery_volts = 24 if battery_voltage is None else battery_voltage
+        battery_capacity_wh = battery_volts * battery_capacity_ah
+        if charge_c_rating is not None:
+            battery_charge_c = charge_c_rating
+        if discharge_c_rating is not None:
+            battery_discharge_c = discharge_c_rating
+
+    return {
+        "name": name,
+        "price": price,
+        "voltage": spec.get("voltage", "DC"),
+        "rating": default_rating(name, spec) if rating is None else rating,
+        "power_rating": power_rating,
+        "max_current": spec.get("max_current", 0),
+        "battery_capacity": battery_capacity_wh,
+        "battery_capacity_ah": battery_capacity_ah,
+        "battery_voltage": battery_volts,
+        "battery_charge_c_rating": battery_charge_c,
+        "battery_discharge_c_rating": battery_discharge_c,
+        "weight": spec["weight"],
+        "category": spec["category"],
+        "includes_controller": spec.get("includes_controller", False),
+        "includes_mppt": spec.get("includes_mppt", False),
+        "is_solar_inverter": spec.get("is_solar_inverter", False),
+        "is_icebox": spec.get("is_icebox", False),
+        "is_appliance": role is Role.APPLIANCE,
+        "role": role,
+        "quantity": quantity,
+    }
+
+
+def quantity(component):
+    """Number of units on a component line"""
+    return component.get("quantity", 1)
+
+
+def weighted_sum(components, key, default=0):
+    """Quantity-weighted total of a numeric field over component lines"""
+    return sum(float(c.get(key, default)) * quantity(c) for c in components)
+
+
+def group_by_category(components):
+    """Component lines per category, categories in first-seen order (the Configuration Summary layout)"""
+    groups = {}
+    for component in components:
+        groups.setdefault(component.get("category", "Other"), []).append(component)
+    return groups
+
+
+# Fields validation reads; canonical forms project lines and products onto these
+LINE_FIELDS = (
+    "name", "price", "voltage", "rating", "power_rating", "max_current",
+    "battery_capacity", "battery_capacity_ah", "battery_voltage",
+    "battery_charge_c_rating", "battery_discharge_c_rating", "weight", "category",
+    "includes_controller", "includes_mppt", "is_solar_inverter", "is_icebox",
+    "is_appliance", "role", "quantity",
+)
+PRODUCT_FIELDS = ("name", "price", "voltage", "rating", "power_watts", "weight")
+
+
+def _typed(values):
+    """Key of a tuple of values that keeps 24, 24.0 and True apart: the values with their types"""
+    return tuple(map(type, values)), values
+
+
+def _typed_repr(values):
+    """_typed() for a tuple that may hold unhashable values (a list rating, say): keyed by its repr"""
+    return tuple(map(type, values)), repr(values)
+
+
+def canonical_config(product_info, components):
+    """Hashable, order-independent form of a configuration: product fields plus component lines
+
+    The product and each line are keyed by their field values and the values'
+    types, so values that compare equal but format differently (24 and 24.0)
+    give different keys, as they give different messages. The lines form a
+    multiset, so the same lines in any order compare (and hash) equal. Suitable
+    as an in-process dict key; use config_fingerprint() for a value that is
+    stable across processes.
+    """
+    product = tuple(map(product_info.get, PRODUCT_FIELDS))
+    lines = [tuple(map(component.get, LINE_FIELDS)) for component in components]
+    try:
+        key = _typed(product), frozenset(Counter(map(_typed, lines)).items())
+        hash(key[0])
+    except TypeError:
+        key = _typed_repr(product), frozenset(Counter(map(_typed_repr, lines)).items())
+    return key
+
+
+def config_fingerprint(product_info, components):
+    """Stable, order-independent digest of a configuration (same across processes)"""
+    product = tuple(map(product_info.get, PRODUCT_FIELDS))
+    digest = hashlib.blake2b(repr(product).encode(), digest_size=16)
+    for line in sorted(repr(tuple(map(component.get, LINE_FIELDS))) for component in components):
+        digest.update(b"\0")
+        digest.update(line.encode())
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    """Size-bounded LRU of validation results keyed on canonical_config()
+
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def validate(self, product_info, components, compute=None):
+        """Return the cached result for this configuration, computing it on a miss
+
+        compute defaults to validate(); an IncrementalValidator's validate fits too.
+        """
+        key = canonical_config(product_info, components)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = (compute or validate)(product_info, components)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_default_cache = ValidationCache()
+
+
+def validate_cached(product_info, components, compute=None):
+    """validate() (or compute) through the process-wide LRU cache"""
+    return _default_cache.validate(product_info, components, compute)
+
+
+# --- System Status Helper Function ---
+def get_system_status(has_battery, has_inverter, has_solar_inverter, has_solar_panels, has_controller, batteries):
+    """Determine system status based on component selection"""
+
+    # Red: Electrically impossible
+    if not has_battery and not has_solar_panels and not has_solar_inverter:
+        return "red", "❌ No energy source (needs battery, solar panels, or solar inverter)"
+
+    # Green: Complete solar system with Solar Inverter
+    if has_solar_inverter and has_battery:
+        return "green", "✅ Complete solar system with Solar Inverter (all-in-one unit)"
+
+    # Green: Complete solar system with traditional setup
+    if has_solar_panels and has_battery:
+        # Check if we have a controller or battery with built-in controller
+        battery_has_controller = any(b.get("includes_controller", False) for b in batteries)
+        if has_controller or battery_has_controller:
+            return "green", "✅ Complete solar system with energy source and storage"
+
+    # Orange: Works conditionally (missing solar panels but has battery+inverter)
+    if has_battery and has_inverter and not has_solar_panels and not has_solar_inverter:
+        return "orange", "⚠️ System will work but needs external energy source (grid/generator) or user-provided solar panels"
+
+    # Orange: Solar Inverter without battery
+    if has_solar_inverter and not has_battery:
+        return "orange", "⚠️ Solar Inverter needs a battery for energy storage"
+
+    # Orange: Traditional system without controller
+    if has_battery and not has_solar_inverter:
+        return "orange", "⚠️ System has storage but may need additional components for complete operation"
+
+    return "red", "❌ Incomplete system configuration"
+
+
+@dataclass
+class SystemContext:
+    """Derived view of one configuration that every rule reads"""
+    product_info: dict
+    components: list
+    index: ComponentIndex
+    appliances: list
+    batteries: list
+    controllers: list
+    solar_panels: list
+    inverter: dict
+    solar_inverter: dict
+    motor_attachments: list
+    cooker_accessories: list
+    iceboxes: list
+    has_battery: bool
+    has_inverter: bool
+    has_solar_inverter: bool
+    has_controller: bool
+    has_solar_panels: bool
+    has_appliances: bool
+    all_ac_loads: list
+    biggest_ac_load_power: float
+    biggest_ac_load_name: str
+    total_ac_load_power: float
+    ac_device_count: int
+    total_appliance_power: float
+    total_solar_power: float
+
+
+def build_context(product_info, user_components):
+    """Classify the component lines once and compute the totals the rules share"""
+    # Bucket component lines by role once; every rule reads from the index
+    index = ComponentIndex(user_components)
+
+    appliances = index[Role.APPLIANCE]
+    batteries = index[Role.BATTERY]
+    controllers = index[Role.CONTROLLER]
+    solar_panels = index[Role.SOLAR_PANEL]
+    inverter = index.first(Role.INVERTER)
+    solar_inverter = index.first(Role.SOLAR_INVERTER)
+
+    # Get all AC loads (product + AC appliances)
+    all_ac_loads = []
+
+    # Add main product if it's AC
+    if product_info["voltage"] == "AC":
+        all_ac_loads.append({
+            "name": product_info["name"],
+            "power": product_info["power_watts"]
+        })
+
+    # Add AC appliances from components
+    for appliance in appliances:
+        if appliance.get("voltage") == "AC":
+            all_ac_loads.append({
+                "name": appliance["name"],
+                "power": appliance.get("power_rating", 0),
+                "quantity": quantity(appliance)
+            })
+
+    # Find the biggest single AC load
+    biggest_ac_load_power = 0
+    biggest_ac_load_name = ""
+    for load in all_ac_loads:
+        if load["power"] > biggest_ac_load_power:
+            biggest_ac_load_power = load["power"]
+            biggest_ac_load_name = load["name"]
+
+    return SystemContext(
+        product_info=product_info,
+        components=user_components,
+        index=index,
+        appliances=appliances,
+        batteries=batteries,
+        controllers=controllers,
+        solar_panels=solar_panels,
+        inverter=inverter,
+        solar_inverter=solar_inverter,
+        motor_attachments=index[Role.MOTOR_ATTACHMENT],
+        cooker_accessories=index[Role.COOKER_ACCESSORY],
+        iceboxes=index[Role.ICEBOX],
+        has_battery=bool(batteries),
+        has_inverter=inverter is not None,
+        has_solar_inverter=solar_inverter is not None,
+        has_controller=bool(controllers),
+        has_solar_panels=bool(solar_panels),
+        has_appliances=bool(appliances),
+        all_ac_loads=all_ac_loads,
+        biggest_ac_load_power=biggest_ac_load_power,
+        biggest_ac_load_name=biggest_ac_load_name,
+        # Calculate total AC load power
+        total_ac_load_power=sum(load["power"] * load.get("quantity", 1) for load in all_ac_loads),
+        ac_device_count=sum(load.get("quantity", 1) for load in all_ac_loads),
+        total_appliance_power=weighted_sum(appliances, "power_rating") + product_info["power_watts"],
+        total_solar_power=weighted_sum(solar_panels, "power_rating"),
+    )
+
+
+class RuleReport:
+    """Collects the outcome of the rules: viability, messages and advisory warnings"""
+
+    def __init__(self):
+        self.viable = True
+        self.messages = []
+        self.warnings = []
+
+    def fail(self, message):
+        """Record an incompatibility; the system is no longer viable"""
+        self.viable = False
+        self.messages.append(message)
+
+    def info(self, message):
+        """Record a note that does not affect viability"""
+        self.messages.append(message)
+
+    def warn(self, message):
+        """Record an advisory shown outside the compatibility list"""
+        self.warnings.append(message)
+
+    def merge(self, other):
+        """Append another report's outcome, as if its rules had run into this one"""
+        self.viable = self.viable and other.viable
+        self.messages.extend(other.messages)
+        self.warnings.extend(other.warnings)
+
+
+# --- Rules 1-12, declared as data ---
+#
+# A rule is a list of Checks, compiled by RulePlan. A check applies when every literal of
+# its `when` holds: a name from PREDICATES or CONDITIONS, or "!name" for its negation.
+#
+# Then it reports its message once, or once per item when it has `each` ("item in
+# <expression>"), in either case only if its `test` expression (when given) holds. `let`
+# binds named expressions for the test and message, evaluated in order. A check can instead
+# take its findings from a function: one message per finding, a dict of template fields.
+#
+# Expressions are Python over ctx (the SystemContext) and the names bound so far. Message
+# templates use str.format syntax over those names and {ctx.<field>}; a {kind: template}
+# dict picks a finding's template by its "kind".
+
+# Predicates are inlined into the compiled rules; a callable taking ctx works too
+PREDICATES = {
+    "ac_product": 'ctx.product_info["voltage"] == "AC"',
+    "dc_product": 'ctx.product_info["voltage"] == "DC"',
+    "battery": "ctx.has_battery",
+    "battery_or_appliances": "ctx.has_battery or ctx.has_appliances",
+    "inverter": "ctx.has_inverter",
+    "solar_inverter": "ctx.has_solar_inverter",
+    "controller": "ctx.has_controller",
+    "solar_panels": "ctx.has_solar_panels",
+    "battery_includes_controller": 'any(b.get("includes_controller", False) for b in ctx.batteries)',
+    "ac_loads": "ctx.all_ac_loads",
+    "several_ac_devices": "ctx.ac_device_count > 1",
+    "motor_attachments": "ctx.motor_attachments",
+    "mighty_motor": 'any("Mighty Motor" in appliance["name"] for appliance in ctx.appliances)',
+    "cooker_accessories": "ctx.cooker_accessories",
+    "cooker": 'any("SunPot" in appliance["name"] or "SolarEPC" in appliance["name"] for appliance in ctx.appliances)',
+    "ice_maker": 'any("Ice-maker" in appliance["name"] for appliance in ctx.appliances)',
+    "icebox": "ctx.iceboxes",
+}
+
+# Conditions more than one rule checks, named so they are stated (and evaluated) once
+CONDITIONS = {
+    # Rules 1 and 12
+    "ac_without_inverter": ("ac_product", "!inverter", "!solar_inverter"),
+    # Rules 3 and 12
+    "panels_and_battery_without_controller": ("battery", "solar_panels", "!controller", "!battery_includes_controller"),
+}
+
+SEVERITIES = ("fail", "info", "warn")  # the RuleReport method each check reports through
+
+
+@dataclass(frozen=True)
+class Check:
+    """One message a rule can report, and when"""
+    when: tuple
+    severity: str
+    message: object  # template, or {kind: template} with findings
+    each: str = None  # "item in <expression>"
+    let: dict = field(default_factory=dict)  # name -> expression
+    test: str = None
+    findings: object = None  # ctx -> iterable of template field dicts
+    unique: bool = False  # report a message once even if several items or findings produce it
+
+
+@dataclass(frozen=True)
+class Rule:
+    rule_id: str
+    title: str
+    checks: tuple
+
+
+@lru_cache(maxsize=256)
+def controller_voltages(rating):
+    """Battery voltages a controller rating supports ("12, 24" -> frozenset({12, 24})), parsed once per rating"""
+    if isinstance(rating, str):
+        return frozenset(int(v.strip()) for v in rating.split(","))
+    return frozenset((int(rating),))
+
+
+def distinct_lines(lines):
+    """Lines with a distinct name and rating (12 and 12.0 kept apart), first occurrence first"""
+    distinct = {}
+    for line in lines:
+        distinct.setdefault((line["name"], repr(line["rating"])), line)
+    return list(distinct.values())
+
+
+@lru_cache(maxsize=1024)
+def _voltage_mismatch(battery_rating, beast, controller_rating):
+    """Rule 4 finding kind for a battery rating against Controller Beast or a controller rating, or None when they match"""
+    try:
+        if beast:
+            # Controller Beast is 48V specific
+            battery_rating = float(battery_rating) if isinstance(battery_rating, (int, float, str)) else 0
+            if battery_rating != 51.2:
+                return "beast"
+        else:
+            # Other controllers support multiple voltages
+            battery_rating = int(battery_rating) if isinstance(battery_rating, (int, float, str)) else 0
+            if battery_rating not in controller_voltages(controller_rating):
+                return "voltage"
+    except (ValueError, AttributeError):
+        return "invalid"
+    return None
+
+
+def _battery_controller_mismatch(battery, controller):
+    """Rule 4 finding kind for one battery/controller pair, or None when they match; a table lookup per distinct ratings"""
+    beast = "Beast" in controller["name"]
+    key = (battery["rating"], beast, None if beast else controller["rating"])
+    try:
+        return _voltage_mismatch(*key)
+    except TypeError:  # unhashable rating: decide it without the table
+        return _voltage_mismatch.__wrapped__(*key)
+
+
+def battery_controller_mismatches(ctx):
+    """Rule 4: battery/controller pairs whose voltages do not match, once per distinct SKU pair"""
+    controllers = distinct_lines(c for c in ctx.controllers if not c.get("includes_controller", False))  # Skip if controller is included with battery
+    if not controllers:
+        return
+
+    # Compatibility depends only on the battery rating and the controller's voltage set (or Beast),
+    # so it is decided once per distinct pair of those before any per-SKU finding
+    controller_kinds = {("Beast",) if "Beast" in c["name"] else ("set", c["rating"]): c for c in controllers}
+    matches = {}
+    for battery in distinct_lines(ctx.batteries):
+        rating = battery["rating"]
+        if rating not in matches:
+            matches[rating] = all(_battery_controller_mismatch(battery, c) is None for c in controller_kinds.values())
+        if matches[rating]:
+            continue
+        for controller in controllers:
+            kind = _battery_controller_mismatch(battery, controller)
+            if kind:
+                yield {"kind": kind, "battery": battery, "controller": controller}
+
+
+def battery_inverter_mismatches(ctx):
+    """Rule 4.5: batteries whose voltage differs from an inverter's DC input, once per distinct SKU and rating"""
+    for battery in distinct_lines(ctx.batteries):
+        # Inverters and Solar Inverters have a default_rating for their DC input voltage
+        for inverter in (ctx.inverter, ctx.solar_inverter):
+            if not inverter:
+                continue
+            try:
+                rating = int(inverter.get("rating", 0))
+            except (ValueError, TypeError):
+                yield {"kind": "invalid", "battery": battery, "inverter": inverter}
+                continue
+            if battery["rating"] != rating:
+                yield {"kind": "voltage", "battery": battery, "inverter": inverter, "rating": rating}
+
+
+# Rules in evaluation order; messages appear in this order
+RULE_SET = (
+    Rule("1", "AC Product with DC Components requires Inverter", (
+        Check(("ac_without_inverter", "battery_or_appliances"), "fail",
+              "⚠️ AC product requires either Inverter or Solar Inverter when using DC components like Battery or DC appliances"),
+    )),
+    Rule("2", "DC Product should not use Inverter", (
+        Check(("dc_product", "inverter"), "fail", "⚠️ DC product cannot use Inverter (already DC-compatible)"),
+    )),
+    Rule("3", "Battery requires compatible Controller (unless battery includes one), only with solar panels", (
+        Check(("panels_and_battery_without_controller",), "fail",
+              "⚠️ Solar panels require a Solar Controller when connected to a battery"),
+    )),
+    Rule("4", "Voltage matching between Battery and Controllers", (
+        Check((), "fail", {
+            "beast": "⚠️ {battery[name]} ({battery[rating]}V) not compatible with {controller[name]} (48V system only)",
+            "voltage": "⚠️ {battery[name]} ({battery[rating]}V) not compatible with {controller[name]} (supports {controller[rating]}V)",
+            "invalid": "⚠️ Invalid voltage configuration between {battery[name]} and {controller[name]}",
+        }, findings=battery_controller_mismatches, unique=True),
+    )),
+    Rule("4.5", "Voltage matching between Battery and Inverters", (
+        Check((), "fail", {
+            "voltage": "⚠️ {battery[name]} ({battery[rating]}V) not compatible with {inverter[name]} DC input ({rating}V)",
+            "invalid": "⚠️ Voltage configuration error between {battery[name]} and {inverter[name]}",
+        }, findings=battery_inverter_mismatches, unique=True),
+    )),
+    Rule("5", "Total appliance power (plus the product) against each controller's output", (
+        Check(("controller",), "fail",
+              "⚠️ Total appliance power ({ctx.total_appliance_power}W) exceeds {controller[name]} max output ({controller_power}W)",
+              each="controller in ctx.controllers", let={"controller_power": 'float(controller.get("power_rating", 0))'},
+              test="ctx.total_appliance_power > controller_power"),
+    )),
+    Rule("6", "Battery Charge/Discharge C-rating limits", (
+        Check((), "fail",
+              "⚠️ Total solar power ({ctx.total_solar_power}W) exceeds {battery[name]} max charge rate ({max_charge_power:.0f}W)",
+              each="battery in ctx.batteries",
+              let={"battery_capacity": 'float(battery.get("battery_capacity", 0))',
+                   "max_charge_power": 'battery_capacity * float(battery.get("battery_charge_c_rating", 1.0))'},
+              test="ctx.solar_panels and ctx.total_solar_power > max_charge_power"),
+        Check((), "fail",
+              "⚠️ Total load ({ctx.total_appliance_power}W) exceeds {battery[name]} max discharge rate ({max_discharge_power:.0f}W)",
+              each="battery in ctx.batteries",
+              let={"battery_capacity": 'float(battery.get("battery_capacity", 0))',
+                   "max_discharge_power": 'battery_capacity * float(battery.get("battery_discharge_c_rating", 1.0))'},
+              test="ctx.total_appliance_power > max_discharge_power"),
+    )),
+    Rule("7", "Motor attachment compatibility", (
+        Check(("motor_attachments", "!mighty_motor"), "fail", "⚠️ Motor attachments require a Mighty Motor appliance in the system"),
+    )),
+    Rule("8", "Cooker accessories compatibility", (
+        Check(("cooker_accessories", "!cooker"), "fail", "⚠️ Cooker accessories require a SunPot or SolarEPC appliance in the system"),
+    )),
+    Rule("9", "Total solar panel power against each controller's input", (
+        Check(("solar_panels", "controller"), "fail",
+              "⚠️ Total solar panel power ({ctx.total_solar_power}W) exceeds {controller[name]} max input ({controller_power}W)",
+              each="controller in ctx.controllers", let={"controller_power": 'float(controller.get("power_rating", 0))'},
+              test="ctx.total_solar_power > controller_power"),
+    )),
+    Rule("10", "Ice-maker and icebox compatibility (advisory only)", (
+        Check(("ice_maker", "!icebox"), "warn", "💡 Consider adding an insulated icebox for optimal ice-maker performance"),
+    )),
+    Rule("11", "Inverter capacity check", (
+        Check(("inverter", "ac_loads"), "fail",
+              "⚠️ {ctx.biggest_ac_load_name} ({ctx.biggest_ac_load_power}W) exceeds Inverter capacity ({inverter_power}W)",
+              let={"inverter_power": 'float(ctx.inverter.get("power_rating", 0))'},
+              test="ctx.biggest_ac_load_power > inverter_power"),
+        # Information about the total AC load, not an error
+        Check(("inverter", "ac_loads", "several_ac_devices"), "info",
+              "ℹ️ Total AC load: {ctx.total_ac_load_power}W (across {ctx.ac_device_count} devices)"),
+    )),
+    Rule("12", "System configuration compatibility: allowed Solar Inverter / traditional combinations", (
+        # Solar Inverter systems
+        Check(("solar_inverter", "inverter"), "fail", "⚠️ Solar Inverter cannot be used with a plain Inverter (redundant)"),
+        Check(("solar_inverter", "controller", "!battery_includes_controller"), "info",
+              "ℹ️ Note: Solar Inverter includes built-in MPPT controller"),
+        Check(("solar_inverter", "!battery"), "fail", "⚠️ Solar Inverter requires a battery for energy storage"),
+        Check(("solar_inverter", "ac_loads"), "fail",
+              "⚠️ {ctx.biggest_ac_load_name} ({ctx.biggest_ac_load_power}W) exceeds Solar Inverter capacity ({solar_inverter_power}W)",
+              let={"solar_inverter_power": 'float(ctx.solar_inverter.get("power_rating", 0))'},
+              test="ctx.biggest_ac_load_power > solar_inverter_power"),
+        # Traditional systems
+        Check(("!solar_inverter", "ac_without_inverter", "battery"), "fail",
+              "⚠️ AC system requires either Inverter or Solar Inverter with battery"),
+        Check(("!solar_inverter", "panels_and_battery_without_controller"), "fail",
+              "⚠️ Solar panels with battery require a Solar Controller"),
+    )),
+)
+
+_CONTEXT_FIELDS = {f.name for f in fields(SystemContext)}
+_FIELD = re.compile(r"(\w+)((?:\.\w+|\[\w+\])*)$")
+# Names the compiled functions use for themselves
+_RESERVED = re.compile(r"ctx|report|f|text|seen|v\d+$")
+
+
+def _template_source(template, names, finding):
+    """Python expression building a message template
+
+    names are the local names the template may use; finding is the variable
+    holding the current finding, or None.
+    """
+    parts = []
+    for literal, name, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            parts.append(repr(literal))
+        if name is None:
+            continue
+        match = _FIELD.match(name)
+        if match is None or any(c in spec for c in "{}\"'\\"):
+            raise ValueError(f"Unsupported template field {{{name}}} in {template!r}")
+        root, path = match.groups()
+        steps = re.findall(r"\.(\w+)|\[(\w+)\]", path)
+        if root == "ctx":
+            if not steps or steps[0][0] not in _CONTEXT_FIELDS:
+                raise ValueError(f"Unknown context field in {{{name}}} of {template!r}")
+            expression = f"ctx.{steps.pop(0)[0]}"
+        elif root in names:
+            expression = root
+        elif finding is not None:
+            expression = f"{finding}[{root!r}]"
+        else:
+            raise ValueError(f"Unknown template field {{{name}}} in {template!r}")
+        expression += "".join(f".{attribute}" if attribute else f"[{key!r}]" for attribute, key in steps)
+        parts.append(f'f"{{{expression}{"!" + conversion if conversion else ""}{":" + spec if spec else ""}}}"')
+    return " ".join(parts) or "''"
+
+
+def _indent(lines):
+    return ["    " + line for line in lines]
+
+
+class RulePlan:
+    """A rule set compiled once into Python functions
+
+    Compiling turns the checks into straight-line code. Each predicate and
+    named condition becomes a local variable, computed the first time a check
+    needs it, so a predicate shared by several rules is evaluated once per
+    configuration and a `when` stops at its first false literal. Consecutive
+    checks of a rule over the same `when` and `each` share one loop, and
+    message templates become f-strings formatted only when a check applies.
+
+    run(ctx, report) reports every rule in order. viable(ctx) only looks at
+    failing checks and returns False at the first that applies, without
+    formatting messages. run_rule(rule_id, ctx, report) runs one rule on its
+    own. The generated code is in source.
+    """
+
+    def __init__(self, rules=RULE_SET, predicates=PREDICATES, conditions=CONDITIONS):
+        self.rules = tuple(rules)
+        self.rule_ids = tuple(rule.rule_id for rule in self.rules)
+        if len(set(self.rule_ids)) != len(self.rule_ids):
+            raise ValueError("Duplicate rule ids in rule set")
+        self._predicates = predicates
+        self._conditions = conditions
+        self._namespace = {}
+        functions = [self._function("run", self.rules, viable=False), self._function("viable", self.rules, viable=True)]
+        functions += [self._function(f"rule_{i}", (rule,), viable=False) for i, rule in enumerate(self.rules)]
+        self.source = "\n\n".join(functions)
+        exec(compile(self.source, "<RulePlan>", "exec"), self._namespace)
+        self.run = self._namespace["run"]
+        self.viable = self._namespace["viable"]
+        self._rule_functions = {rule.rule_id: self._namespace[f"rule_{i}"] for i, rule in enumerate(self.rules)}
+
+    def _global(self, prefix, value):
+        """Name under which the generated code reaches value"""
+        for name, known in self._namespace.items():
+            if known is value:
+                return name
+        name = f"{prefix}{len(self._namespace)}"
+        self._namespace[name] = value
+        return name
+
+    def _literal(self, literal, local):
+        """Expression for one `when` literal; local collects the variables it memoizes into"""
+        name = literal.lstrip("!")
+        negated = literal != name
+        if name in self._conditions:
+            compute = self._conjunction(self._conditions[name], local)
+        elif name in self._predicates:
+            predicate = self._predicates[name]
+            if callable(predicate):
+                predicate = f"{self._global('P', predicate)}(ctx)"
+            compute = f"bool({predicate})"
+        else:
+            raise ValueError(f"Unknown predicate {name!r}")
+        variable = local.setdefault(name, f"v{len(local)}")
+        expression = f"({variable} if {variable} is not None else ({variable} := {compute}))"
+        return f"not {expression}" if negated else expression
+
+    def _conjunction(self, when, local):
+        return " and ".join(self._literal(literal, local) for literal in when) or "True"
+
+    def _function(self, name, rules, viable):
+        local = {}
+        body = []
+        for rule in rules:
+            body.append(f"# Rule {rule.rule_id}: {rule.title}")
+            groups = []  # consecutive checks sharing `when` and `each` share a loop
+            for check in rule.checks:
+                if check.severity not in SEVERITIES:
+                    raise ValueError(f"Rule {rule.rule_id}: unknown severity {check.severity!r}")
+                if viable and check.severity != "fail":
+                    continue
+                if groups and check.each and (check.when, check.each) == (groups[-1][0].when, groups[-1][0].each):
+                    groups[-1].append(check)
+                else:
+                    groups.append([check])
+            for group in groups:
+                condition = self._conjunction(group[0].when, local)
+                lines = self._group(rule, group, viable)
+                body += lines if condition == "True" else [f"if {condition}:"] + _indent(lines)
+        header = f"def {name}(ctx):" if viable else f"def {name}(ctx, report):"
+        lines = [header]
+        if local:
+            lines.append("    " + " = ".join(local.values()) + " = None")
+        lines += _indent(body)
+        if viable:
+            lines.append("    return True")
+        elif not rules:
+            lines.append("    pass")
+        return "\n".join(lines)
+
+    def _group(self, rule, group, viable):
+        """Code for checks whose `when` holds: a loop over their `each`, or one check"""
+        lines = []
+        bound = {}  # name -> expression assigned so far
+        if group[0].each:
+            match = re.fullmatch(r"\s*(\w+)\s+in\s+(.+)", group[0].each)
+            if match is None:
+                raise ValueError(f"Rule {rule.rule_id}: each must be 'name in <expression>', not {group[0].each!r}")
+            item, iterable = match.groups()
+            self._check_name(rule, item)
+            bound[item] = None
+        seen = any(check.unique for check in group)
+        for check in group:
+            for name, expression in check.let.items():
+                self._check_name(rule, name)
+                if name in bound:
+                    if bound[name] != expression:
+                        raise ValueError(f"Rule {rule.rule_id}: {name!r} bound to two expressions")
+                    continue
+                bound[name] = expression
+                lines.append(f"{name} = {expression}")
+            lines += self._report(rule, check, set(bound), viable)
+        if group[0].each:
+            lines = [f"for {item} in {iterable}:"] + _indent(lines)
+        if seen and not viable:
+            lines.insert(0, "seen = set()")
+        return lines
+
+    @staticmethod
+    def _check_name(rule, name):
+        if not name.isidentifier() or _RESERVED.fullmatch(name):
+            raise ValueError(f"Rule {rule.rule_id}: {name!r} cannot be bound")
+
+    def _report(self, rule, check, names, viable):
+        """Code reporting one check's message(s) once its `when` holds and its names are bound"""
+        if check.findings is not None:
+            lines = [f"for f in {self._global('F', check.findings)}(ctx):"]
+            if viable:
+                inner = ["return False"]
+            elif isinstance(check.message, dict):
+                inner = []
+                keyword = "if"
+                for kind, template in check.message.items():
+                    inner += [f"{keyword} f['kind'] == {kind!r}:",
+                              f"    text = {_template_source(template, names, 'f')}"]
+                    keyword = "elif"
+                inner += ["else:", "    raise KeyError(f['kind'])"] + self._emit(check)
+            else:
+                inner = [f"text = {_template_source(check.message, names, 'f')}"] + self._emit(check)
+            lines += _indent(inner)
+        elif isinstance(check.message, dict):
+            raise ValueError(f"Rule {rule.rule_id}: a {{kind: template}} message needs findings")
+        elif viable:
+            lines = ["return False"]
+        else:
+            lines = [f"text = {_template_source(check.message, names, None)}"] + self._emit(check)
+        if check.test:
+            lines = [f"if {check.test}:"] + _indent(lines)
+        return lines
+
+    @staticmethod
+    def _emit(check):
+        if check.unique:
+            return ["if text not in seen:", "    seen.add(text)", f"    report.{check.severity}(text)"]
+        return [f"report.{check.severity}(text)"]
+
+    def run_rule(self, rule_id, ctx, report):
+        """Report one rule's messages for a context"""
+        self._rule_functions[rule_id](ctx, report)
+
+    def subset(self, rule_ids):
+        """Plan for only the given rules, in this plan's order"""
+        return RulePlan([rule for rule in self.rules if rule.rule_id in rule_ids], self._predicates, self._conditions)
+
+    def rules_by_id(self):
+        """(rule_id, rule(ctx, report)) pairs in evaluation order, each rule runnable on its own"""
+        return tuple(self._rule_functions.items())
+
+
+RULE_PLAN = RulePlan()
+RULES = RULE_PLAN.rules_by_id()
+
+
+def validate(product_info, user_components):
+    """Run the engineering compatibility rules on a product and its component lines
+
+    Each component dict is one line with a ``quantity``; totals are
+    quantity-weighted and per-component checks run once per line.
+    """
+    ctx = build_context(product_info, user_components)
+    report = RuleReport()
+    RULE_PLAN.run(ctx, report)
+    return build_result(ctx, report)
+
+
+def build_result(ctx, report, status=None, system_limits=None, recommendations=None):
+    """ValidationResult for a context whose rules have been run into report
+
+    status, system_limits and recommendations are computed unless supplied.
+    """
+    if status is None:
+        status = get_system_status(
+            ctx.has_battery,
+            ctx.has_inverter,
+            ctx.has_solar_inverter,
+            ctx.has_solar_panels,
+            ctx.has_controller,
+            ctx.batteries
+        )
+    if system_limits is None:
+        system_limits = get_system_limits(ctx.batteries, ctx.controllers, ctx.solar_panels, ctx.appliances)
+    if recommendations is None:
+        recommendations = get_recommendations(ctx)
+    status_color, status_message = status
+    return ValidationResult(
+        viable=report.viable,
+        messages=report.messages,
+        warnings=report.warnings,
+        status_color=status_color,
+        status_message=status_message,
+        system_limits=system_limits,
+        total_cost=ctx.product_info["price"] + sum(c["price"] * quantity(c) for c in ctx.components),
+        total_weight=ctx.product_info["weight"] + sum(c["weight"] * quantity(c) for c in ctx.components),
+        index=ctx.index,
+        all_ac_loads=ctx.all_ac_loads,
+        biggest_ac_load_power=ctx.biggest_ac_load_power,
+        biggest_ac_load_name=ctx.biggest_ac_load_name,
+        total_ac_load_power=ctx.total_ac_load_power,
+        total_appliance_power=ctx.total_appliance_power,
+        recommendations=recommendations,
+    )
+
+
+def get_system_limits(batteries, controllers, solar_panels, appliances):
+    """Figures shown in the Power System Summary"""
+    system_limits = {}
+
+    if solar_panels:
+        total_solar_power = weighted_sum(solar_panels, "power_rating")
+        system_limits["Total Solar Power"] = f"{total_solar_power}Wp"
+
+    if controllers:
+        total_controller_power = weighted_sum(controllers, "power_rating")
+        system_limits["Total Controller Capacity"] = f"{total_controller_power}W"
+
+    if batteries:
+        total_battery_capacity = weighted_sum(batteries, "battery_capacity")
+
+        # Calculate max charge and discharge power
+        max_charge_power = sum(float(b.get("battery_capacity", 0)) * float(b.get("battery_charge_c_rating", 1.0)) * quantity(b) for b in batteries)
+        max_discharge_power = sum(float(b.get("battery_capacity", 0)) * float(b.get("battery_discharge_c_rating", 1.0)) * quantity(b) for b in batteries)
+
+        system_limits["Total Battery Capacity"] = f"{total_battery_capacity}Wh"
+        system_limits["Battery Voltage"] = f"{batteries[0]['rating']}V"  # assumes all batteries same voltage
+        system_limits["Max Solar Input"] = f"{max_charge_power:.0f}W"
+        system_limits["Max Load Output"] = f"{max_discharge_power:.0f}W"
+
+    if appliances:
+        total_appliance_power = weighted_sum(appliances, "power_rating")
+        system_limits["Total Appliance Power"] = f"{total_appliance_power}W"
+
+    return system_limits
+
+
+def get_recommendations(ctx):
+    """Advice for the Recommendations section as (kind, text) pairs; kind names the Streamlit element"""
+    index = ctx.index
+    inverter = ctx.inverter
+    solar_inverter = ctx.solar_inverter
+    advice = []
+
+    # Warning about missing solar panels
+    if index.has(Role.BATTERY) and index.has(Role.INVERTER) and not index.has(Role.SOLAR_PANEL):
+        advice.append(("warning", "⚠️ **Important:** This system has no built-in energy source. It requires either:"))
+        advice.append(("markdown", "- User-provided solar panels"))
+        advice.append(("markdown", "- Grid connection (not yet modeled)"))
+        advice.append(("markdown", "- Generator input (not yet modeled)"))
+        advice.append(("markdown", ""))  # Add spacing
+
+    # Inverter recommendation
+    if (inverter or solar_inverter) and ctx.all_ac_loads:
+        selected_inverter = inverter if inverter else solar_inverter
+        inverter_type = "Solar Inverter" if solar_inverter else "Inverter"
+        inverter_power = float(selected_inverter.get("power_rating", 0))
+
+        # Check if inverter is near capacity
+        if ctx.biggest_ac_load_power > inverter_power * 0.8:  # If load is more than 80% of inverter capacity
+            advice.append(("info", f"🔌 **{inverter_type} sizing:** Your biggest load ({ctx.biggest_ac_load_power}W) uses {ctx.biggest_ac_load_power/inverter_power*100:.0f}% of {inverter_type.lower()} capacity ({inverter_power}W). Consider upgrading for safety margin."))
+            advice.append(("markdown", ""))  # Add spacing
+
+        # Check if multiple devices exceed total inverter capacity
+        if ctx.ac_device_count > 1 and ctx.total_ac_load_power > inverter_power:
+            advice.append(("warning", f"⚠️ **Load management needed:** Total AC load ({ctx.total_ac_load_power}W) exceeds {inverter_type.lower()} capacity ({inverter_power}W). Devices cannot run simultaneously."))
+            advice.append(("markdown", ""))  # Add spacing
+
+    # Solar Inverter specific recommendations
+    if index.has(Role.SOLAR_INVERTER):
+        if not index.has(Role.BATTERY):
+            advice.append(("error", "❌ **Missing battery:** Solar Inverter requires a battery for energy storage"))
+        elif index.has(Role.CONTROLLER) and not any(b.get("includes_controller", False) for b in index[Role.BATTERY]):
+            advice.append(("info", "💡 **Note:** Solar Inverter includes built-in MPPT controller. External controller may not be needed."))
+
+    if index.has(Role.BATTERY) and not index.has(Role.CONTROLLER) and not any(b.get("includes_controller", False) for b in index[Role.BATTERY]):
+        advice.append(("info", "Consider adding a Solar Controller for better battery charging efficiency"))
+
+    if index.has(Role.SOLAR_PANEL) and not index.has(Role.CONTROLLER) and not index.has(Role.BATTERY):
+        advice.append(("info", "Solar panels work best with a battery and controller system for energy storage"))
+
+    if sum(quantity(c) for c in index[Role.MOTOR_ATTACHMENT]) > 1:
+        advice.append(("info", "Multiple motor attachments selected - ensure they are compatible with each other"))
+
+    if any("Ice-maker" in appliance["name"] for appliance in index[Role.APPLIANCE]) and not index[Role.ICEBOX]:
+        advice.append(("info", "Ice-maker works best with an insulated icebox to maintain ice quality"))
+
+    # Runtime uses the appliance-only load when appliances are present, as the Power System Summary does
+    total_appliance_power = ctx.total_appliance_power
+    if index.has(Role.APPLIANCE):
+        total_appliance_power = weighted_sum(index[Role.APPLIANCE], "power_rating")
+    if total_appliance_power > 0 and index.has(Role.BATTERY):
+        total_battery_capacity = weighted_sum(index[Role.BATTERY], "battery_capacity")
+        runtime_hours = total_battery_capacity / total_appliance_power
+        advice.append(("info", f"Estimated battery runtime: {runtime_hours:.1f} hours at full load"))
+
+    # Cable recommendations
+    if index.has(Role.SOLAR_PANEL) and not index.has(Role.CABLE):
+        advice.append(("info", "Consider adding solar cables and mounting hardware for your solar panels"))
+
+    if index.has(Role.BATTERY) and not any("Battery cable" in c["name"] for c in index[Role.CABLE]):
+        advice.append(("info", "Consider adding battery cables for proper battery connections"))
+
+    return advice
+
+
+# --- Incremental revalidation ---
+
+# Line fields behind the derived totals in SystemContext
+_AC_LOAD_PRODUCT = ("name", "voltage", "power_watts")
+_AC_LOAD_APPLIANCE = ("name", "voltage", "power_rating", "quantity")
+_LOAD = ("power_rating", "quantity")
+
+# What each stage reads: (product fields, {role: line fields}). Lines of a listed role are
+# projected in order, so an empty field tuple still tracks how many lines there are.
+STAGE_INPUTS = {
+    "1": (("voltage",), {Role.BATTERY: (), Role.APPLIANCE: (), Role.INVERTER: (), Role.SOLAR_INVERTER: ()}),
+    "2": (("voltage",), {Role.INVERTER: ()}),
+    "3": ((), {Role.BATTERY: ("includes_controller",), Role.SOLAR_PANEL: (), Role.CONTROLLER: ()}),
+    "4": ((), {Role.BATTERY: ("name", "rating"), Role.CONTROLLER: ("name", "rating", "includes_controller")}),
+    "4.5": ((), {Role.BATTERY: ("name", "rating"), Role.INVERTER: ("name", "rating"), Role.SOLAR_INVERTER: ("name", "rating")}),
+    "5": (("power_watts",), {Role.APPLIANCE: _LOAD, Role.CONTROLLER: ("name", "power_rating")}),
+    "6": (("power_watts",), {Role.APPLIANCE: _LOAD, Role.SOLAR_PANEL: _LOAD,
+                             Role.BATTERY: ("name", "battery_capacity", "battery_charge_c_rating", "battery_discharge_c_rating")}),
+    "7": ((), {Role.MOTOR_ATTACHMENT: (), Role.APPLIANCE: ("name",)}),
+    "8": ((), {Role.COOKER_ACCESSORY: (), Role.APPLIANCE: ("name",)}),
+    "9": ((), {Role.SOLAR_PANEL: _LOAD, Role.CONTROLLER: ("name", "power_rating")}),
+    "10": ((), {Role.APPLIANCE: ("name",), Role.ICEBOX: ()}),
+    "11": (_AC_LOAD_PRODUCT, {Role.APPLIANCE: _AC_LOAD_APPLIANCE, Role.INVERTER: ("power_rating",)}),
+    "12": (_AC_LOAD_PRODUCT, {
+        Role.APPLIANCE: _AC_LOAD_APPLIANCE, Role.SOLAR_INVERTER: ("power_rating",), Role.INVERTER: (),
+        Role.CONTROLLER: (), Role.BATTERY: ("includes_controller",), Role.SOLAR_PANEL: (),
+    }),
+    "status": ((), {Role.BATTERY: ("includes_controller",), Role.INVERTER: (), Role.SOLAR_INVERTER: (),
+                    Role.SOLAR_PANEL: (), Role.CONTROLLER: ()}),
+    "limits": ((), {Role.SOLAR_PANEL: _LOAD, Role.CONTROLLER: _LOAD, Role.APPLIANCE: _LOAD,
+                    Role.BATTERY: ("rating", "battery_capacity", "battery_charge_c_rating", "battery_discharge_c_rating", "quantity")}),
+    "recommendations": (_AC_LOAD_PRODUCT, {
+        Role.APPLIANCE: _AC_LOAD_APPLIANCE, Role.BATTERY: ("includes_controller", "battery_capacity", "quantity"),
+        Role.INVERTER: ("power_rating",), Role.SOLAR_INVERTER: ("power_rating",), Role.SOLAR_PANEL: (),
+        Role.CONTROLLER: (), Role.MOTOR_ATTACHMENT: ("quantity",), Role.ICEBOX: (), Role.CABLE: ("name",),
+    }),
+}
+
+
+def stage_key(ctx, stage):
+    """Projection of a configuration onto the inputs STAGE_INPUTS declares for a stage
+
+    Values carry their types, so a change from 24 to 24.0 (which formats
+    differently) counts as a change.
+    """
+    product_fields, line_fields = STAGE_INPUTS[stage]
+    return (
+        _typed(tuple(map(ctx.product_info.get, product_fields))),
+        tuple(tuple(_typed(tuple(map(line.get, fields))) for line in ctx.index[role]) for role, fields in line_fields.items()),
+    )
+
+
+def _run_rule(rule_id, ctx):
+    report = RuleReport()
+    RULE_PLAN.run_rule(rule_id, ctx, report)
+    return report
+
+
+class IncrementalValidator:
+    """validate() that only re-runs stages whose declared inputs changed since the previous call
+
+    Stages are the rules, the system status, the system limits and the
+    recommendations; the outputs of unchanged stages are reused, so results
+    share objects and must be treated as read-only. One instance follows one
+    evolving configuration, such as a UI session.
+    """
+
+    def __init__(self):
+        self._outputs = {}
+        self.evaluated = []  # stages computed by the last validate() call
+        self.reused = []  # stages served from the previous outputs
+
+    def _stage(self, stage, ctx, compute):
+        key = stage_key(ctx, stage)
+        previous = self._outputs.get(stage)
+        if previous is not None and previous[0] == key:
+            self.reused.append(stage)
+            return previous[1]
+        output = compute()
+        self._outputs[stage] = (key, output)
+        self.evaluated.append(stage)
+        return output
+
+    def validate(self, product_info, user_components):
+        self.evaluated = []
+        self.reused = []
+        ctx = build_context(product_info, user_components)
+        report = RuleReport()
+        for rule_id in RULE_PLAN.rule_ids:
+            report.merge(self._stage(rule_id, ctx, lambda rule_id=rule_id: _run_rule(rule_id, ctx)))
+        status = self._stage("status", ctx, lambda: get_system_status(
+            ctx.has_battery, ctx.has_inverter, ctx.has_solar_inverter, ctx.has_solar_panels, ctx.has_controller, ctx.batteries))
+        system_limits = self._stage("limits", ctx, lambda: get_system_limits(ctx.batteries, ctx.controllers, ctx.solar_panels, ctx.appliances))
+        recommendations = self._stage("recommendations", ctx, lambda: get_recommendations(ctx))
+        return build_result(ctx, report, status, system_limits, recommendations)
@@ -0,0 +1,175 @@
+"""Optional per-stage timing and allocation counts for solarcomp.py reruns.
+
+A rerun opens a profile with start_run(). At each section boundary the
+script calls lap(stage), and the wall time and the net change in allocated
+memory blocks since the previous lap are charged to that stage. Markers
+between statements keep the flat script unindented, and a disabled profile
+is a no-op. When tracemalloc is tracing (e.g. PYTHONTRACEMALLOC=1), each
+stage also records its peak traced bytes above what was live when it began.
+
+Finished reruns are folded into a process-wide registry. Every Streamlit
+session reruns on its own thread, so the registry is locked. It renders as
+Prometheus text exposition, for the debug panel's download or an optional
+/metrics endpoint (serve_metrics).
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the stage duration histogram
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RerunProfile:
+    """Stage timings of one script rerun, in lap order"""
+    enabled = True
+
+    def __init__(self, registry=None):
+        self.registry = registry
+        self.stages = []  # (stage, seconds, allocated_blocks, peak_bytes or None)
+        self._last = time.perf_counter()
+        self._blocks = sys.getallocatedblocks()
+        self._traced = 0
+        if tracemalloc.is_tracing():
+            self._traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    def lap(self, stage):
+        """Charge everything since the previous lap (or the start) to stage"""
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        peak = None
+        if tracemalloc.is_tracing():
+            current, high = tracemalloc.get_traced_memory()
+            peak = high - self._traced  # above what was live when the stage began
+            self._traced = current
+            tracemalloc.reset_peak()
+        self.stages.append((stage, now - self._last, blocks - self._blocks, peak))
+        self._last = now
+        self._blocks = blocks
+
+    @property
+    def total_seconds(self):
+        return sum(seconds for _, seconds, _, _ in self.stages)
+
+    def finish(self):
+        """Add this rerun to the registry; call once, after the last lap"""
+        if self.registry is not None:
+            self.registry.record(self)
+
+    def rows(self):
+        """Table rows for the debug panel, slowest stage first, then a total"""
+        rows = []
+        for stage, seconds, blocks, peak in sorted(self.stages, key=lambda s: -s[1]):
+            row = {"stage": stage, "ms": round(seconds * 1e3, 2), "allocated blocks": blocks}
+            if peak is not None:
+                row["peak KiB"] = round(peak / 1024, 1)
+            rows.append(row)
+        total = {"stage": "total", "ms": round(self.total_seconds * 1e3, 2),
+                 "allocated blocks": sum(blocks for _, _, blocks, _ in self.stages)}
+        peaks = [peak for _, _, _, peak in self.stages if peak is not None]
+        if peaks:
+            total["peak KiB"] = round(max(peaks) / 1024, 1)
+        rows.append(total)
+        return rows
+
+
+class NullProfile:
+    """Stand-in when profiling is off: laps cost one method call"""
+    enabled = False
+    stages = ()
+
+    def lap(self, stage):
+        pass
+
+    def finish(self):
+        pass
+
+
+class MetricsRegistry:
+    """Stage timings aggregated over every profiled rerun in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reruns = 0
+        self.stages = {}  # stage -> {"count", "seconds", "blocks", "buckets", "last"}
+
+    def record(self, profile):
+        with self._lock:
+            self.reruns += 1
+            for stage, seconds, blocks, _ in profile.stages:
+                entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "blocks": 0,
+                                                       "buckets": [0] * len(BUCKETS), "last": 0.0})
+                entry["count"] += 1
+                entry["seconds"] += seconds
+                entry["blocks"] += blocks
+                entry["last"] = seconds
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        entry["buckets"][i] += 1
+
+    def prometheus(self):
+        """Text exposition format (version 0.0.4) of the aggregated metrics"""
+        with self._lock:
+            stages = {stage: dict(entry, buckets=list(entry["buckets"])) for stage, entry in self.stages.items()}
+            reruns = self.reruns
+        lines = [
+            "# HELP solarcomp_reruns_total Profiled solarcomp.py reruns.",
+            "# TYPE solarcomp_reruns_total counter",
+            f"solarcomp_reruns_total {reruns}",
+            "# HELP solarcomp_stage_seconds Wall time per solarcomp.py stage.",
+            "# TYPE solarcomp_stage_seconds histogram",
+        ]
+        for stage, entry in stages.items():
+            for bound, count in zip(BUCKETS, entry["buckets"]):
+                lines.append(f'solarcomp_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'solarcomp_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'solarcomp_stage_seconds_sum{{stage="{stage}"}} {entry["seconds"]:.6f}')
+            lines.append(f'solarcomp_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        lines += [
+            "# HELP solarcomp_stage_last_seconds Wall time of the most recent run of each stage.",
+            "# TYPE solarcomp_stage_last_seconds gauge",
+        ]
+        lines += [f'solarcomp_stage_last_seconds{{stage="{stage}"}} {entry["last"]:.6f}' for stage, entry in stages.items()]
+        lines += [
+            "# HELP solarcomp_stage_allocated_blocks_total Net memory blocks allocated per stage, summed over reruns.",
+            "# TYPE solarcomp_stage_allocated_blocks_total counter",
+        ]
+        lines += [f'solarcomp_stage_allocated_blocks_total{{stage="{stage}"}} {entry["blocks"]}' for stage, entry in stages.items()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_run(enabled, registry=REGISTRY):
+    """A RerunProfile feeding registry, or a NullProfile when profiling is off"""
+    return RerunProfile(registry) if enabled else NullProfile()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve registry at http://host:port/metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="solarcomp-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,205 @@
+"""Monte Carlo loss-of-load probability over sampled weather years.
+
+Weather years are resampled from a local hourly irradiance dataset. Each
+sampled day is a whole day taken from a random historical year, within a few
+days of the same date, so daily shape and seasonality survive while
+consecutive days vary. Batches of sampled years go through
+simulation.simulate() in one call, optionally spread over a process pool.
+
+Batch i always draws from the i-th child of the run's SeedSequence, and
+batches are consumed in order. The estimate and the stopping point therefore
+depend only on the seed, never on worker count or timing. Sampling stops once
+the confidence interval of the loss-of-load probability is narrower than the
+tolerance.
+
+The dataset is a .npy array, or a CSV whose last column is irradiance
+(W/m²), holding a whole number of 8760-hour years in hour order.
+
+Usage::
+
+    python montecarlo.py irradiance.csv quote.json --hours-per-day 4 --workers 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from statistics import NormalDist
+
+import numpy as np
+
+from batch import build_configuration
+from catalog import load_catalog
+from simulation import HOURS_PER_YEAR, SystemModel, daily_load_profile, simulate
+
+DAYS_PER_YEAR = HOURS_PER_YEAR // 24
+
+
+@lru_cache(maxsize=None)
+def load_irradiance(path):
+    """Hourly irradiance as a read-only (years, 365, 24) array; cached so each path is read once per process"""
+    if str(path).lower().endswith(".npy"):
+        values = np.load(path).astype(float, copy=False).ravel()
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = [row for row in csv.reader(f) if row]
+        try:
+            float(rows[0][-1])
+        except ValueError:
+            rows = rows[1:]  # header
+        values = np.array([float(row[-1]) for row in rows])
+    if values.size == 0 or values.size % HOURS_PER_YEAR:
+        raise ValueError(f"{path}: expected a whole number of {HOURS_PER_YEAR}-hour years, got {values.size} hours")
+    years = values.reshape(-1, DAYS_PER_YEAR, 24)
+    years.flags.writeable = False
+    return years
+
+
+def sample_years(dataset, rng, count, window=7):
+    """count synthetic years (count, 8760): each day drawn from a random dataset year within ±window days"""
+    source_year = rng.integers(0, dataset.shape[0], size=(count, DAYS_PER_YEAR))
+    shift = rng.integers(-window, window + 1, size=(count, DAYS_PER_YEAR)) if window else 0
+    source_day = (np.arange(DAYS_PER_YEAR) + shift) % DAYS_PER_YEAR
+    return dataset[source_year, source_day].reshape(count, HOURS_PER_YEAR)
+
+
+def _sample_batch(path, model, load, seed, count, window, options):
+    """Worker entry point: loss-of-load probability and unmet Wh for count sampled years"""
+    rng = np.random.default_rng(seed)
+    years = sample_years(load_irradiance(path), rng, count, window)
+    result = simulate(model, years, load, **options)
+    load_hours = max(int((np.asarray(load) > 0).sum()), 1)
+    return result.unmet_hours / load_hours, result.unmet_wh
+
+
+@dataclass
+class MonteCarloResult:
+    """Loss-of-load estimate over sampled weather years"""
+    lolp: float  # mean share of load hours with unserved load
+    ci_low: float
+    ci_high: float
+    confidence: float
+    samples: int
+    shortfall_year_probability: float  # share of sampled years with any unserved load
+    unmet_wh_mean: float
+    converged: bool
+
+
+def _summarise(lolp, unmet, confidence, converged):
+    n = lolp.size
+    mean = float(lolp.mean())
+    half = _half_width(lolp, confidence)
+    return MonteCarloResult(
+        lolp=mean,
+        ci_low=max(mean - half, 0.0),
+        ci_high=min(mean + half, 1.0),
+        confidence=confidence,
+        samples=n,
+        shortfall_year_probability=float((lolp > 0).mean()),
+        unmet_wh_mean=float(unmet.mean()),
+        converged=converged,
+    )
+
+
+def _half_width(values, confidence):
+    if values.size < 2:
+        return np.inf
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return z * float(values.std(ddof=1)) / np.sqrt(values.size)
+
+
+def loss_of_load_probability(model, load, irradiance_path, seed=0, batch_size=64, min_samples=256,
+                             max_samples=4096, tolerance=0.005, confidence=0.95, window=7,
+                             workers=1, executor=None, **options):
+    """Estimate the loss-of-load probability of a SystemModel under sampled weather years
+
+    Draws batch_size years at a time until the confidence interval half-width
+    is at most tolerance (after min_samples) or max_samples is reached. With
+    workers > 1, or an existing executor, batches run on a process pool, and
+    at most two batches per worker are in flight (pass workers alongside
+    an executor to size that window). Extra keyword arguments go
+    to simulation.simulate().
+    """
+    seeds = iter(np.random.SeedSequence(seed).spawn(-(-max_samples // batch_size)))
+    lolp = []
+    unmet = []
+
+    def done():
+        n = sum(part.size for part in lolp)
+        if n >= max_samples:
+            return True
+        if n < min_samples:
+            return False
+        return _half_width(np.concatenate(lolp), confidence) <= tolerance
+
+    def args(seed_seq):
+        return irradiance_path, model, load, seed_seq, batch_size, window, options
+
+    if executor is None and workers == 1:
+        for seed_seq in seeds:
+            part_lolp, part_unmet = _sample_batch(*args(seed_seq))
+            lolp.append(part_lolp)
+            unmet.append(part_unmet)
+            if done():
+                break
+    else:
+        workers = workers or os.cpu_count() or 1
+        own_pool = executor is None
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        in_flight = 2 * workers
+        pending = deque()
+        try:
+            for seed_seq in seeds:
+                pending.append(pool.submit(_sample_batch, *args(seed_seq)))
+                if len(pending) < in_flight:
+                    continue
+                part_lolp, part_unmet = pending.popleft().result()
+                lolp.append(part_lolp)
+                unmet.append(part_unmet)
+                if done():
+                    break
+            while pending and not done():
+                part_lolp, part_unmet = pending.popleft().result()
+                lolp.append(part_lolp)
+                unmet.append(part_unmet)
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_pool:
+                pool.shutdown(cancel_futures=True)
+
+    lolp = np.concatenate(lolp)[:max_samples]
+    unmet = np.concatenate(unmet)[:max_samples]
+    converged = bool(lolp.size >= min_samples and _half_width(lolp, confidence) <= tolerance)
+    return _summarise(lolp, unmet, confidence, converged)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate the loss-of-load probability of a quote under sampled weather years.")
+    parser.add_argument("irradiance", help="hourly irradiance dataset (.npy or .csv, whole 8760-hour years)")
+    parser.add_argument("quote", help="quote as a JSON object in batch.py's JSONL format")
+    parser.add_argument("--hours-per-day", type=float, default=4.0, help="hours of full-load use per day (default: 4)")
+    parser.add_argument("--start-hour", type=int, default=8, help="hour the daily use starts (default: 8)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.005, help="target confidence-interval half-width")
+    parser.add_argument("--max-samples", type=int, default=4096)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes; 0 means one per CPU (default: 1, no pool)")
+    args = parser.parse_args(argv)
+
+    with open(args.quote, encoding="utf-8") as f:
+        product_info, components = build_configuration(json.load(f), load_catalog())
+    model = SystemModel.from_configuration(product_info, components)
+    load = daily_load_profile(model.load_watts, args.hours_per_day, args.start_hour)
+    result = loss_of_load_probability(model, load, args.irradiance, seed=args.seed, tolerance=args.tolerance,
+                                      max_samples=args.max_samples, workers=args.workers)
+    json.dump(result.__dict__, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Measured load profiles: memory-mapped ingestion and streaming resampling.
+
+Site logs are minute-resolution power readings (W) covering months. Binary
+and NPY files are memory-mapped, and Parquet columns are read from a
+memory-mapped file into Arrow buffers that NumPy views without copying. In
+every case the returned array stays on disk until a slice of it is touched.
+
+resample() reduces such an array to hourly mean power a chunk at a time. CSV
+logs, which cannot be mapped, go through resample_csv(), which parses and
+buckets a fixed number of rows at a time. Either way memory stays bounded by
+the chunk size, not the file size. The hourly result feeds
+simulation.simulate() directly, and ProfileSummary.peak_watts is the measured
+counterpart of a product's power_watts.
+"""
+
+import csv
+import itertools
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from simulation import HOURS_PER_YEAR
+
+DEFAULT_STEP_SECONDS = 60
+HOUR_SECONDS = 3600
+CHUNK_SAMPLES = 1 << 20
+
+
+@dataclass
+class ProfileSummary:
+    """Whole-file figures of a power profile, computed chunk by chunk"""
+    samples: int
+    peak_watts: float
+    mean_watts: float
+    energy_wh: float
+
+
+def open_profile(path, dtype="<f4", column=None):
+    """Zero-copy read-only array of power readings (W) from a .npy, Parquet or raw binary file
+
+    Raw binary files (any other extension) are a flat run of dtype values.
+    Parquet files take column, or else their last numeric column (as CSV logs do).
+    """
+    lower = str(path).lower()
+    if lower.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if lower.endswith((".parquet", ".pq")):
+        return _parquet_column(path, column)
+    return np.memmap(path, dtype=np.dtype(dtype), mode="r")
+
+
+def _parquet_column(path, column):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Reading Parquet load profiles requires pyarrow (pip install pyarrow)") from exc
+
+    table = pq.read_table(path, columns=[column] if column else None, memory_map=True)
+    if column is None:
+        numeric = [name for name, field_type in zip(table.column_names, table.schema.types)
+                   if pa.types.is_floating(field_type) or pa.types.is_integer(field_type)]
+        if not numeric:
+            raise ValueError(f"{path}: no numeric column to read as power")
+        column = numeric[-1]
+    chunks = table.column(column).chunks
+    if len(chunks) == 1 and chunks[0].null_count == 0:
+        return chunks[0].to_numpy(zero_copy_only=True)
+    # Several row groups (or nulls) cannot be one contiguous view; combine once
+    return table.column(column).to_numpy()
+
+
+def summarize(values, step_seconds=DEFAULT_STEP_SECONDS, chunk=CHUNK_SAMPLES):
+    """Peak, mean and energy of a (possibly memory-mapped) profile, touching chunk samples at a time"""
+    peak = -np.inf
+    total = 0.0
+    for start in range(0, len(values), chunk):
+        block = np.asarray(values[start:start + chunk], dtype=float)
+        peak = max(peak, float(block.max()))
+        total += float(block.sum())
+    count = len(values)
+    return ProfileSummary(
+        samples=count,
+        peak_watts=peak if count else 0.0,
+        mean_watts=total / count if count else 0.0,
+        energy_wh=total * step_seconds / HOUR_SECONDS,
+    )
+
+
+def resample(values, step_seconds=DEFAULT_STEP_SECONDS, target_seconds=HOUR_SECONDS, chunk=CHUNK_SAMPLES):
+    """Mean power per target_seconds bucket of a regularly sampled profile, streamed in chunks
+
+    A trailing partial bucket is averaged over the samples it has.
+    """
+    if target_seconds % step_seconds:
+        raise ValueError(f"target step {target_seconds}s is not a multiple of the {step_seconds}s sample step")
+    ratio = target_seconds // step_seconds
+    chunk = max(chunk // ratio, 1) * ratio  # whole buckets per chunk
+    out = np.empty(-(-len(values) // ratio))
+    for start in range(0, len(values), chunk):
+        block = np.asarray(values[start:start + chunk], dtype=float)
+        whole = len(block) // ratio * ratio
+        first = start // ratio
+        out[first:first + whole // ratio] = block[:whole].reshape(-1, ratio).mean(axis=1)
+        if whole < len(block):
+            out[first + whole // ratio] = block[whole:].mean()
+    return out
+
+
+def _timestamps(cells):
+    """Epoch seconds from epoch-number or ISO 8601 cells"""
+    try:
+        return np.array(cells, dtype=float)
+    except ValueError:
+        return np.array(cells, dtype="datetime64[s]").astype(np.int64).astype(float)
+
+
+def resample_csv(path, value_column=None, time_column=None, target_seconds=HOUR_SECONDS, chunk_rows=200_000):
+    """Mean power per target_seconds bucket of a timestamped CSV log, parsed chunk_rows at a time
+
+    Columns default to the first (time) and last (power) of the header.
+    Timestamps may be epoch seconds or ISO 8601 and must be in order. Buckets
+    with no readings are NaN. Returns (first_bucket_epoch_seconds, means,
+    ProfileSummary); the summary's energy integrates the bucket means.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        t_index = header.index(time_column) if time_column else 0
+        v_index = header.index(value_column) if value_column else len(header) - 1
+
+        origin = None
+        sums = np.zeros(0)
+        counts = np.zeros(0)
+        peak = 0.0
+        while True:
+            rows = [row for row in itertools.islice(reader, chunk_rows) if row]
+            if not rows:
+                break
+            bucket = np.floor(_timestamps([row[t_index] for row in rows]) / target_seconds).astype(np.int64)
+            watts = np.array([row[v_index] for row in rows], dtype=float)
+            peak = max(peak, float(watts.max()))
+            if origin is None:
+                origin = int(bucket[0])
+            bucket -= origin
+            if bucket.min() < 0:
+                raise ValueError(f"{path}: timestamps go backwards")
+            size = int(bucket.max()) + 1
+            if size > len(sums):
+                sums = np.concatenate((sums, np.zeros(size - len(sums))))
+                counts = np.concatenate((counts, np.zeros(size - len(counts))))
+            sums[:size] += np.bincount(bucket, weights=watts, minlength=size)
+            counts[:size] += np.bincount(bucket, minlength=size)
+
+    samples = int(counts.sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    energy = float(np.nansum(means)) * target_seconds / HOUR_SECONDS
+    summary = ProfileSummary(
+        samples=samples,
+        peak_watts=peak,
+        mean_watts=float(sums.sum()) / samples if samples else 0.0,
+        energy_wh=energy,
+    )
+    return (origin or 0) * target_seconds, means, summary
+
+
+def hourly_year(hourly, hours=HOURS_PER_YEAR):
+    """Fit an hourly series to one simulated year: gaps become 0 W and short logs repeat"""
+    hourly = np.nan_to_num(np.asarray(hourly, dtype=float), nan=0.0)
+    if hourly.size == 0:
+        return np.zeros(hours)
+    return np.resize(hourly, hours)
+
+
+def load_profile(path, step_seconds=DEFAULT_STEP_SECONDS, dtype="<f4", column=None):
+    """(hourly mean power, ProfileSummary) of a profile file of any supported format"""
+    if str(path).lower().endswith(".csv"):
+        _, hourly, summary = resample_csv(path, value_column=column)
+        return hourly, summary
+    values = open_profile(path, dtype=dtype, column=column)
+    return resample(values, step_seconds), summarize(values, step_seconds)
+
+
+def file_key(path):
+    """(path, size, mtime) for caching derived data until the file changes"""
+    stat = os.stat(path)
+    return str(path), stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,431 @@
+"""Saved quotes in a local SQLite database.
+
+Each saved quote keeps the quote itself in batch.py's JSONL quote format
+(product plus component lines), its totals and its validation result row.
+Columns and indexes serve the lookups the configurator needs:
+
+    quotes(product, total_cost)                product filter, cheapest first
+    quotes(total_cost)                         cost ranges across products
+    quote_skus(sku, quote_id)                  quotes containing a SKU, newest first
+    quote_skus(sku, total_cost)                ... cheapest first
+    quote_skus(sku, product, total_cost)       ... of one product, cheapest first
+
+quote_skus has one row per distinct SKU of a quote, stored as the SKU code
+(or the full name for catalog entries without one). It repeats the quote's
+product and total cost, so SKU lookups never leave their indexes.
+
+Cheapest-first lookups read a cost index in order and stop at the limit.
+For newest-first lookups with a product or cost filter, find() first counts
+matches on the cost index, up to PROBE_ROWS. With fewer matches it reads
+them from that index and sorts them. With more it scans newest first, which
+soon finds a page of them.
+
+Viable quotes also get a quote_features row (similar.FEATURES), which
+similar.SimilarQuotes indexes for nearest-configuration search.
+
+The database is in WAL mode and one QuoteStore can be shared between
+threads, for example the Streamlit sessions of one server process.
+
+Usage::
+
+    python quotestore.py import quote_book.jsonl --vectorized
+    python quotestore.py find --product "Rice Mill" --sku CBA20001 --max-cost 2500
+    python quotestore.py export -o saved.jsonl --product "Rice Mill"
+    python quotestore.py export -o results.csv --results
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from batch import (PRODUCT_FIELDS, build_configuration, detect_format, read_quotes, validate_quote, validate_quotes,
+                   write_results)
+from catalog import load_catalog, sku_code
+from configstore import ConfigStore
+from similar import FEATURES, configuration_features
+
+DEFAULT_PATH = os.environ.get("SOLARCOMP_QUOTES_DB") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "quotes.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    reference TEXT,
+    saved_at REAL NOT NULL,
+    catalog_version TEXT,
+    product TEXT NOT NULL,
+    total_cost REAL NOT NULL,
+    total_weight REAL NOT NULL,
+    viable INTEGER NOT NULL,
+    status_color TEXT,
+    quote TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quote_skus (
+    sku TEXT NOT NULL,
+    quote_id INTEGER NOT NULL REFERENCES quotes(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    product TEXT NOT NULL,
+    total_cost REAL NOT NULL,
+    PRIMARY KEY (sku, quote_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quote_features (
+    quote_id INTEGER PRIMARY KEY REFERENCES quotes(id) ON DELETE CASCADE,
+    power_watts REAL NOT NULL,
+    solar_wp REAL NOT NULL,
+    battery_wh REAL NOT NULL,
+    inverter_w REAL NOT NULL,
+    voltage REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_product_cost ON quotes(product, total_cost);
+CREATE INDEX IF NOT EXISTS quotes_cost ON quotes(total_cost);
+CREATE INDEX IF NOT EXISTS quote_skus_cost ON quote_skus(sku, total_cost);
+CREATE INDEX IF NOT EXISTS quote_skus_product_cost ON quote_skus(sku, product, total_cost);
+CREATE INDEX IF NOT EXISTS quote_skus_quote ON quote_skus(quote_id);
+"""
+
+# Columns of a find() row
+SUMMARY_COLUMNS = ("id", "reference", "saved_at", "product", "total_cost", "total_weight", "viable", "status_color")
+ORDERS = ("recent", "cost", "cost_desc")
+# Newest-first lookups with fewer matches than this are read from the cost index and sorted
+PROBE_ROWS = 5000
+
+
+def sku_key(name):
+    """Value quote_skus stores for a component or SKU code: the code, or the full name when there is none"""
+    return sku_code(name) or name
+
+
+def quote_from_ui(product_info, store, reference=None):
+    """batch.py quote for the configurator's product_info and ConfigStore"""
+    components = []
+    for line in store.components():
+        record = {"name": line["name"]}
+        for field, value in store.settings[line["name"]].items():
+            if field == "inverter_option":
+                record["inverter_capacity"] = value["capacity"]
+            else:
+                record[field] = value
+        components.append(record)
+    product = {"name": product_info["name"]}
+    product.update((field, product_info[field]) for field in PRODUCT_FIELDS)
+    return {"quote_id": reference, "product": product, "components": components}
+
+
+def configuration_from_quote(quote, catalog):
+    """(product object, ConfigStore) for loading a saved quote into the configurator
+
+    Fields the UI has no widget for (a component's power_rating) are dropped;
+    repeated component lines keep the last one.
+    """
+    lines = {}
+    for record in quote.get("components", []):
+        name = record.get("name")
+        spec = catalog.components.get(name)
+        if spec is None:
+            continue
+        settings = {field: value for field, value in record.items() if field not in ("name", "power_rating", "inverter_capacity")}
+        capacity = record.get("inverter_capacity")
+        for option in spec.get("capacity_options", ()):
+            if option["capacity"] == capacity:
+                settings["inverter_option"] = option
+        lines[name] = settings
+    product = quote.get("product")
+    if isinstance(product, str):
+        product = {"name": product}
+    return dict(product or {}), ConfigStore.from_settings(catalog, lines)
+
+
+class QuoteStore:
+    """Saved quotes in one SQLite file; safe to share between threads"""
+
+    def __init__(self, path=DEFAULT_PATH, catalog=None):
+        self.path = path
+        self.catalog = catalog or load_catalog()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _insert(self, quote, row, saved_at):
+        """Insert one validated quote; the caller holds the lock and a transaction"""
+        cursor = self._db.execute(
+            "INSERT INTO quotes (reference, saved_at, catalog_version, product, total_cost, total_weight,"
+            " viable, status_color, quote, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (quote.get("quote_id"), saved_at, self.catalog.version, row["product"], row["total_cost"],
+             row["total_weight"], int(row["viable"]), row["status_color"],
+             json.dumps(quote, ensure_ascii=False, separators=(",", ":")),
+             json.dumps(row, ensure_ascii=False, separators=(",", ":"))))
+        quote_id = cursor.lastrowid
+        quantities = {}
+        for record in quote.get("components", []):
+            key = sku_key(record["name"])
+            quantities[key] = quantities.get(key, 0) + record.get("quantity", 1)
+        self._db.executemany("INSERT INTO quote_skus (sku, quote_id, quantity, product, total_cost) VALUES (?, ?, ?, ?, ?)",
+                             [(sku, quote_id, count, row["product"], row["total_cost"]) for sku, count in quantities.items()])
+        if row["viable"]:
+            self._insert_features(quote_id, quote)
+        return quote_id
+
+    def _insert_features(self, quote_id, quote):
+        features = configuration_features(*build_configuration(quote, self.catalog))
+        self._db.execute(f"INSERT OR REPLACE INTO quote_features (quote_id, {', '.join(FEATURES)}) VALUES (?, ?, ?, ?, ?, ?)",
+                         (quote_id, *features))
+
+    def backfill_features(self, batch_size=10000):
+        """Add quote_features rows for viable quotes saved before the table existed; returns how many"""
+        added = 0
+        while True:
+            with self._lock:
+                missing = self._db.execute(
+                    "SELECT id, quote FROM quotes WHERE viable = 1 AND id NOT IN (SELECT quote_id FROM quote_features)"
+                    " ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+                if not missing:
+                    return added
+                self._db.execute("BEGIN")
+                try:
+                    for quote_id, text in missing:
+                        self._insert_features(quote_id, json.loads(text))
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                self._db.execute("COMMIT")
+            added += len(missing)
+
+    def features(self, after_id=0):
+        """(ids, features) of viable quotes with id > after_id, in id order: an int64 array and an (n, len(FEATURES)) array"""
+        with self._lock:
+            records = self._db.execute(
+                f"SELECT quote_id, {', '.join(FEATURES)} FROM quote_features WHERE quote_id > ? ORDER BY quote_id",
+                (after_id,)).fetchall()
+        table = np.array(records, dtype=np.float64).reshape(-1, len(FEATURES) + 1)
+        return table[:, 0].astype(np.int64), table[:, 1:]
+
+    def save(self, quote, row=None):
+        """Validate (unless row is the quote's batch.py result row) and save one quote; returns its id
+
+        Raises ValueError when the quote does not resolve against the catalog.
+        """
+        row = row or validate_quote(quote, self.catalog)
+        if "error" in row:
+            raise ValueError(row["error"])
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                quote_id = self._insert(quote, row, time.time())
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return quote_id
+
+    def save_many(self, quotes, vectorized=False, batch_size=10000):
+        """Validate and save an iterable of quotes, batch_size per transaction
+
+        Returns (saved, errors): the number saved and the result rows of quotes
+        that did not resolve, which are skipped.
+        """
+        quotes = iter(quotes)
+        saved = 0
+        errors = []
+        while True:
+            chunk = list(itertools.islice(quotes, batch_size))
+            if not chunk:
+                break
+            rows = list(validate_quotes(chunk, self.catalog, vectorized=vectorized))
+            now = time.time()
+            with self._lock:
+                self._db.execute("BEGIN")
+                try:
+                    for quote, row in zip(chunk, rows):
+                        if "error" in row:
+                            errors.append(row)
+                        else:
+                            self._insert(quote, row, now)
+                            saved += 1
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                self._db.execute("COMMIT")
+        with self._lock:
+            self._db.execute("ANALYZE")
+        return saved, errors
+
+    def get(self, quote_id):
+        """{"id", "reference", "saved_at", ..., "quote", "result"} of one saved quote, or None"""
+        with self._lock:
+            record = self._db.execute("SELECT * FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        if record is None:
+            return None
+        saved = dict(record)
+        saved["quote"] = json.loads(saved["quote"])
+        saved["result"] = json.loads(saved["result"])
+        return saved
+
+    def delete(self, quote_id):
+        with self._lock:
+            self._db.execute("DELETE FROM quotes WHERE id = ?", (quote_id,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM quotes").fetchone()[0]
+
+    def _where(self, product=None, sku=None, min_cost=None, max_cost=None, viable=None):
+        """(table, id column, cost index, WHERE clause, params) of a lookup; SKU lookups read quote_skus alone"""
+        clauses = []
+        params = []
+        if sku:
+            table, id_column = "quote_skus", "quote_id"
+            cost_index = "quote_skus_product_cost" if product is not None else "quote_skus_cost"
+            clauses.append("t.sku = ?")
+            params.append(sku_key(sku))
+        else:
+            table, id_column = "quotes", "id"
+            cost_index = "quotes_product_cost" if product is not None else "quotes_cost"
+        if product is not None:
+            clauses.append("t.product = ?")
+            params.append(product)
+        if min_cost is not None:
+            clauses.append("t.total_cost >= ?")
+            params.append(min_cost)
+        if max_cost is not None:
+            clauses.append("t.total_cost <= ?")
+            params.append(max_cost)
+        if viable is not None:
+            clauses.append(f"t.{id_column} IN (SELECT id FROM quotes WHERE viable = ?)" if sku else "t.viable = ?")
+            params.append(int(viable))
+        return table, id_column, cost_index, (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def find(self, product=None, sku=None, min_cost=None, max_cost=None, viable=None, order="recent", limit=50, offset=0):
+        """Summary rows (SUMMARY_COLUMNS) of the saved quotes matching every given filter
+
+        sku is a SKU code or a full component name. order is "recent", "cost"
+        or "cost_desc".
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order: {order}")
+        table, id_column, cost_index, where, params = self._where(product, sku, min_cost, max_cost, viable)
+        columns = ", ".join(("q." if sku else "t.") + column for column in SUMMARY_COLUMNS)
+        with self._lock:
+            if order == "recent":
+                access = ""
+                if product is not None or min_cost is not None or max_cost is not None:
+                    probe = self._db.execute(
+                        f"SELECT count(*) FROM (SELECT 1 FROM {table} t INDEXED BY {cost_index}{where} LIMIT {PROBE_ROWS})",
+                        params).fetchone()[0]
+                    if probe < PROBE_ROWS:
+                        access = f" INDEXED BY {cost_index}"
+                    elif not sku:
+                        access = " NOT INDEXED"
+                ordering = f"t.{id_column} DESC"
+            else:
+                access = f" INDEXED BY {cost_index}"
+                direction = " DESC" if order == "cost_desc" else ""
+                ordering = f"t.total_cost{direction}, t.{id_column}{direction}"
+            source = f"{table} t{access}" + (" JOIN quotes q ON q.id = t.quote_id" if sku else "")
+            query = f"SELECT {columns} FROM {source}{where} ORDER BY {ordering} LIMIT ? OFFSET ?"
+            return [dict(record) for record in self._db.execute(query, params + [limit, offset])]
+
+    def export(self, stream, results=False, fmt="jsonl", **filters):
+        """Write the matching quotes (batch.py quote format) or their result rows to a text stream, oldest first
+
+        Quotes keep their reference as quote_id, or get their database id.
+        fmt "csv" is available for result rows. Returns the number written.
+        """
+        table, _, _, where, params = self._where(**filters)
+        if table == "quote_skus":
+            where = f" WHERE t.id IN (SELECT t.quote_id FROM quote_skus t{where})"
+        # A second connection streams the rows, so a large export does not hold the lock
+        db = sqlite3.connect(self.path)
+        try:
+            cursor = db.execute(f"SELECT t.id, t.{'result' if results else 'quote'} FROM quotes t{where} ORDER BY t.id", params)
+            if results:
+                return write_results((json.loads(text) for _, text in cursor), stream, fmt)
+            if fmt != "jsonl":
+                raise ValueError(f"Quotes export as jsonl only, not {fmt}")
+            count = 0
+            for quote_id, text in cursor:
+                quote = json.loads(text)
+                if quote.get("quote_id") is None:
+                    quote["quote_id"] = str(quote_id)
+                stream.write(json.dumps(quote, ensure_ascii=False))
+                stream.write("\n")
+                count += 1
+            return count
+        finally:
+            db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Save, find and export quotes in the local quote database.")
+    parser.add_argument("--db", default=DEFAULT_PATH, help=f"database file (default: {DEFAULT_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="validate and save a CSV or JSONL quote file")
+    importer.add_argument("input", help="quote file, or - for stdin")
+    importer.add_argument("--input-format", choices=("csv", "jsonl"), help="default: from the input file extension")
+    importer.add_argument("--vectorized", action="store_true", help="validate through vectorized.validate_many")
+
+    for name, help_text in (("find", "list matching quotes"), ("export", "write matching quotes or results")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--product")
+        command.add_argument("--sku", help="SKU code or component name")
+        command.add_argument("--min-cost", type=float)
+        command.add_argument("--max-cost", type=float)
+        if name == "find":
+            command.add_argument("--order", choices=ORDERS, default="recent")
+            command.add_argument("--limit", type=int, default=20)
+        else:
+            command.add_argument("-o", "--output", default="-", help="file, or - for stdout (default)")
+            command.add_argument("--results", action="store_true", help="export validation result rows instead of quotes")
+            command.add_argument("--output-format", choices=("csv", "jsonl"), help="default: from the output file extension")
+    args = parser.parse_args(argv)
+
+    store = QuoteStore(args.db)
+    try:
+        if args.command == "import":
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+            try:
+                started = time.perf_counter()
+                saved, errors = store.save_many(read_quotes(source, args.input_format or detect_format(args.input)),
+                                                vectorized=args.vectorized)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            print(f"saved {saved} quotes in {time.perf_counter() - started:.1f}s, skipped {len(errors)}", file=sys.stderr)
+            for row in errors[:10]:
+                print(f"  {row['quote_id']}: {row['error']}", file=sys.stderr)
+            return
+        filters = {"product": args.product, "sku": args.sku, "min_cost": args.min_cost, "max_cost": args.max_cost}
+        if args.command == "find":
+            for row in store.find(order=args.order, limit=args.limit, **filters):
+                print(json.dumps(row, ensure_ascii=False))
+            return
+        fmt = args.output_format or ("jsonl" if args.output == "-" else detect_format(args.output))
+        target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+        try:
+            count = store.export(target, results=args.results, fmt=fmt, **filters)
+        finally:
+            if target is not sys.stdout:
+                target.close()
+        print(f"exported {count} {'results' if args.results else 'quotes'}", file=sys.stderr)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
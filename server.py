@@ -0,0 +1,444 @@
+"""HTTP/JSON quoting service over the validation engine, using only the standard library.
+
+Endpoints take a POST with a JSON body:
+
+    /validate   Rules 1-12 and the system status, as the rows batch.py writes
+    /price      total cost and weight, with a priced line list
+    /summarize  components by category plus the power summary the UI shows
+
+A body is one quote in batch.py's JSONL format, or ``{"quotes": [...]}`` (or
+a bare JSON list) to batch many quotes into one request. A batched /validate
+runs through vectorized.validate_many. GET /stats reports request counts and
+p50/p90/p99 latency for each endpoint across all workers. GET /health is a
+liveness probe.
+
+The parent process binds the socket and pre-forks --workers processes that
+share it. Before accepting connections, each worker loads the catalog and
+validates a sample quote. The first request therefore never pays for catalog
+parsing or cold caches. Connections are HTTP/1.1 keep-alive with a thread
+each, and repeated quotes are answered from engine.validate_cached.
+
+Usage::
+
+    python server.py --port 8000 --workers 4
+    python server.py --bench http://127.0.0.1:8000/validate --requests 20000 --concurrency 32
+"""
+
+import argparse
+import bisect
+import http.client
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import RawArray
+from urllib.parse import urlsplit
+
+from batch import QUOTE_ERRORS, build_configuration, quote_id, validate_quote, validate_quotes
+from catalog import load_catalog
+from engine import Role, group_by_category, validate_cached, weighted_sum
+
+# Latency buckets grow by 5% from 10 µs to about 100 s, so percentiles are within 5%
+BUCKET_BASE = 1e-5
+BUCKET_GROWTH = 1.05
+BUCKETS = 330
+BUCKET_EDGES = [BUCKET_BASE * BUCKET_GROWTH ** i for i in range(BUCKETS)]
+
+# Largest request body accepted by default; larger ones get 413 without being read
+MAX_BODY = 32 << 20
+
+
+def percentile(sorted_values, q):
+    """q-th percentile (0-100) of an ascending list, nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LatencyStats:
+    """Per-endpoint latency histograms in shared memory, one row per worker process
+
+    Each worker only writes its own row (under a thread lock), so workers never
+    contend. Any worker can read every row to report totals.
+    """
+
+    def __init__(self, endpoints, workers):
+        self.endpoints = tuple(endpoints)
+        self.workers = workers
+        self.counts = RawArray("Q", workers * len(self.endpoints) * BUCKETS)
+        self.slot = 0
+        self._lock = threading.Lock()
+
+    def _offset(self, slot, endpoint):
+        return (slot * len(self.endpoints) + self.endpoints.index(endpoint)) * BUCKETS
+
+    def record(self, endpoint, seconds):
+        bucket = min(bisect.bisect_left(BUCKET_EDGES, seconds), BUCKETS - 1)
+        i = self._offset(self.slot, endpoint) + bucket
+        with self._lock:
+            self.counts[i] += 1
+
+    def histogram(self, endpoint):
+        """Bucket counts of one endpoint summed over all workers"""
+        total = [0] * BUCKETS
+        for slot in range(self.workers):
+            start = self._offset(slot, endpoint)
+            for bucket, count in enumerate(self.counts[start:start + BUCKETS]):
+                total[bucket] += count
+        return total
+
+    def report(self):
+        """{endpoint: {"requests": n, "p50_ms": ..., "p90_ms": ..., "p99_ms": ...}}"""
+        out = {}
+        for endpoint in self.endpoints:
+            counts = self.histogram(endpoint)
+            n = sum(counts)
+            row = {"requests": n}
+            for q in (50, 90, 99):
+                row[f"p{q}_ms"] = round(self._quantile(counts, n, q) * 1e3, 3)
+            out[endpoint] = row
+        return out
+
+    @staticmethod
+    def _quantile(counts, n, q):
+        """Upper edge of the bucket holding the q-th percentile"""
+        if not n:
+            return 0.0
+        rank = max(math.ceil(q / 100 * n), 1)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return BUCKET_EDGES[bucket]
+        return BUCKET_EDGES[-1]
+
+
+# --- Endpoints ---
+
+def _quotes(body):
+    """(quotes, batched) from a request body; batched quotes without an id are numbered from 1"""
+    if isinstance(body, dict) and "quotes" in body:
+        body = body["quotes"]
+        if not isinstance(body, list):
+            raise ValueError('"quotes" must be a list')
+    if isinstance(body, list):
+        for position, quote in enumerate(body, 1):
+            if isinstance(quote, dict):
+                quote.setdefault("quote_id", str(position))  # as batch.py numbers JSONL lines
+        return body, True
+    if isinstance(body, dict):
+        return [body], False
+    raise ValueError("Body must be a quote object, a list of quotes or {\"quotes\": [...]}")
+
+
+def _configured(quote, catalog):
+    """(row, product_info, components, result); row carries "error" and the rest are None on bad input"""
+    row = {"quote_id": quote_id(quote)}
+    try:
+        product_info, components = build_configuration(quote, catalog)
+        result = validate_cached(product_info, components)
+    except QUOTE_ERRORS as exc:
+        row["error"] = str(exc)
+        return row, None, None, None
+    return row, product_info, components, result
+
+
+def validate_endpoint(quotes, catalog, batched):
+    if batched:
+        return list(validate_quotes(quotes, catalog, vectorized=len(quotes) > 1, chunk_size=max(len(quotes), 1)))
+    return [validate_quote(quotes[0], catalog)]
+
+
+def price_quote(quote, catalog):
+    """Cost and weight totals of a quote with one priced entry per line"""
+    row, product_info, components, result = _configured(quote, catalog)
+    if result is None:
+        return row
+    lines = [{"name": product_info["name"], "category": "Product", "quantity": 1,
+              "unit_price": product_info["price"], "price": product_info["price"],
+              "unit_weight": product_info["weight"], "weight": product_info["weight"]}]
+    for c in components:
+        q = c.get("quantity", 1)
+        lines.append({"name": c["name"], "category": c["category"], "quantity": q,
+                      "unit_price": c["price"], "price": c["price"] * q,
+                      "unit_weight": c["weight"], "weight": c["weight"] * q})
+    row.update(product=product_info["name"], total_cost=result.total_cost,
+               total_weight=result.total_weight, lines=lines)
+    return row
+
+
+def summarize_quote(quote, catalog):
+    """The UI's Configuration Summary, Power System Summary and Recommendations as JSON"""
+    row, product_info, components, result = _configured(quote, catalog)
+    if result is None:
+        return row
+    index = result.index
+
+    by_category = {category: [{"name": c["name"], "quantity": c.get("quantity", 1), "price": c["price"], "weight": c["weight"]}
+                              for c in lines]
+                   for category, lines in group_by_category(components).items()}
+
+    energy_sources = []
+    if index.has(Role.SOLAR_PANEL):
+        energy_sources.append("solar_panels")
+    if index.has(Role.BATTERY):
+        energy_sources.append("battery")
+
+    inverter = index.first(Role.INVERTER)
+    solar_inverter = index.first(Role.SOLAR_INVERTER)
+    conversion = None
+    if inverter or solar_inverter:
+        capacity = float((inverter or solar_inverter).get("power_rating", 0))
+        conversion = {"type": "Solar Inverter" if solar_inverter else "Inverter", "capacity_watts": capacity,
+                      "utilization_percent": None}
+        if result.all_ac_loads and result.biggest_ac_load_power > 0 and capacity > 0:
+            conversion["utilization_percent"] = round(result.biggest_ac_load_power / capacity * 100, 1)
+
+    # Power summary shows appliance-only load when appliances are present
+    system_load = result.total_appliance_power
+    if index.has(Role.APPLIANCE):
+        system_load = weighted_sum(index[Role.APPLIANCE], "power_rating")
+    controller_utilization = None
+    if index.has(Role.CONTROLLER):
+        max_controller_power = max(float(c.get("power_rating", 0)) for c in index[Role.CONTROLLER])
+        if max_controller_power > 0:
+            controller_utilization = round(system_load / max_controller_power * 100, 1)
+
+    row.update({
+        "product": product_info,
+        "components_by_category": by_category,
+        "total_cost": result.total_cost,
+        "total_weight": result.total_weight,
+        "viable": result.viable,
+        "status_color": result.status_color if components else None,
+        "status_message": result.status_message if components else None,
+        "energy_sources": energy_sources,
+        "inverter": conversion,
+        "biggest_ac_load": {"name": result.biggest_ac_load_name, "watts": result.biggest_ac_load_power} if result.all_ac_loads else None,
+        "total_ac_load_watts": result.total_ac_load_power,
+        "system_limits": result.system_limits,
+        "total_system_load_watts": system_load,
+        "controller_utilization_percent": controller_utilization,
+        "recommendations": [{"kind": kind, "text": text} for kind, text in result.recommendations],
+    })
+    return row
+
+
+ENDPOINTS = {
+    "/validate": validate_endpoint,
+    "/price": lambda quotes, catalog, batched: [price_quote(q, catalog) for q in quotes],
+    "/summarize": lambda quotes, catalog, batched: [summarize_quote(q, catalog) for q in quotes],
+}
+
+
+# --- Server ---
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive unless the client closes
+    server_version = "SolarcompQuote/1.0"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # per-request logging would dominate the cost of a cached validation
+
+    def _send(self, status, payload, close=False):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")  # the body was not read, so the connection cannot be reused
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "pid": os.getpid(), "catalog_version": self.server.catalog.version})
+        elif self.path == "/stats":
+            self._send(200, self.server.stats.report())
+        else:
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        endpoint = ENDPOINTS.get(self.path)
+        try:
+            length = (self.headers.get("Content-Length") or "0").strip()
+            if not (length.isascii() and length.isdigit()):
+                self._send(400, {"error": f"Invalid Content-Length: {length!r}"}, close=True)
+                return
+            if int(length) > self.server.max_body:
+                self._send(413, {"error": f"Request body over {self.server.max_body} bytes"}, close=True)
+                return
+            raw = self.rfile.read(int(length))  # always drain the body so the connection stays usable
+            if endpoint is None:
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+                return
+            try:
+                quotes, batched = _quotes(json.loads(raw or b"null"))
+            except ValueError as exc:
+                self._send(400, {"error": f"Invalid request body: {exc}"})
+                return
+            try:
+                rows = endpoint(quotes, self.server.catalog, batched)
+            except Exception as exc:  # bad quotes become error rows, so this is a bug; still answer
+                self._send(500, {"error": f"Internal error: {exc}"})
+                return
+            if batched:
+                self._send(200, {"results": rows})
+            else:
+                self._send(422 if "error" in rows[0] else 200, rows[0])
+        finally:
+            # Failed requests count too, so /stats shows every request served
+            if endpoint is not None:
+                self.server.stats.record(self.path, time.perf_counter() - started)
+
+
+class QuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, stats, max_body=MAX_BODY):
+        super().__init__(address, QuoteHandler)
+        self.stats = stats
+        self.max_body = max_body
+        self.catalog = None
+
+    def warm(self):
+        """Load the catalog and run each endpoint once so the first request is served warm"""
+        self.catalog = load_catalog()
+        product = next(iter(self.catalog.products))
+        components = [{"name": names[0]} for names in self.catalog.by_category.values()]
+        sample = {"quote_id": "warm-up", "product": product, "components": components}
+        for endpoint in ENDPOINTS.values():
+            endpoint([sample], self.catalog, False)
+            endpoint([sample, sample], self.catalog, True)
+
+
+def _run_worker(server, slot):
+    server.stats.slot = slot
+    server.warm()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve(host="127.0.0.1", port=8000, workers=1, max_body=MAX_BODY):
+    """Serve on host:port with workers pre-forked processes (one in-process worker where fork is unavailable)"""
+    if not hasattr(os, "fork"):
+        workers = 1
+    server = QuoteServer((host, port), LatencyStats(ENDPOINTS, workers), max_body)
+    print(f"Serving on http://{host}:{server.server_address[1]} with {workers} worker(s)", file=sys.stderr)
+    if workers == 1:
+        _run_worker(server, 0)
+        return
+
+    # Idle workers return from a non-blocking accept() instead of blocking when another worker wins the connection
+    server.socket.setblocking(False)
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)  # stopping the parent stops the workers
+    children = []
+    for slot in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _run_worker(server, slot)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    finally:
+        server.server_close()
+
+
+# --- Load generator ---
+
+def bench(url, body, requests=10000, concurrency=16):
+    """POST body to url over concurrency keep-alive connections; returns throughput and latency figures"""
+    parts = urlsplit(url)
+    payload = json.dumps(body).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    per_connection = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def client(i):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+        for _ in range(per_connection[i]):
+            started = time.perf_counter()
+            connection.request("POST", parts.path, payload, headers)
+            response = connection.getresponse()
+            response.read()
+            latencies[i].append(time.perf_counter() - started)
+            if response.status >= 500:
+                errors[i] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = sorted(t for part in latencies for t in part)
+    return {
+        "requests": len(merged),
+        "errors": sum(errors),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(merged) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(merged, 50) * 1e3, 3),
+        "p90_ms": round(percentile(merged, 90) * 1e3, 3),
+        "p99_ms": round(percentile(merged, 99) * 1e3, 3),
+        "max_ms": round(merged[-1] * 1e3, 3) if merged else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve quote validation, pricing and summaries over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="pre-forked worker processes; 0 means one per CPU (default: 1)")
+    parser.add_argument("--max-body", type=int, default=MAX_BODY, help=f"largest request body in bytes (default: {MAX_BODY})")
+    parser.add_argument("--bench", metavar="URL", help="load-test a running server's endpoint instead of serving")
+    parser.add_argument("--quote", help="JSON file with the request body to send (default: a sample quote)")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        if args.quote:
+            with open(args.quote, encoding="utf-8") as f:
+                body = json.load(f)
+        else:
+            catalog = load_catalog()
+            body = {"product": next(iter(catalog.products)),
+                    "components": [{"name": names[0]} for names in catalog.by_category.values()]}
+        json.dump(bench(args.bench, body, args.requests, args.concurrency), sys.stdout, indent=2)
+        print()
+        return
+    serve(args.host, args.port, args.workers or os.cpu_count() or 1, args.max_body)
+
+
+if __name__ == "__main__":
+    main()
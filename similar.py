@@ -0,0 +1,182 @@
+"""Nearest previously validated quotes to a configuration.
+
+A configuration is described by FEATURES: the product's power requirement,
+the solar array's Wp, the battery bank's Wh, the inverter capacity and the
+product voltage. Each is compared on a log scale (log1p), so 1kW against
+2kW counts as far apart as 5kW against 10kW, and no feature dominates by
+its units.
+
+SimilarQuotes indexes the viable quotes of a QuoteStore in a KD-tree:
+scipy's cKDTree when scipy is installed, otherwise KDTree below (NumPy,
+best-first search over bounding boxes). Quotes saved after the tree was
+built are kept in a small array that is searched by brute force, until it
+grows past REBUILD_FRACTION of the tree and the tree is rebuilt.
+"""
+
+import heapq
+import threading
+
+import numpy as np
+
+from engine import Role, weighted_sum
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # KDTree below is used instead
+    cKDTree = None
+
+FEATURES = ("power_watts", "solar_wp", "battery_wh", "inverter_w", "voltage")
+LEAF_SIZE = 64
+REBUILD_FRACTION = 0.1
+
+
+def configuration_features(product_info, components):
+    """FEATURES of a product_info dict and its component lines"""
+    by_role = {}
+    for component in components:
+        by_role.setdefault(component["role"], []).append(component)
+    return (
+        float(product_info["power_watts"]),
+        weighted_sum(by_role.get(Role.SOLAR_PANEL, ()), "power_rating"),
+        weighted_sum(by_role.get(Role.BATTERY, ()), "battery_capacity"),
+        weighted_sum(by_role.get(Role.INVERTER, []) + by_role.get(Role.SOLAR_INVERTER, []), "power_rating"),
+        float(product_info["rating"]),
+    )
+
+
+def feature_space(features):
+    """Points to measure distance between: log1p of the (non-negative) features"""
+    return np.log1p(np.maximum(np.asarray(features, dtype=np.float64), 0.0))
+
+
+class KDTree:
+    """KD-tree over the rows of points (NumPy only); query() has cKDTree's shape for k > 1"""
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.n = len(self.points)
+        self.order = np.arange(self.n)
+        # Node arrays: [start, end) range of self.order, children (-1 for a leaf), bounding box
+        self._start, self._end, self._left, self._right, self._low, self._high = [], [], [], [], [], []
+        if len(self.points):
+            self._build(0, len(self.points), leaf_size)
+        self._low = np.array(self._low)
+        self._high = np.array(self._high)
+
+    def _build(self, start, end, leaf_size):
+        node = len(self._start)
+        block = self.points[self.order[start:end]]
+        low, high = block.min(axis=0), block.max(axis=0)
+        self._start.append(start)
+        self._end.append(end)
+        self._low.append(low)
+        self._high.append(high)
+        self._left.append(-1)
+        self._right.append(-1)
+        spread = high - low
+        if end - start <= leaf_size or not spread.any():
+            return node
+        # Split at the median of the widest dimension
+        axis = int(spread.argmax())
+        middle = (end - start) // 2
+        part = np.argpartition(block[:, axis], middle)
+        self.order[start:end] = self.order[start:end][part]
+        self._left[node] = self._build(start, start + middle, leaf_size)
+        self._right[node] = self._build(start + middle, end, leaf_size)
+        return node
+
+    def _box_distance(self, node, point):
+        gap = np.maximum(self._low[node] - point, 0.0) + np.maximum(point - self._high[node], 0.0)
+        return float(gap @ gap)
+
+    def query(self, point, k=1):
+        """(distances, row indices) of the k nearest rows, nearest first"""
+        point = np.asarray(point, dtype=np.float64)
+        best = []  # max-heap of (-squared distance, row)
+        frontier = [(0.0, 0)] if self.n else []
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            left = self._left[node]
+            if left < 0:
+                rows = self.order[self._start[node]:self._end[node]]
+                diff = self.points[rows] - point
+                distances = np.einsum("ij,ij->i", diff, diff)
+                if len(rows) > k:
+                    keep = np.argpartition(distances, k)[:k]
+                    rows, distances = rows[keep], distances[keep]
+                for distance, row in zip(distances.tolist(), rows.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, row))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, row))
+                continue
+            for child in (left, self._right[node]):
+                distance = self._box_distance(child, point)
+                if len(best) < k or distance < -best[0][0]:
+                    heapq.heappush(frontier, (distance, child))
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return np.sqrt([-distance for distance, _ in best]), np.array([row for _, row in best], dtype=np.int64)
+
+
+def _tree(points):
+    if cKDTree is not None:
+        return cKDTree(points, leafsize=LEAF_SIZE)
+    return KDTree(points)
+
+
+def _query(tree, point, k):
+    """(distances, rows) from either tree type, always as 1-D arrays"""
+    if not tree.n:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    distances, rows = tree.query(point, k=k)
+    distances, rows = np.atleast_1d(distances), np.atleast_1d(rows)
+    found = np.isfinite(distances)  # cKDTree pads with inf when k exceeds the points
+    return distances[found], rows[found]
+
+
+class SimilarQuotes:
+    """Nearest viable saved quotes of a QuoteStore, by FEATURES; safe to share between threads"""
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+        self._lock = threading.Lock()
+        self._build()
+
+    def _build(self):
+        ids, features = self.quotes.features()
+        self.ids = ids
+        self.tree = _tree(feature_space(features).reshape(-1, len(FEATURES)))
+        self.last_id = int(ids[-1]) if len(ids) else 0
+        self._recent_ids = np.empty(0, dtype=np.int64)
+        self._recent = np.empty((0, len(FEATURES)))
+
+    def __len__(self):
+        return len(self.ids) + len(self._recent_ids)
+
+    def refresh(self):
+        """Pick up quotes saved since the last refresh, rebuilding the tree when enough have arrived"""
+        with self._lock:
+            ids, features = self.quotes.features(after_id=self.last_id)
+            if not len(ids):
+                return
+            self._recent_ids = np.concatenate([self._recent_ids, ids])
+            self._recent = np.vstack([self._recent, feature_space(features).reshape(-1, len(FEATURES))])
+            self.last_id = int(ids[-1])
+            if len(self._recent_ids) > REBUILD_FRACTION * max(len(self.ids), 1000):
+                self._build()
+
+    def nearest(self, features, k=5):
+        """[(quote id, distance)] of the k nearest viable quotes to FEATURES values, nearest first"""
+        self.refresh()
+        point = feature_space(features)
+        with self._lock:
+            distances, rows = _query(self.tree, point, k)
+            found = list(zip(self.ids[rows].tolist(), distances.tolist()))
+            if len(self._recent_ids):
+                diff = self._recent - point
+                recent = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+                found += zip(self._recent_ids.tolist(), recent.tolist())
+        found.sort(key=lambda item: (item[1], -item[0]))  # nearest first, newest among equals
+        return found[:k]
@@ -0,0 +1,251 @@
+"""Minimum-cost system sizing over the catalog.
+
+size_system() finds the cheapest set of catalog parts that passes Rules 1-12,
+reaches a green system status and stores enough energy for a target runtime.
+
+The search is a branch-and-bound in three levels:
+
+1. Frames: the power conversion (none, or the cheapest adequate Inverter or
+   Solar Inverter capacity option) and the controller (none or one model).
+   Rules 1, 2, 5, 11 and 12 rule frames out before any search, and Rules 6
+   and 9 drop the controllers and batteries no array meeting the solar
+   target can pass; a frame with no battery left is skipped.
+2. Battery lines, visited in order of cost per Wh. A node's lower bound is
+   its cost so far, plus the remaining energy at the best remaining cost per
+   Wh, plus the cheapest panel array that meets the solar target.
+3. Panel lines, with the same kind of bound. Total Wp is capped by each
+   controller's input (Rule 9) and each battery's charge rate (Rule 6).
+
+Each candidate that would become the new incumbent is checked with
+engine.validate, so the rules stay the only authority on viability.
+Cables, mounting and accessories are not sized because no rule depends on
+them.
+"""
+
+import math
+from dataclasses import dataclass
+
+from catalog import load_catalog
+from engine import RULE_PLAN, Role, build_context, classify, make_component, validate
+
+# Peak sun hours the panels get to refill a day's battery energy
+DEFAULT_SUN_HOURS = 5.0
+
+# Battery voltage matching against the controller and inverters, checked per candidate battery
+BATTERY_VOLTAGE_RULES = RULE_PLAN.subset(("4", "4.5"))
+
+
+@dataclass
+class SizingResult:
+    """Cheapest viable system found by size_system()"""
+    components: list
+    total_cost: float
+    battery_wh: float
+    solar_watts: float
+    runtime_hours: float
+    result: object  # engine.ValidationResult of the sized configuration
+    nodes: int
+
+
+def _unit(line):
+    """Price, energy, charge limit and discharge limit of one unit of a component line"""
+    capacity = float(line.get("battery_capacity", 0))
+    return (
+        line["price"],
+        capacity,
+        capacity * float(line.get("battery_charge_c_rating", 1.0)),
+        capacity * float(line.get("battery_discharge_c_rating", 1.0)),
+    )
+
+
+def _cheapest_option(name, spec, required):
+    """Default line for the cheapest capacity option that carries required watts, or None"""
+    options = [o for o in spec.get("capacity_options", []) if o["capacity"] >= required]
+    if not options:
+        return None
+    option = min(options, key=lambda o: (o["price_adjust"], o["capacity"]))
+    return make_component(name, spec, inverter_option=option)
+
+
+class _PanelSearch:
+    """Cheapest panel multiset with total Wp in [low, cap], memoised per cap"""
+
+    def __init__(self, panels, low):
+        # (price, watts, line), best price per W first
+        self.panels = sorted(((p["price"], float(p["power_rating"]), p) for p in panels if p["power_rating"] > 0),
+                             key=lambda t: t[0] / t[1])
+        self.low = low
+        self.nodes = 0
+        self._memo = {}
+
+    def lower_bound(self):
+        """Cost of the target Wp at the best price per W; valid whatever the cap"""
+        if not self.panels:
+            return math.inf
+        price, watts, _ = self.panels[0]
+        return self.low * price / watts
+
+    def solve(self, cap):
+        """(cost, [(line, quantity), ...]) or (inf, None) when no array fits under cap"""
+        if cap not in self._memo:
+            self._memo[cap] = self._search(cap)
+        return self._memo[cap]
+
+    def _search(self, cap):
+        best = [math.inf, None]
+        chosen = []
+
+        def visit(i, cost, watts):
+            self.nodes += 1
+            if watts >= self.low and watts > 0:
+                if cost < best[0]:
+                    best[0], best[1] = cost, list(chosen)
+                return
+            if i == len(self.panels):
+                return
+            price, unit_watts, line = self.panels[i]
+            if cost + (self.low - watts) * price / unit_watts >= best[0]:
+                return
+            most = int((cap - watts) // unit_watts)
+            need = max(math.ceil((self.low - watts) / unit_watts), 1)
+            for q in range(min(most, need), -1, -1):
+                if q:
+                    chosen.append((line, q))
+                visit(i + 1, cost + q * price, watts + q * unit_watts)
+                if q:
+                    chosen.pop()
+
+        visit(0, 0, 0.0)
+        return best[0], best[1]
+
+
+def size_system(product_info, runtime_hours, appliances=(), sun_hours=DEFAULT_SUN_HOURS, catalog=None):
+    """Cheapest catalog system that runs product_info (plus appliance lines) for runtime_hours
+
+    Battery energy must cover runtime_hours at the full product-plus-appliance
+    load. With sun_hours set, the panels must also refill that energy in
+    sun_hours peak hours. Use sun_hours=None to only require a complete solar
+    system. Returns a SizingResult, or None when no catalog system qualifies.
+    """
+    catalog = catalog or load_catalog()
+    appliances = list(appliances)
+    base = build_context(product_info, appliances)
+    load = base.total_appliance_power
+    energy = load * runtime_hours
+    min_solar = energy / sun_hours if sun_hours else 0.0
+
+    parts = {role: [] for role in Role}
+    for name, spec in catalog.components.items():
+        role = classify(spec)
+        if role is Role.INVERTER or role is Role.SOLAR_INVERTER:
+            line = _cheapest_option(name, spec, base.biggest_ac_load_power if base.all_ac_loads else 0)
+        elif role is Role.BATTERY and spec.get("capacity_ah", 0) <= 0:
+            line = None  # Custom battery: capacity is user-supplied
+        else:
+            line = make_component(name, spec)
+        if line is not None:
+            parts[role].append(line)
+
+    # --- Level 1: frames (Rules 1, 2, 5, 11, 12) ---
+    conversions = [None] + parts[Role.SOLAR_INVERTER]
+    if product_info["voltage"] != "DC":
+        conversions += parts[Role.INVERTER]  # Rule 2
+    if product_info["voltage"] == "AC":
+        conversions.remove(None)  # Rules 1 and 12: batteries feed an AC product through a converter
+    # Rule 5; a controller below the solar target also fails Rule 9 for every array that meets it
+    controllers = [None] + [c for c in parts[Role.CONTROLLER] if max(load, min_solar) <= float(c.get("power_rating", 0))]
+
+    frames = []
+    for conversion in conversions:
+        for controller in controllers:
+            fixed = [line for line in (conversion, controller) if line is not None]
+            frames.append((sum(line["price"] for line in fixed), conversion, controller, fixed))
+    frames.sort(key=lambda frame: frame[0])
+
+    best = {"cost": math.inf, "lines": None, "result": None}
+    nodes = 0
+    panel_search = _PanelSearch(parts[Role.SOLAR_PANEL], min_solar)
+
+    for frame_cost, conversion, controller, fixed in frames:
+        solar_inverter = conversion is not None and conversion["role"] is Role.SOLAR_INVERTER
+        need_panels = min_solar > 0 or not solar_inverter  # green status needs panels unless a Solar Inverter
+        controller_cap = float(controller["power_rating"]) if controller else math.inf  # Rule 9
+
+        panel_floor = panel_search.lower_bound() if need_panels else 0.0
+
+        # Batteries that pass Rules 4/4.5 against this frame and Rule 6 on their own: the array is
+        # capped by each battery's charge rate, so one below the solar target can never take part
+        batteries = []
+        for line in parts[Role.BATTERY]:
+            price, wh, charge, discharge = _unit(line)
+            if load > discharge or wh <= 0 or (need_panels and charge < min_solar):
+                continue
+            if BATTERY_VOLTAGE_RULES.viable(build_context(product_info, [line] + fixed)):
+                batteries.append((price, wh, charge, line))
+        batteries.sort(key=lambda t: t[0] / t[1])
+        if not batteries:
+            continue
+        if frame_cost + energy * batteries[0][0] / batteries[0][1] + panel_floor >= best["cost"]:
+            continue
+
+        # Panels with a battery but no controller need a battery with a built-in one (Rules 3 and 12)
+        need_builtin = need_panels and controller is None
+        chosen = []
+
+        def leaf(cost, charge_cap):
+            panels = []
+            if need_panels:
+                panel_cost, panels = panel_search.solve(min(controller_cap, charge_cap))
+                if panels is None:
+                    return
+                cost += panel_cost
+            if cost >= best["cost"]:
+                return
+            lines = appliances + [dict(line) for line in fixed] + [dict(line, quantity=q) for line, q in chosen + panels]
+            result = validate(product_info, lines)
+            if result.viable and result.status_color == "green":
+                best.update(cost=cost, lines=lines, result=result)
+
+        def visit(i, cost, wh, count, charge_cap, builtin):
+            nonlocal nodes
+            nodes += 1
+            satisfied = wh >= energy and count > 0 and (builtin or not need_builtin)
+            if satisfied:
+                leaf(cost, charge_cap)
+                return
+            if i == len(batteries):
+                return
+            price, unit_wh, charge, line = batteries[i]
+            bound = cost + max(energy - wh, 0) * price / unit_wh + panel_floor
+            if bound >= best["cost"]:
+                return
+            includes = line.get("includes_controller", False)
+            most = math.ceil(max(energy - wh, 0) / unit_wh)
+            if count == 0 or (need_builtin and not builtin and includes):
+                most = max(most, 1)
+            for q in range(most, -1, -1):
+                if q:
+                    chosen.append((line, q))
+                    visit(i + 1, cost + q * price, wh + q * unit_wh, count + q,
+                          min(charge_cap, charge), builtin or includes)
+                    chosen.pop()
+                else:
+                    visit(i + 1, cost, wh, count, charge_cap, builtin)
+
+        visit(0, frame_cost, 0.0, 0, math.inf, False)
+
+    if best["lines"] is None:
+        return None
+    result = best["result"]
+    nodes += panel_search.nodes
+    battery_wh = sum(float(b["battery_capacity"]) * b["quantity"] for b in result.index[Role.BATTERY])
+    solar_watts = sum(float(p["power_rating"]) * p["quantity"] for p in result.index[Role.SOLAR_PANEL])
+    return SizingResult(
+        components=best["lines"],
+        total_cost=result.total_cost,
+        battery_wh=battery_wh,
+        solar_watts=solar_watts,
+        runtime_hours=battery_wh / load if load else math.inf,
+        result=result,
+        nodes=nodes,
+    )
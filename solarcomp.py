@@ -1,8 +1,23 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import streamlit as st
 
-# Add custom CSS for dropdown styling
-st.markdown(
-    """
+from catalog import load_catalog
+from compat import CompatibilityMatrix
+from configstore import ConfigStore
+from engine import IncrementalValidator, Role, classify, group_by_category, validate_cached, weighted_sum
+from instrument import REGISTRY, serve_metrics, start_run
+from montecarlo import loss_of_load_probability
+from profiles import file_key, hourly_year, load_profile
+from quotestore import QuoteStore, configuration_from_quote, quote_from_ui
+from similar import SimilarQuotes, configuration_features
+from simulation import SystemModel, clear_sky_irradiance, daily_load_profile, simulate
+from sizer import DEFAULT_SUN_HOURS, size_system
+
+# Static page setup: built once at import, reused by every rerun
+CUSTOM_CSS = """
     <style>
     /* Container for dropdown labels */
     .dropdown-container {
@@ -43,23 +58,194 @@ st.markdown(
         margin-top: 4px !important;
     }
     </style>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+DC_VOLTAGE_OPTIONS = [12, 24, 48]
+AC_VOLTAGE_OPTIONS = [110, 120, 220, 230, 240]
+C_RATING_OPTIONS = [0.5, 1.0, 2.0, 3.0]
+DC_VOLTAGE_INDEX = {v: i for i, v in enumerate(DC_VOLTAGE_OPTIONS)}
+AC_VOLTAGE_INDEX = {v: i for i, v in enumerate(AC_VOLTAGE_OPTIONS)}
+C_RATING_INDEX = {v: i for i, v in enumerate(C_RATING_OPTIONS)}
+
+# Component picker rows shown per category page
+PICKER_PAGE_SIZE = 20
+
+# Hourly irradiance dataset for the Monte Carlo reliability estimate (optional)
+IRRADIANCE_PATH = os.environ.get("SOLARCOMP_IRRADIANCE", "")
+SAMPLER_WORKERS = os.cpu_count() or 1
+# Directory of measured load profiles the hourly simulation can use (optional); users pick a
+# file by name from it and never type a server path
+PROFILE_DIR = os.environ.get("SOLARCOMP_PROFILE_DIR", "")
+
+# Saved quotes listed per search (the database is quotestore.DEFAULT_PATH, or SOLARCOMP_QUOTES_DB)
+QUOTE_RESULTS = 20
+# Nearest viable saved quotes shown for the current configuration
+SIMILAR_RESULTS = 5
+# Widgets a loaded quote resets, so they are recreated with its settings as their defaults
+QUOTE_WIDGET_KEYS = ("product", "product_voltage", "dc_voltage", "ac_voltage", "product_power", "price_adjust",
+                     "product_weight", "add_components", "controller", "inverter")
+QUOTE_WIDGET_PREFIXES = ("check_", "price_", "qty_", "inverter_cap_", "capacity_ah_", "batt_volt_",
+                         "charge_crate_", "discharge_crate_", "volt_multi_", "volt_")
+
+# Stage profiling: shown in a debug panel with SOLARCOMP_PROFILE=1 or ?debug=1, and
+# collected for Prometheus at http://127.0.0.1:<port>/metrics with SOLARCOMP_METRICS_PORT
+PROFILE_ALWAYS = os.environ.get("SOLARCOMP_PROFILE", "") not in ("", "0")
+METRICS_PORT = int(os.environ.get("SOLARCOMP_METRICS_PORT") or 0)
+
+
+@st.cache_resource
+def get_catalog():
+    """Catalog shared by all sessions; loaded on the first run only"""
+    return load_catalog()
+
+
+@st.cache_resource
+def get_compatibility():
+    """Compatibility matrix of the catalog's SKUs, shared by all sessions; built on the first run only"""
+    return CompatibilityMatrix(get_catalog())
+
+
+@st.cache_data
+def get_load_profile(key):
+    """Hourly means and summary of a measured profile; key is profiles.file_key() so edits invalidate it"""
+    return load_profile(key[0])
+
+
+@st.cache_data(max_entries=256)
+def get_sized_system(product_info, target_runtime, appliances, sun_hours):
+    """Cheapest viable system from sizer.size_system; the search runs once per distinct load and targets"""
+    return size_system(product_info, target_runtime, appliances=appliances, sun_hours=sun_hours, catalog=get_catalog())
+
+
+@st.cache_resource
+def get_sampler_pool():
+    """Process pool for Monte Carlo weather sampling, shared by all sessions"""
+    return ProcessPoolExecutor(max_workers=SAMPLER_WORKERS)
+
+
+@st.cache_resource
+def get_metrics_server():
+    """Prometheus /metrics endpoint shared by all sessions; started on the first run only"""
+    return serve_metrics(METRICS_PORT)
+
+
+@st.cache_resource
+def get_quote_store():
+    """Saved quotes database shared by all sessions"""
+    return QuoteStore(catalog=get_catalog())
+
+
+@st.cache_resource
+def get_similar_quotes():
+    """Nearest-configuration index over the saved viable quotes, shared by all sessions; refreshed on each lookup"""
+    quotes = get_quote_store()
+    quotes.backfill_features()
+    return SimilarQuotes(quotes)
+
+
+def get_config_store():
+    """This session's component configuration, restored from the ?config= query parameter on its first run"""
+    if "config_store" not in st.session_state:
+        st.session_state["config_store"] = ConfigStore.decode(get_catalog(), st.query_params.get("config", ""))
+    return st.session_state["config_store"]
+
+
+def save_config(store):
+    """Mirror the configuration into the URL so a reload restores it"""
+    if store:
+        st.query_params["config"] = store.encode()
+    else:
+        st.query_params.pop("config", None)
+
+
+def fit_note(compat, name, conflicts, selected, lines):
+    """Why an unselected SKU does not fit the selected lines (tooltip text), or None when it fits"""
+    blocked = compat.blocked(name, conflicts, selected)
+    if blocked == "conflict":
+        return "Not compatible with " + ", ".join(compat.partners(name, lines))
+    if blocked == "companion":
+        return "Needs one of: " + ", ".join(compat.companions(name))
+    return None
+
+
+# Widget callbacks: each applies one change to the store before the rerun starts
+def on_check(name):
+    store = get_config_store()
+    if st.session_state[f"check_{name}"]:
+        store.select(name)
+    else:
+        store.deselect(name)
+    save_config(store)
+
+
+def on_pick(category, key):
+    store = get_config_store()
+    store.deselect_category(category)
+    choice = st.session_state[key]
+    if choice in store.catalog.components:
+        store.select(choice)
+    save_config(store)
+
+
+def on_setting(name, field, key):
+    value = st.session_state[key]
+    if isinstance(value, list):  # supported voltages multiselect
+        value = ", ".join(str(v) for v in value)
+    store = get_config_store()
+    store.update(name, **{field: value})
+    save_config(store)
+
+
+def on_load_quote(key):
+    load_quote(st.session_state[key])
+
+
+def load_quote(quote_id):
+    saved = get_quote_store().get(quote_id)
+    if saved is None:
+        return
+    product, store = configuration_from_quote(saved["quote"], get_catalog())
+    for widget in [k for k in st.session_state if k in QUOTE_WIDGET_KEYS or k.startswith(QUOTE_WIDGET_PREFIXES)]:
+        del st.session_state[widget]
+    st.session_state["config_store"] = store
+    st.session_state["loaded_product"] = product
+    save_config(store)
+
+
+def export_quotes(filters):
+    """Deferred download: the matching saved quotes as JSONL, spooled to disk when large"""
+    target = tempfile.SpooledTemporaryFile(max_size=1 << 24, mode="w+", encoding="utf-8")
+    get_quote_store().export(target, **filters)
+    target.seek(0)
+    return target
+
+
+show_profile = PROFILE_ALWAYS or st.query_params.get("debug") == "1"
+profile = start_run(show_profile or METRICS_PORT > 0)
+if METRICS_PORT:
+    get_metrics_server()
+
+# Add custom CSS for dropdown styling
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 st.title("🔆 Solar Product Configurator with Inline Component Settings")
 
 # --- Step 1: Product Selection ---
 st.subheader("Select a Product")
 
-# Products (main appliances)
-products = {
-    "Rice Mill": {"base_price": 800, "default_voltage": "AC", "default_rating": 230, "default_power_watts": 1500, "weight": 45},
-    "Custom Product": {"base_price": 300, "default_voltage": "DC", "default_rating": 24, "default_power_watts": 500, "weight": 0}
-}
+# Catalog is parsed once per process and shared across reruns
+catalog = get_catalog()
+products = catalog.products
+profile.lap("catalog")
 
-selected_product = st.selectbox("Choose a product:", list(products.keys()))
+# A loaded quote's product settings stand in for the catalog defaults of its product's widgets
+loaded_product = st.session_state.get("loaded_product") or {}
+product_names = list(products.keys())
+selected_product = st.selectbox("Choose a product:", product_names, key="product",
+                                index=product_names.index(loaded_product["name"]) if loaded_product.get("name") in products else 0)
 product_info_base = products[selected_product]
+if loaded_product.get("name") != selected_product:
+    loaded_product = {}
 
 # --- Product Configuration ---
 st.subheader("Product Configuration")
@@ -68,7 +254,7 @@ st.subheader("Product Configuration")
 voltage_type = st.radio(
     "Product Voltage Type:",
     ["DC", "AC"],
-    index=0 if product_info_base["default_voltage"] == "DC" else 1,
+    index=0 if loaded_product.get("voltage", product_info_base["default_voltage"]) == "DC" else 1,
     key="product_voltage"
 )
 
@@ -76,15 +262,15 @@ voltage_type = st.radio(
 if voltage_type == "DC":
     voltage_rating = st.selectbox(
         "DC Voltage (V):",
-        options=[12, 24, 48],
-        index=[12, 24, 48].index(product_info_base["default_rating"]) if product_info_base["default_rating"] in [12, 24, 48] else 1,
+        options=DC_VOLTAGE_OPTIONS,
+        index=DC_VOLTAGE_INDEX.get(loaded_product.get("rating", product_info_base["default_rating"]), 1),
         key="dc_voltage"
     )
 else:  # AC
     voltage_rating = st.selectbox(
         "AC Voltage (V):",
-        options=[110, 120, 220, 230, 240],
-        index=[110, 120, 220, 230, 240].index(product_info_base["default_rating"]) if product_info_base["default_rating"] in [110, 120, 220, 230, 240] else 3,
+        options=AC_VOLTAGE_OPTIONS,
+        index=AC_VOLTAGE_INDEX.get(loaded_product.get("rating", product_info_base["default_rating"]), 3),
         key="ac_voltage"
     )
 
@@ -92,7 +278,7 @@ else:  # AC
 power_watts = st.number_input(
     "Product Power Requirement (W):",
     min_value=0,
-    value=product_info_base["default_power_watts"],
+    value=int(loaded_product.get("power_watts", product_info_base["default_power_watts"])),
     step=100,
     key="product_power"
 )
@@ -102,7 +288,7 @@ if selected_product == "Custom Product":
     price_adjustment = st.number_input(
         "Custom Price Adjustment ($):",
         min_value=-200,
-        value=0,
+        value=max(int(loaded_product.get("price", product_info_base["base_price"]) - product_info_base["base_price"]), -200),
         step=50,
         key="price_adjust"
     )
@@ -110,7 +296,7 @@ if selected_product == "Custom Product":
     product_weight = st.number_input(
         "Product Weight (kg):",
         min_value=0.0,
-        value=0.0,
+        value=max(float(loaded_product.get("weight", 0.0)), 0.0),
         step=0.5,
         key="product_weight"
     )
@@ -132,148 +318,17 @@ st.markdown(f"**Selected Product:** {product_info['name']}")
 st.markdown(f"**Base Price:** ${product_info['price']}")
 st.markdown(f"**Specifications:** {product_info['rating']}V {product_info['voltage']}, {product_info['power_watts']}W, {product_info['weight']}kg")
 
+profile.lap("product")
+
 # --- Step 2: Add Components ---
 st.markdown("---")
 st.subheader("🔌 Add Power System Components")
 
-add_components = st.checkbox("➕ Add power system components (solar, batteries, controllers, etc.)")
-
-# COMPONENTS ONLY (not products) - including all the items from your list
-components_data = {
-    # Main Products as Components (for power systems)
-    "CWS00901 - Auto washer": {"base_price": 350, "weight": 18.0, "category": "Appliances", "default_voltage": "DC", "default_power": 500, "default_rating": 24},
-    "CCP00801 - SunPot": {"base_price": 100, "weight": 7.0, "category": "Appliances", "default_voltage": "DC", "default_power": 500, "default_rating": 24},
-    "CCA00801 - SunPot auto": {"base_price": 150, "weight": 8.0, "category": "Appliances", "default_voltage": "DC", "default_power": 500, "default_rating": 24},
-    "CCP00501 - SolarEPC": {"base_price": 50, "weight": 6.0, "category": "Appliances", "default_voltage": "DC", "default_power": 500, "default_rating": 24},
-    "CMM75001 - Mighty Motor 750W": {"base_price": 300, "weight": 11.0, "category": "Appliances", "default_voltage": "DC", "default_power": 750, "default_rating": 24},
-    "CIM00501 - Ice-maker 50kg": {"base_price": 1300, "weight": 40.0, "category": "Appliances", "default_voltage": "DC", "default_power": 180, "default_rating": 24},
-    
-    # Solar Controllers
-    "CSC04001 - Controller Pod": {"base_price": 150, "weight": 2.0, "category": "Controllers", "power_rating": 960, "voltage": "DC", "max_current": 40, "default_rating": 24},
-    "CSC48401 - Controller Beast": {"base_price": 120, "weight": 0.5, "category": "Controllers", "power_rating": 1920, "voltage": "DC", "max_current": 40, "default_rating": 48},
-    
-    # Batteries
-    # Batteries
-"CBA75001 - Battery 750Wh": {
-    "base_price": 150, 
-    "weight": 9.0, 
-    "category": "Batteries", 
-    "voltage": 24, 
-    "capacity_ah": 15, 
-    "charge_c_rating": 1.0,  # NEW
-    "discharge_c_rating": 2.0,  # NEW
-    "default_rating": 24
-},
-"CBA15001 - Battery 1.5kWh": {
-    "base_price": 250, 
-    "weight": 18.0, 
-    "category": "Batteries", 
-    "voltage": 24, 
-    "capacity_ah": 30, 
-    "charge_c_rating": 1.0,  # NEW
-    "discharge_c_rating": 2.0,  # NEW
-    "default_rating": 24
-},
-"CBA20001 - Battery 5kWh": {
-    "base_price": 1000, 
-    "weight": 50.0, 
-    "category": "Batteries", 
-    "voltage": 24.0, 
-    "capacity_ah": 100, 
-    "charge_c_rating": 1.0,  # NEW
-    "discharge_c_rating": 2.0,  # NEW
-    "includes_controller": True, 
-    "default_rating": 24
-},    
-"Custom Battery": {
-    "base_price": 100, 
-    "weight": 10.0, 
-    "category": "Batteries", 
-    "voltage": 24, 
-    "capacity_ah": 0, 
-    "charge_c_rating": 1.0,  # NEW
-    "discharge_c_rating": 2.0,  # NEW
-    "default_rating": 24
-},
-    # Power Conversion
-    
-        # Power Conversion
-    "Inverter": {
-        "base_price": 200, 
-        "weight": 2.0, 
-        "category": "Power Conversion", 
-        "voltage": "DC → AC", 
-        "dc_input_voltage": 48,
-        "capacity_options": [
-            {"capacity": 500, "price_adjust": 0},
-            {"capacity": 1000, "price_adjust": 100},
-            {"capacity": 2000, "price_adjust": 300},
-            {"capacity": 3000, "price_adjust": 500},
-            {"capacity": 5000, "price_adjust": 800}
-        ]
-    },
-    
-    # Solar Inverter (All-in-one unit)
-    "Solar Inverter": {
-        "base_price": 500, 
-        "weight": 5.0, 
-        "category": "Power Conversion", 
-        "voltage": "All-in-one", 
-        "dc_input_voltage": 48,
-        "capacity_options": [
-            {"capacity": 3000, "price_adjust": 0},
-            {"capacity": 5000, "price_adjust": 300},
-            {"capacity": 8000, "price_adjust": 600},
-            {"capacity": 10000, "price_adjust": 1000}
-        ],
-        "is_solar_inverter": True, 
-        "includes_mppt": True
-    },
-
-    # Solar Panels
-    "CSP12501 - Solar panel 125W": {"base_price": 45, "weight": 8.0, "category": "Solar Panels", "power_rating": 125, "voltage": 24, "default_rating": 24},
-    "CSP32501 - Solar panel 325W": {"base_price": 75, "weight": 20.0, "category": "Solar Panels", "power_rating": 325, "voltage": 24, "default_rating": 24},
-    "CSP50001 - Solar panel 500W": {"base_price": 90, "weight": 8.0, "category": "Solar Panels", "power_rating": 500, "voltage": 24, "default_rating": 24},
-    "CSP25001 - Solar panel 250Wp": {"base_price": 50, "weight": 15.0, "category": "Solar Panels", "power_rating": 250, "voltage": 24, "default_rating": 24},
-    
-    # Cables & Mounting
-    "CSR12501 - Rail mount kit 125/250": {"base_price": 16, "weight": 1.5, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSY00101 - Y-splitter, male 2.5-6": {"base_price": 10, "weight": 0.1, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSY00201 - Y-splitter, female 2.5-6": {"base_price": 10, "weight": 0.1, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC00506 - Solar cable 2.5mm, 5m": {"base_price": 16, "weight": 1.5, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC01006 - Solar cable 2.5mm, 10m": {"base_price": 32, "weight": 3.0, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC00506 - Solar cable 4mm, 5m": {"base_price": 20, "weight": 2.0, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC01006 - Solar cable 4mm, 10m": {"base_price": 40, "weight": 4.0, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC00506 - Solar cable 6mm, 5m": {"base_price": 24, "weight": 2.5, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CSC01006 - Solar cable 6mm, 10m": {"base_price": 48, "weight": 5.0, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CBC00201 - Battery cable, 3m x 16mm": {"base_price": 48, "weight": 1.5, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CLC00201 - Load cable, 3m x 16mm": {"base_price": 70, "weight": 1.5, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CCC00101 - Conversion cable for cookpot": {"base_price": 5, "weight": 0.1, "category": "Cables & Mounting", "voltage": "N/A"},
-    "CCC00201 - Conversion cable for battery-to-load": {"base_price": 5, "weight": 0.2, "category": "Cables & Mounting", "voltage": "N/A"},
-    
-    # Insulated Boxes
-    "CIB00901 - VIP 90L icebox": {"base_price": 180, "weight": 10.0, "category": "Accessories", "voltage": "N/A"},
-    
-    # Cooker Accessories
-    "CCP00001 - Spare pot 6L": {"base_price": 7, "weight": 0.5, "category": "Cooker Accessories", "voltage": "N/A"},
-    "CCP00002 - Spare pot 5L": {"base_price": 7, "weight": 0.5, "category": "Cooker Accessories", "voltage": "N/A"},
-    "CCS00001 - Small steamer": {"base_price": 5, "weight": 0.2, "category": "Cooker Accessories", "voltage": "N/A"},
-    "CCS00002 - Big steamer": {"base_price": 10, "weight": 0.4, "category": "Cooker Accessories", "voltage": "N/A"},
-    "CCB00001 - Pot bag": {"base_price": 7, "weight": 0.2, "category": "Cooker Accessories", "voltage": "N/A"},
-    
-    # Motor Attachments
-    "CGB00101 - Gearbox": {"base_price": 300, "weight": 5.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "COE00001 - Oil expeller": {"base_price": 300, "weight": 6.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "CME02201 - Meat mincer": {"base_price": 100, "weight": 5.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "CFG00001 - Flour grinder": {"base_price": 300, "weight": 3.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "CVG00001 - Veg grater": {"base_price": 250, "weight": 3.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "CRH00101 - Rice huller": {"base_price": 850, "weight": 15.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-    "CRP00101 - Rice polisher": {"base_price": 300, "weight": 35.0, "category": "Motor Attachments", "voltage": "DC", "default_rating": 24},
-}
+# Component lines live in the session's ConfigStore, kept current by the widget callbacks
+store = get_config_store()
+add_components = st.checkbox("➕ Add power system components (solar, batteries, controllers, etc.)", value=bool(store), key="add_components")
 
 user_components = []
-total_component_cost = 0
-total_component_weight = 0
 
 if add_components:
     st.subheader("Select Components to Include")
@@ -281,23 +336,69 @@ if add_components:
     selected_controller = None  # Track which controller is selected
     selected_inverter = None    # ADD THIS: Track which inverter is selected
 
-    # Group components by category
-    categories = sorted(set(comp_data["category"] for comp_data in components_data.values()))
-    
-    for category in categories:
+    # Search-as-you-type over SKU codes and names; only the current page of matches and the
+    # components already selected get widgets, so reruns stay fast however big the catalog is
+    search = st.text_input("🔎 Search components by SKU code or name:", key="component_search")
+
+    # SKUs that do not fit the current selection are greyed out, or get a grey caption in the radios
+    # (whose labels are part of their value); they stay selectable. Bitset lookups in the catalog's
+    # compatibility matrix
+    compat = get_compatibility()
+    chosen = store.components()
+    selected_bits = compat.selection(line["name"] for line in chosen)
+
+    # Group components by category (precomputed by the catalog loader)
+    for category in catalog.categories:
+        matching = catalog.search(search, category)
+        # Selected components stay rendered (and so keep their widgets) when off the page or filtered out
+        selected = [name for name in catalog.by_category[category] if name in store]
+        if category == "Controllers":
+            selected = selected[:1] or ["None"]
+        elif category == "Power Conversion":
+            selected = []
+        if search and not matching and not selected and category not in ("Controllers", "Power Conversion"):
+            continue
+
         st.markdown(f"**{category}**")
-        category_components = {name: data for name, data in components_data.items() if data["category"] == category}
+        pages = max(-(-len(matching) // PICKER_PAGE_SIZE), 1)
+        page = 1
+        if pages > 1:
+            # The label carries the page count, so a new search starts again at page 1
+            page = st.number_input(f"{category} page (of {pages}):", min_value=1, max_value=pages, value=1, step=1, key=f"page_{category}_{pages}")
+        shown = list(matching[(page - 1) * PICKER_PAGE_SIZE:page * PICKER_PAGE_SIZE])
+        if search or pages > 1:
+            first = (page - 1) * PICKER_PAGE_SIZE
+            st.caption(f"Showing {first + 1 if shown else 0}–{first + len(shown)} of {len(matching)} matching")
+        rows = shown + [name for name in selected if name not in shown and name in catalog.components]
+        # A pick in this category replaces, rather than joins, the ones already made
+        others = [line for line in chosen if line["category"] != category]
+        conflicts = compat.conflicting(others)
+        notes = {name: fit_note(compat, name, conflicts, selected_bits, others) for name in rows if name not in store}
 
                 # ADD THESE 2 LINES HERE (for Controllers category only):
         if category == "Controllers":
-            selected_controller = st.radio("Select a Controller:", ["None"] + list(category_components.keys()))
+            # Options follow the search and always include the current pick
+            options = ["None"] + rows
+            selected_controller = st.radio("Select a Controller:", options, index=options.index(selected[0]) if selected[0] in options else 0,
+                                           captions=[f":gray[{notes[option]}]" if notes.get(option) else "" for option in options] if any(notes.values()) else None,
+                                           key="controller", on_change=on_pick, args=(category, "controller"))
+            rows = [selected_controller] if selected_controller != "None" else []
         
         # ADD THIS: For Power Conversion (Inverters) category
         if category == "Power Conversion":
-            selected_inverter = st.radio("Select an Inverter:", ["None", "Inverter", "Solar Inverter"])        
-
-
-        for name, comp_data in category_components.items():
+            inverter_options = ["None", "Inverter", "Solar Inverter"]
+            current_inverter = next((name for name in catalog.by_category[category] if name in store), "None")
+            notes = {name: fit_note(compat, name, conflicts, selected_bits, others)
+                     for name in inverter_options if name in catalog.components and name not in store}
+            selected_inverter = st.radio("Select an Inverter:", inverter_options,
+                                         index=inverter_options.index(current_inverter) if current_inverter in inverter_options else 0,
+                                         captions=[f":gray[{notes[option]}]" if notes.get(option) else "" for option in inverter_options] if any(notes.values()) else None,
+                                         key="inverter", on_change=on_pick, args=(category, "inverter"))
+            rows = [selected_inverter] if selected_inverter in catalog.components else []
+
+
+        for name in rows:
+            comp_data = catalog.components[name]
                         # REPLACE THIS LINE:
             # Determine if component is checked
             if category == "Controllers":
@@ -305,7 +406,9 @@ if add_components:
             elif category == "Power Conversion":  # ADD THIS
                 checked = (selected_inverter == name)
             else:
-                checked = st.checkbox(name, key=f"check_{name}")
+                note = notes.get(name)
+                checked = st.checkbox(f":gray[{name}]" if note else name, value=name in store, key=f"check_{name}",
+                                      help=note, on_change=on_check, args=(name,))
 
             # ADD THIS NEW CHECK:
             if checked and category == "Controllers" and selected_controller == "None":
@@ -316,24 +419,30 @@ if add_components:
                 checked = False  # Don't show settings if "None" is selected
 
             if checked:
+                role = classify(comp_data)
+                settings = store.settings.get(name, {})  # widget defaults after a reload or remount
                 st.markdown(f"**{name} Settings:**")
                 
                 # Price Input with base price as default
                 price = st.number_input(
                     f"💲 {name} Price ($):", 
                     min_value=0, 
-                    value=comp_data["base_price"], 
+                    value=settings.get("price", comp_data["base_price"]), 
                     step=5, 
-                    key=f"price_{name}"
+                    key=f"price_{name}",
+                    on_change=on_setting,
+                    args=(name, "price", f"price_{name}")
                 )
 
                 # Quantity Input for ALL components
                 quantity = st.number_input(
                     f"🔢 {name} Quantity:", 
                     min_value=1, 
-                    value=1, 
+                    value=settings.get("quantity", 1), 
                     step=1, 
-                    key=f"qty_{name}"
+                    key=f"qty_{name}",
+                    on_change=on_setting,
+                    args=(name, "quantity", f"qty_{name}")
                 )
 
                 # Power Rating for controllers, solar panels, and appliances
@@ -342,24 +451,27 @@ if add_components:
                     power_rating = comp_data["default_power"]
 
                 # Inverter Capacity Selection
-                # Inverter Capacity Selection
-                if name == "Inverter" or name == "Solar Inverter":
+                inverter_option = None
+                if role in (Role.INVERTER, Role.SOLAR_INVERTER):
+                    saved_option = settings.get("inverter_option")
                     inverter_option = st.selectbox(
                         "Inverter Capacity:",
                         options=comp_data["capacity_options"],
+                        index=comp_data["capacity_options"].index(saved_option) if saved_option in comp_data["capacity_options"] else 0,
                         format_func=lambda x: f"{x['capacity']}W",
-                        key=f"inverter_cap_{name}"
+                        key=f"inverter_cap_{name}",
+                        on_change=on_setting,
+                        args=(name, "inverter_option", f"inverter_cap_{name}")
                     )
                     power_rating = inverter_option["capacity"]
-                    price += inverter_option["price_adjust"]
                     st.markdown(f"_Capacity: {power_rating}W_")
                     
                     # Add special note for Solar Inverter
-                    if name == "Solar Inverter":
+                    if role is Role.SOLAR_INVERTER:
                         st.markdown("_All-in-one unit: Solar → Battery → AC (includes MPPT controller)_")
                 
                 if power_rating > 0:
-                    if "Solar panel" in name:
+                    if role is Role.SOLAR_PANEL:
                         st.markdown(f"_Power Rating: {power_rating}Wp_")
                     else:
                         st.markdown(f"_Power Rating: {power_rating}W_")
@@ -380,7 +492,7 @@ if add_components:
 
 
                 # Battery Specific Settings
-                if "Battery" in name:
+                if role is Role.BATTERY:
                     battery_capacity_ah = comp_data.get("capacity_ah", 0)
                     battery_voltage = comp_data.get("voltage", 24)
                     battery_charge_c_rating = comp_data.get("charge_c_rating", 1.0)  # NEW
@@ -395,16 +507,20 @@ if add_components:
                         battery_capacity_ah = st.number_input(
                             "🔋 Battery Capacity (Ah):", 
                             min_value=0, 
-                            value=100, 
+                            value=settings.get("capacity_ah", 100), 
                             step=10, 
-                            key=f"capacity_ah_{name}"
+                            key=f"capacity_ah_{name}",
+                            on_change=on_setting,
+                            args=(name, "capacity_ah", f"capacity_ah_{name}")
                         )
                         battery_voltage = st.number_input(
                             "⚡ Battery Voltage (V):",
                             min_value=0,
-                            value=24,
+                            value=settings.get("battery_voltage", 24),
                             step=12,
-                            key=f"batt_volt_{name}"
+                            key=f"batt_volt_{name}",
+                            on_change=on_setting,
+                            args=(name, "battery_voltage", f"batt_volt_{name}")
                         )
                         battery_capacity_wh = battery_voltage * battery_capacity_ah
                     
@@ -412,9 +528,11 @@ if add_components:
                     st.markdown('<div class="dropdown-container">', unsafe_allow_html=True)
                     battery_charge_c_rating = st.selectbox(
                         "Charge C-Rating (input from solar):", 
-                        options=[0.5, 1.0, 2.0, 3.0], 
-                        index=[0.5, 1.0, 2.0, 3.0].index(battery_charge_c_rating) if battery_charge_c_rating in [0.5, 1.0, 2.0, 3.0] else 1,
-                        key=f"charge_crate_{name}"
+                        options=C_RATING_OPTIONS, 
+                        index=C_RATING_INDEX.get(settings.get("charge_c_rating", battery_charge_c_rating), 1),
+                        key=f"charge_crate_{name}",
+                        on_change=on_setting,
+                        args=(name, "charge_c_rating", f"charge_crate_{name}")
                     )
                     st.markdown('</div>', unsafe_allow_html=True)
                     
@@ -422,9 +540,11 @@ if add_components:
                     st.markdown('<div class="dropdown-container">', unsafe_allow_html=True)
                     battery_discharge_c_rating = st.selectbox(
                         "Discharge C-Rating (output to loads):", 
-                        options=[0.5, 1.0, 2.0, 3.0], 
-                        index=[0.5, 1.0, 2.0, 3.0].index(battery_discharge_c_rating) if battery_discharge_c_rating in [0.5, 1.0, 2.0, 3.0] else 1,
-                        key=f"discharge_crate_{name}"
+                        options=C_RATING_OPTIONS, 
+                        index=C_RATING_INDEX.get(settings.get("discharge_c_rating", battery_discharge_c_rating), 1),
+                        key=f"discharge_crate_{name}",
+                        on_change=on_setting,
+                        args=(name, "discharge_c_rating", f"discharge_crate_{name}")
                     )
                     st.markdown('</div>', unsafe_allow_html=True)
                     
@@ -437,28 +557,30 @@ if add_components:
                 # Auto-assign voltage type
                                 # Auto-assign voltage type
                 voltage_type = comp_data.get("voltage", "DC")
-                if "Battery" in name:
+                if role is Role.BATTERY:
                     st.markdown("_Voltage Type: DC (fixed for batteries)_")
-                elif name == "Inverter":
+                elif role is Role.INVERTER:
                     dc_voltage = comp_data.get("default_rating", 48)  # or dc_input_voltage if you renamed it
                     st.markdown(f"_Converts DC to AC (DC input: {dc_voltage}V, AC output: {voltage_rating}V)_")
-                elif name == "Solar Inverter":
+                elif role is Role.SOLAR_INVERTER:
                     dc_voltage = comp_data.get("default_rating", 48)  # or dc_input_voltage if you renamed it
                     st.markdown(f"_All-in-one: Solar → Battery → AC (DC input: {dc_voltage}V, includes MPPT)_")
 
                 # Voltage Input for configurable components - FIXED HERE
                 voltage_value = comp_data.get("default_rating", 24)
                 
-                if "Controller" in name and "Beast" not in name:
+                if role is Role.CONTROLLER and "Beast" not in name:
                     st.markdown("Select supported input voltages:")
                     voltage_inputs = st.multiselect(
                         "Supported Voltages (V):",
-                        options=[12, 24, 48],
-                        default=[12, 24],
-                        key=f"volt_multi_{name}"
+                        options=DC_VOLTAGE_OPTIONS,
+                        default=[int(v) for v in str(settings.get("rating", "12, 24")).split(",") if v.strip().isdigit() and int(v) in DC_VOLTAGE_OPTIONS],
+                        key=f"volt_multi_{name}",
+                        on_change=on_setting,
+                        args=(name, "rating", f"volt_multi_{name}")
                     )
                     voltage_value = ", ".join(str(v) for v in voltage_inputs)
-                elif voltage_type != "N/A" and "Battery" not in name and name != "Inverter" and "Solar panel" not in name and "default_voltage" not in comp_data:
+                elif voltage_type != "N/A" and role not in (Role.BATTERY, Role.INVERTER, Role.SOLAR_PANEL) and "default_voltage" not in comp_data:
                     # Ensure voltage_value is an integer for number_input
                     if isinstance(voltage_value, str):
                         try:
@@ -469,9 +591,11 @@ if add_components:
                     voltage_value = st.number_input(
                         f"{name} Voltage (V):", 
                         min_value=0, 
-                        value=int(voltage_value),  # Convert to int
+                        value=settings["rating"] if isinstance(settings.get("rating"), int) else int(voltage_value),  # Convert to int
                         step=12, 
-                        key=f"volt_{name}"
+                        key=f"volt_{name}",
+                        on_change=on_setting,
+                        args=(name, "rating", f"volt_{name}")
                     )
                 elif "default_rating" in comp_data:
                     voltage_value = comp_data["default_rating"]
@@ -480,32 +604,19 @@ if add_components:
                 component_weight = comp_data["weight"]
                 st.markdown(f"_Weight: {component_weight}kg_")
 
-                # Add to component list
-                # Add to component list
-                for i in range(quantity):
-                    user_components.append({
-                        "name": name,
-                        "price": price,
-                        "voltage": voltage_type,
-                        "rating": voltage_value,
-                        "power_rating": power_rating,
-                        "max_current": max_current,
-                        "battery_capacity": battery_capacity_wh,
-                        "battery_capacity_ah": battery_capacity_ah,
-                        "battery_voltage": battery_voltage,
-                        "battery_charge_c_rating": battery_charge_c_rating,  # NEW - ADD THIS
-                        "battery_discharge_c_rating": battery_discharge_c_rating,  # NEW - ADD THIS
-                        # "battery_c_rating": battery_c_rating,  # REMOVE OR COMMENT THIS LINE
-                        "weight": component_weight,
-                        "category": comp_data["category"],
-                        "includes_controller": comp_data.get("includes_controller", False),
-                        "includes_mppt": comp_data.get("includes_mppt", False),  # NEW
-                        "is_solar_inverter": comp_data.get("is_solar_inverter", False),  # NEW
-                        "is_appliance": "Appliances" in comp_data["category"],
-                        "quantity": quantity
-                    })
-                    total_component_cost += price
-                    total_component_weight += component_weight
+    # One line per selected SKU, carrying its quantity; built by the store as the widgets changed
+    user_components = store.components()
+
+profile.lap("configuration")
+
+# Run the headless engine (memoized per configuration, and per session only the stages whose
+# inputs changed are re-run); everything below only renders its result
+validator = st.session_state.setdefault("validator", IncrementalValidator())
+result = validate_cached(product_info, user_components, compute=validator.validate)
+index = result.index
+inverter = index.first(Role.INVERTER)
+solar_inverter = index.first(Role.SOLAR_INVERTER)
+profile.lap("validation")
 
 # --- Step 3: Summary ---
 st.markdown("---")
@@ -518,40 +629,33 @@ st.write(f"**Product Price:** ${product_info['price']}")
 
 if user_components:
     st.write("**Added Components:**")
-    components_by_category = {}
-    for comp in user_components:
-        category = comp.get('category', 'Other')
-        if category not in components_by_category:
-            components_by_category[category] = []
-        components_by_category[category].append(comp)
-    
-    for category, comps in components_by_category.items():
+    for category, comps in group_by_category(user_components).items():
         st.markdown(f"**{category}:**")
         for c in comps:
             quantity = c.get('quantity', 1)
-            if "Battery" in c['name']:
+            if c['role'] is Role.BATTERY:
                 battery_charge_c = c.get('battery_charge_c_rating', 1.0)
                 battery_discharge_c = c.get('battery_discharge_c_rating', 1.0)
                 if quantity > 1:
                     st.markdown(f"- {c['name']} — ${c['price']} each × {quantity} = ${c['price'] * quantity} ({c['rating']}V, {c['battery_capacity_ah']}Ah, Charge: {battery_charge_c}C/Discharge: {battery_discharge_c}C, {c['weight']}kg each)")
                 else:
                     st.markdown(f"- {c['name']} — ${c['price']} ({c['rating']}V, {c['battery_capacity_ah']}Ah, Charge: {battery_charge_c}C/Discharge: {battery_discharge_c}C, {c['weight']}kg)")
-            elif "Controller" in c['name']:
+            elif c['role'] is Role.CONTROLLER:
                 if quantity > 1:
                     st.markdown(f"- {c['name']} — ${c['price']} each × {quantity} = ${c['price'] * quantity} ({c['rating']}V, {c['power_rating']}W, {c['max_current']}A, {c['weight']}kg each)")
                 else:
                     st.markdown(f"- {c['name']} — ${c['price']} ({c['rating']}V, {c['power_rating']}W, {c['max_current']}A, {c['weight']}kg)")
-            elif "Solar panel" in c['name']:
+            elif c['role'] is Role.SOLAR_PANEL:
                 if quantity > 1:
                     st.markdown(f"- {c['name']} — ${c['price']} each × {quantity} = ${c['price'] * quantity} ({c['rating']}V, {c['power_rating']}Wp, {c['weight']}kg each)")
                 else:
                     st.markdown(f"- {c['name']} — ${c['price']} ({c['rating']}V, {c['power_rating']}Wp, {c['weight']}kg)")
-            elif c['name'] == "Inverter":
+            elif c['role'] is Role.INVERTER:
                 if quantity > 1:
                     st.markdown(f"- {c['name']} — ${c['price']} each × {quantity} = ${c['price'] * quantity} ({c['voltage']}, {c['weight']}kg each)")
                 else:
                     st.markdown(f"- {c['name']} — ${c['price']} ({c['voltage']}, {c['weight']}kg)")
-            elif c.get('is_appliance', False):
+            elif c['role'] is Role.APPLIANCE:
                 if quantity > 1:
                     st.markdown(f"- {c['name']} — ${c['price']} each × {quantity} = ${c['price'] * quantity} ({c['rating']}V {c['voltage']}, {c['power_rating']}W, {c['weight']}kg each)")
                 else:
@@ -564,277 +668,22 @@ if user_components:
 else:
     st.write("No components added.")
 
-total_cost = product_info["price"] + total_component_cost
-total_weight = product_info["weight"] + total_component_weight
+# Running totals kept by the store (no component lines while the section is collapsed)
+total_cost = product_info["price"] + (store.total_cost.value if user_components else 0)
+total_weight = product_info["weight"] + (store.total_weight.value if user_components else 0)
 
 st.markdown(f"### 💰 Total System Cost: ${total_cost}")
 st.markdown(f"### ⚖️ Total System Weight: {total_weight}kg")
 
+profile.lap("summary")
+
 # --- Step 4: Engineering Viability Check ---
 #st.markdown("---")
 #st.subheader("⚙️ Engineering Compatibility Check1")
 
-viable = True
-messages = []
-
-# Get component types for easier checking
-has_battery = any("Battery" in c["name"] for c in user_components)
-has_inverter = any(c["name"] == "Inverter" for c in user_components)
-has_solar_inverter = any(c["name"] == "Solar Inverter" for c in user_components)  # NEW
-has_controller = any("Controller" in c["name"] for c in user_components)
-has_solar_panels = any("Solar panel" in c["name"] for c in user_components)
-has_appliances = any(c.get("is_appliance", False) for c in user_components)
-
-appliances = [c for c in user_components if c.get("is_appliance", False)]
-
-batteries = [c for c in user_components if "Battery" in c["name"]]
-controllers = [c for c in user_components if "Controller" in c["name"]]
-solar_panels = [c for c in user_components if "Solar panel" in c["name"]]
-inverter = next((c for c in user_components if c["name"] == "Inverter"), None)
-solar_inverter = next((c for c in user_components if c["name"] == "Solar Inverter"), None)  # NEW
-# Get all AC loads (product + AC appliances)
-all_ac_loads = []
-
-# Add main product if it's AC
-if product_info["voltage"] == "AC":
-    all_ac_loads.append({
-        "name": product_info["name"],
-        "power": product_info["power_watts"]
-    })
-
-# Add AC appliances from components
-for appliance in appliances:
-    if appliance.get("voltage") == "AC":
-        all_ac_loads.append({
-            "name": appliance["name"],
-            "power": appliance.get("power_rating", 0)
-        })
-
-# Find the biggest single AC load
-biggest_ac_load_power = 0
-biggest_ac_load_name = ""
-for load in all_ac_loads:
-    if load["power"] > biggest_ac_load_power:
-        biggest_ac_load_power = load["power"]
-        biggest_ac_load_name = load["name"]
-
-# Calculate total AC load power
-total_ac_load_power = sum(load["power"] for load in all_ac_loads)
-motor_attachments = [c for c in user_components if c["category"] == "Motor Attachments"]
-cooker_accessories = [c for c in user_components if c["category"] == "Cooker Accessories"]
-#appliances = [c for c in user_components if c.get("is_appliance", False)]
-iceboxes = [c for c in user_components if "icebox" in c["name"].lower()]
-
-# --- System Status Helper Function ---
-def get_system_status(has_battery, has_inverter, has_solar_inverter, has_solar_panels, has_controller, batteries):
-    """Determine system status based on component selection"""
-    
-    # Red: Electrically impossible
-    if not has_battery and not has_solar_panels and not has_solar_inverter:
-        return "red", "❌ No energy source (needs battery, solar panels, or solar inverter)"
-    
-    # Green: Complete solar system with Solar Inverter
-    if has_solar_inverter and has_battery:
-        return "green", "✅ Complete solar system with Solar Inverter (all-in-one unit)"
-    
-    # Green: Complete solar system with traditional setup
-    if has_solar_panels and has_battery:
-        # Check if we have a controller or battery with built-in controller
-        battery_has_controller = any(b.get("includes_controller", False) for b in batteries if "Battery" in b["name"])
-        if has_controller or battery_has_controller:
-            return "green", "✅ Complete solar system with energy source and storage"
-    
-    # Orange: Works conditionally (missing solar panels but has battery+inverter)
-    if has_battery and has_inverter and not has_solar_panels and not has_solar_inverter:
-        return "orange", "⚠️ System will work but needs external energy source (grid/generator) or user-provided solar panels"
-    
-    # Orange: Solar Inverter without battery
-    if has_solar_inverter and not has_battery:
-        return "orange", "⚠️ Solar Inverter needs a battery for energy storage"
-    
-    # Orange: Traditional system without controller
-    if has_battery and not has_solar_inverter:
-        return "orange", "⚠️ System has storage but may need additional components for complete operation"
-    
-    return "red", "❌ Incomplete system configuration"
-
-# --- Rule 1: AC Product with DC Components requires Inverter ---
-# --- Rule 1: AC Product with DC Components requires Inverter ---
-if product_info["voltage"] == "AC" and (has_battery or has_appliances) and not has_inverter and not has_solar_inverter:
-    viable = False
-    messages.append("⚠️ AC product requires either Inverter or Solar Inverter when using DC components like Battery or DC appliances")
-
-
-# --- Rule 2: DC Product should not use Inverter ---
-if product_info["voltage"] == "DC" and has_inverter:
-    viable = False
-    messages.append("⚠️ DC product cannot use Inverter (already DC-compatible)")
-
-# --- Rule 3: Battery requires compatible Controller (unless battery includes one) ---
-# BUT only check this if we have solar panels
-if has_battery and has_solar_panels and not has_controller:
-    battery_with_controller = any(b.get("includes_controller", False) for b in batteries)
-    if not battery_with_controller:
-        viable = False
-        messages.append("⚠️ Solar panels require a Solar Controller when connected to a battery")
-
-# --- Rule 4: Voltage matching between Battery and Controllers ---
-for battery in batteries:
-    for controller in controllers:
-        if controller.get("includes_controller", False):
-            continue  # Skip if controller is included with battery
-            
-        try:
-            if "Beast" in controller["name"]:
-                # Controller Beast is 48V specific
-                battery_rating = float(battery["rating"]) if isinstance(battery["rating"], (int, float, str)) else 0
-                if battery_rating != 51.2:
-                    viable = False
-                    messages.append(f"⚠️ {battery['name']} ({battery['rating']}V) not compatible with {controller['name']} (48V system only)")
-            else:
-                # Other controllers support multiple voltages
-                if isinstance(controller["rating"], str):
-                    controller_voltages = [int(v.strip()) for v in str(controller["rating"]).split(",")]
-                else:
-                    controller_voltages = [int(controller["rating"])]
-                
-                battery_rating = int(battery["rating"]) if isinstance(battery["rating"], (int, float, str)) else 0
-                if battery_rating not in controller_voltages:
-                    viable = False
-                    messages.append(f"⚠️ {battery['name']} ({battery['rating']}V) not compatible with {controller['name']} (supports {controller['rating']}V)")
-        except (ValueError, AttributeError):
-            viable = False
-            messages.append(f"⚠️ Invalid voltage configuration between {battery['name']} and {controller['name']}")
-
-
-# --- Rule 4.5: Voltage matching between Battery and Inverters ---
-for battery in batteries:
-    battery_rating = battery["rating"]
-    
-    # Check with Plain Inverter
-    if inverter:
-        try:
-            # Inverters have a default_rating for their DC input voltage
-            inverter_rating = int(inverter.get("rating", 0))
-            if battery_rating != inverter_rating:
-                viable = False
-                messages.append(f"⚠️ {battery['name']} ({battery_rating}V) not compatible with {inverter['name']} DC input ({inverter_rating}V)")
-        except (ValueError, TypeError):
-            viable = False
-            messages.append(f"⚠️ Voltage configuration error between {battery['name']} and {inverter['name']}")
-    
-    # Check with Solar Inverter
-    if solar_inverter:
-        try:
-            # Solar Inverters also have a default_rating for DC input
-            solar_inverter_rating = int(solar_inverter.get("rating", 0))
-            if battery_rating != solar_inverter_rating:
-                viable = False
-                messages.append(f"⚠️ {battery['name']} ({battery_rating}V) not compatible with {solar_inverter['name']} DC input ({solar_inverter_rating}V)")
-        except (ValueError, TypeError):
-            viable = False
-            messages.append(f"⚠️ Voltage configuration error between {battery['name']} and {solar_inverter['name']}")
-
-
-# --- Rule 5: Total power calculation for appliances ---
-total_appliance_power = sum(float(appliance.get("power_rating", 0)) for appliance in appliances) + product_info["power_watts"]
-if has_controller:
-    for controller in controllers:
-        controller_power = float(controller.get("power_rating", 0))
-        if total_appliance_power > controller_power:
-            viable = False
-            messages.append(f"⚠️ Total appliance power ({total_appliance_power}W) exceeds {controller['name']} max output ({controller_power}W)")
-
-# --- Rule 6: Battery C-rating limits ---
-# --- Rule 6: Battery Charge/Discharge C-rating limits ---
-for battery in batteries:
-    battery_capacity = float(battery.get("battery_capacity", 0))
-    battery_charge_c_rating = float(battery.get("battery_charge_c_rating", 1.0))
-    battery_discharge_c_rating = float(battery.get("battery_discharge_c_rating", 1.0))
-    
-    max_charge_power = battery_capacity * battery_charge_c_rating
-    max_discharge_power = battery_capacity * battery_discharge_c_rating
-    
-    # Check if solar power exceeds battery charge rating
-    if solar_panels:
-        total_solar_power = sum(float(panel.get("power_rating", 0)) for panel in solar_panels)
-        if total_solar_power > max_charge_power:
-            viable = False
-            messages.append(f"⚠️ Total solar power ({total_solar_power}W) exceeds {battery['name']} max charge rate ({max_charge_power:.0f}W)")
-    
-    # Check if total load exceeds battery discharge rating
-    if total_appliance_power > max_discharge_power:
-        viable = False
-        messages.append(f"⚠️ Total load ({total_appliance_power}W) exceeds {battery['name']} max discharge rate ({max_discharge_power:.0f}W)")
-# --- Rule 7: Motor attachment compatibility ---
-if motor_attachments and not any("Mighty Motor" in appliance["name"] for appliance in appliances):
-    viable = False
-    messages.append("⚠️ Motor attachments require a Mighty Motor appliance in the system")
-
-# --- Rule 8: Cooker accessories compatibility ---
-if cooker_accessories and not any("SunPot" in appliance["name"] or "SolarEPC" in appliance["name"] for appliance in appliances):
-    viable = False
-    messages.append("⚠️ Cooker accessories require a SunPot or SolarEPC appliance in the system")
-
-# --- Rule 9: Solar panel compatibility ---
-if solar_panels and controllers:
-    total_solar_power = sum(float(panel.get("power_rating", 0)) for panel in solar_panels)
-    for controller in controllers:
-        controller_power = float(controller.get("power_rating", 0))
-        if total_solar_power > controller_power:
-            viable = False
-            messages.append(f"⚠️ Total solar panel power ({total_solar_power}W) exceeds {controller['name']} max input ({controller_power}W)")
-
 # --- Rule 10: Ice-maker and icebox compatibility ---
-if any("Ice-maker" in appliance["name"] for appliance in appliances) and not iceboxes:
-    st.warning("💡 Consider adding an insulated icebox for optimal ice-maker performance")
-
-# --- Rule 11: Inverter capacity check ---
-if inverter and all_ac_loads:
-    inverter_power = float(inverter.get("power_rating", 0))
-    
-    # Check if inverter can handle the biggest single load
-    if biggest_ac_load_power > inverter_power:
-        viable = False
-        messages.append(f"⚠️ {biggest_ac_load_name} ({biggest_ac_load_power}W) exceeds Inverter capacity ({inverter_power}W)")
-    
-    # Show info about total AC load (not an error, just information)
-    if len(all_ac_loads) > 1:
-        messages.append(f"ℹ️ Total AC load: {total_ac_load_power}W (across {len(all_ac_loads)} devices)")
-
-
-# --- Rule 12: System configuration compatibility ---
-# Check if system uses allowed combinations
-if has_solar_inverter:
-    # Solar Inverter systems
-    if has_inverter:
-        viable = False
-        messages.append("⚠️ Solar Inverter cannot be used with a plain Inverter (redundant)")
-    
-    if has_controller and not any(b.get("includes_controller", False) for b in batteries):
-        messages.append("ℹ️ Note: Solar Inverter includes built-in MPPT controller")
-    
-    if not has_battery:
-        viable = False
-        messages.append("⚠️ Solar Inverter requires a battery for energy storage")
-    
-    # Check if Solar Inverter has enough capacity
-    if solar_inverter and all_ac_loads:
-        solar_inverter_power = float(solar_inverter.get("power_rating", 0))
-        if biggest_ac_load_power > solar_inverter_power:
-            viable = False
-            messages.append(f"⚠️ {biggest_ac_load_name} ({biggest_ac_load_power}W) exceeds Solar Inverter capacity ({solar_inverter_power}W)")
-else:
-    # Traditional systems
-    # Traditional systems
-    if product_info["voltage"] == "AC" and has_battery and not has_inverter and not has_solar_inverter:
-        viable = False
-        messages.append("⚠️ AC system requires either Inverter or Solar Inverter with battery") 
-
-
-    if has_solar_panels and has_battery and not has_controller and not any(b.get("includes_controller", False) for b in batteries):
-        viable = False
-        messages.append("⚠️ Solar panels with battery require a Solar Controller")
+for warning in result.warnings:
+    st.warning(warning)
 
 
 # --- Step 5: System Status Display ---
@@ -842,31 +691,20 @@ st.markdown("---")
 st.subheader("🔋 System Status Check")
 
 if user_components:
-    # Determine system status
-    # Determine system status
-    status_color, status_message = get_system_status(
-        has_battery, 
-        has_inverter, 
-        has_solar_inverter,  # ADD THIS
-        has_solar_panels, 
-        has_controller,
-        batteries
-    )
-    
     # Display status with appropriate color
-    if status_color == "green":
-        st.success(status_message)
-    elif status_color == "orange":
-        st.warning(status_message)
+    if result.status_color == "green":
+        st.success(result.status_message)
+    elif result.status_color == "orange":
+        st.warning(result.status_message)
     else:  # red
-        st.error(status_message)
+        st.error(result.status_message)
     
     # --- Engineering Compatibility Check ---
     st.subheader("⚙️ Engineering Compatibility Check")
     
-    if not viable:
+    if not result.viable:
         st.error("❌ Incompatible system configuration detected:")
-        for msg in messages:
+        for msg in result.messages:
             st.markdown(f"- {msg}")
     else:
         st.success("✅ System components are electrically compatible.")
@@ -876,6 +714,8 @@ else:
 
 
 
+profile.lap("status")
+
 # --- Additional System Summary ---
 if user_components:
     st.markdown("---")
@@ -884,9 +724,9 @@ if user_components:
     # === ADD THIS NEW CODE BLOCK HERE ===
     # Add energy source indicator
     energy_status = []
-    if has_solar_panels:
+    if index.has(Role.SOLAR_PANEL):
         energy_status.append("✅ Solar panels")
-    if has_battery:
+    if index.has(Role.BATTERY):
         energy_status.append("✅ Battery storage")
     
     if energy_status:
@@ -909,13 +749,13 @@ if user_components:
         if solar_inverter:
             st.write(f"**Type:** All-in-one (Solar → Battery → AC, includes MPPT)")
         
-        if all_ac_loads:
-            st.write(f"**Biggest AC Load:** {biggest_ac_load_name} ({biggest_ac_load_power}W)")
-            st.write(f"**Total AC Load:** {total_ac_load_power}W")
+        if result.all_ac_loads:
+            st.write(f"**Biggest AC Load:** {result.biggest_ac_load_name} ({result.biggest_ac_load_power}W)")
+            st.write(f"**Total AC Load:** {result.total_ac_load_power}W")
             
             # Calculate inverter utilization
-            if biggest_ac_load_power > 0:
-                utilization = (biggest_ac_load_power / inverter_power) * 100
+            if result.biggest_ac_load_power > 0:
+                utilization = (result.biggest_ac_load_power / inverter_power) * 100
                 if utilization <= 100:
                     st.write(f"**{inverter_type} Utilization:** {utilization:.1f}% of capacity")
                 else:
@@ -924,121 +764,160 @@ if user_components:
     st.markdown("")  # Add spacing
     # === END OF NEW CODE ===
     
-    system_limits = {}
-    
-    system_limits = {}
-    
-    if solar_panels:
-        total_solar_power = sum(float(panel.get("power_rating", 0)) for panel in solar_panels)
-        system_limits["Total Solar Power"] = f"{total_solar_power}Wp"
-    
-    if controllers:
-        total_controller_power = sum(float(c.get("power_rating", 0)) for c in controllers)
-        system_limits["Total Controller Capacity"] = f"{total_controller_power}W"
-    
-    if batteries:
-        total_battery_capacity = sum(float(b.get("battery_capacity", 0)) for b in batteries)
-        
-        # Calculate max charge and discharge power
-        max_charge_power = sum(float(b.get("battery_capacity", 0)) * float(b.get("battery_charge_c_rating", 1.0)) for b in batteries)
-        max_discharge_power = sum(float(b.get("battery_capacity", 0)) * float(b.get("battery_discharge_c_rating", 1.0)) for b in batteries)
-        
-        system_limits["Total Battery Capacity"] = f"{total_battery_capacity}Wh"
-        system_limits["Battery Voltage"] = f"{batteries[0]['rating']}V"  # ADD THIS - assumes all batteries same voltage
-        system_limits["Max Solar Input"] = f"{max_charge_power:.0f}W"
-        system_limits["Max Load Output"] = f"{max_discharge_power:.0f}W"
-    
-    if appliances:
-        total_appliance_power = sum(float(appliance.get("power_rating", 0)) for appliance in appliances)
-        system_limits["Total Appliance Power"] = f"{total_appliance_power}W"
-    
-    if system_limits:
-        for limit, value in system_limits.items():
+    # Power summary shows appliance-only load when appliances are present
+    total_appliance_power = result.total_appliance_power
+    if index.has(Role.APPLIANCE):
+        total_appliance_power = weighted_sum(index[Role.APPLIANCE], "power_rating")
+
+    if result.system_limits:
+        for limit, value in result.system_limits.items():
             st.write(f"**{limit}:** {value}")
     
     st.write(f"**Main Product Power:** {product_info['power_watts']}W")
     st.write(f"**Total System Load:** {total_appliance_power}W")
     
     # Power utilization calculations
-    if controllers:
-        max_controller_power = max([float(c.get("power_rating", 0)) for c in controllers])
+    if index.has(Role.CONTROLLER):
+        max_controller_power = max([float(c.get("power_rating", 0)) for c in index[Role.CONTROLLER]])
         utilization = (total_appliance_power / max_controller_power) * 100
         st.write(f"**Controller Utilization:** {utilization:.1f}%")
 
+profile.lap("power_summary")
+
 # --- Recommendations ---
 if user_components:
     st.markdown("---")
     st.subheader("💡 Recommendations")
     
-    # Add warning about missing solar panels - NEW CODE
-    if has_battery and has_inverter and not has_solar_panels:
-        st.warning("⚠️ **Important:** This system has no built-in energy source. It requires either:")
-        st.markdown("- User-provided solar panels")
-        st.markdown("- Grid connection (not yet modeled)")
-        st.markdown("- Generator input (not yet modeled)")
-        st.markdown("")  # Add spacing
-
-
-        # === NEW: Inverter recommendation ===
-    if (inverter or solar_inverter) and all_ac_loads:
-        selected_inverter = inverter if inverter else solar_inverter
-        inverter_type = "Solar Inverter" if solar_inverter else "Inverter"
-        inverter_power = float(selected_inverter.get("power_rating", 0))
-        
-        # Check if inverter is near capacity
-        if biggest_ac_load_power > inverter_power * 0.8:  # If load is more than 80% of inverter capacity
-            st.info(f"🔌 **{inverter_type} sizing:** Your biggest load ({biggest_ac_load_power}W) uses {biggest_ac_load_power/inverter_power*100:.0f}% of {inverter_type.lower()} capacity ({inverter_power}W). Consider upgrading for safety margin.")
-            st.markdown("")  # Add spacing
-        
-        # Check if multiple devices exceed total inverter capacity
-        if len(all_ac_loads) > 1 and total_ac_load_power > inverter_power:
-            st.warning(f"⚠️ **Load management needed:** Total AC load ({total_ac_load_power}W) exceeds {inverter_type.lower()} capacity ({inverter_power}W). Devices cannot run simultaneously.")
-            st.markdown("")  # Add spacing
-    
-    # Solar Inverter specific recommendations
-    if has_solar_inverter:
-        if not has_battery:
-            st.error("❌ **Missing battery:** Solar Inverter requires a battery for energy storage")
-        elif has_controller and not any(b.get("includes_controller", False) for b in batteries):
-            st.info("💡 **Note:** Solar Inverter includes built-in MPPT controller. External controller may not be needed.")
-    
-    # REST OF YOUR EXISTING RECOMMENDATIONS (unchanged)
-    #Commented out to check
-    #if inverter and all_ac_loads:
-        #inverter_power = float(inverter.get("power_rating", 0))
-        
-        # Check if inverter is near capacity
-        #if biggest_ac_load_power > inverter_power * 0.8:  # If load is more than 80% of inverter capacity
-            #st.info(f"🔌 **Inverter sizing:** Your biggest load ({biggest_ac_load_power}W) uses {biggest_ac_load_power/inverter_power*100:.0f}% of inverter capacity ({inverter_power}W). Consider upgrading for safety margin.")
-            #st.markdown("")  # Add spacing
-        
-        # Check if multiple devices exceed total inverter capacity
-        #if len(all_ac_loads) > 1 and total_ac_load_power > inverter_power:
-            #st.warning("⚠️ **Load management needed:** Total AC load ({total_ac_load_power}W) exceeds inverter capacity ({inverter_power}W). Devices cannot run simultaneously.")
-            #st.markdown("")  # Add spacing
+    for kind, text in result.recommendations:
+        getattr(st, kind)(text)
+
+profile.lap("recommendations")
+
+# --- Hourly Simulation ---
+if user_components and st.checkbox("📈 Simulate a year hour by hour", key="simulate_year"):
+    sim_hours = st.number_input("Hours of use per day:", min_value=0.0, max_value=24.0, value=4.0, step=0.5, key="sim_hours")
+    sim_start = st.number_input("Start hour:", min_value=0, max_value=23, value=8, step=1, key="sim_start")
+
+    profile_path = None
+    if PROFILE_DIR and os.path.isdir(PROFILE_DIR):
+        profile_names = sorted(entry.name for entry in os.scandir(PROFILE_DIR) if entry.is_file() and not entry.name.startswith("."))
+        profile_name = st.selectbox("Measured load profile (.npy, .parquet, .csv or raw float32, minute steps):",
+                                    ["None"] + profile_names, key="sim_profile")
+        if profile_name != "None":
+            profile_path = os.path.join(PROFILE_DIR, profile_name)
+
+    model = SystemModel.from_configuration(product_info, user_components)
+    if profile_path and os.path.isfile(profile_path):
+        hourly, measured = get_load_profile(file_key(profile_path))
+        sim_load = hourly_year(hourly)
+        st.write(f"**Measured Peak Load:** {measured.peak_watts:.0f}W (configured {model.load_watts:.0f}W), mean {measured.mean_watts:.0f}W")
+    else:
+        sim_load = daily_load_profile(model.load_watts, sim_hours, sim_start)
+    simulation = simulate(model, clear_sky_irradiance(), sim_load)
+    load_wh = simulation.load_wh
+    served = (1 - simulation.unmet_wh / load_wh) * 100 if load_wh > 0 else 100.0
+
+    st.write(f"**Load Served:** {served:.1f}% of {load_wh / 1000:.0f}kWh per year")
+    st.write(f"**Unmet Load:** {simulation.unmet_wh / 1000:.1f}kWh over {simulation.unmet_hours} hours")
+    st.write(f"**Curtailed Solar:** {simulation.curtailed_wh / 1000:.1f}kWh of {simulation.pv_wh / 1000:.0f}kWh generated")
+    if model.battery_wh > 0:
+        counts, edges = simulation.soc_histogram()
+        st.write("**Battery State of Charge (hours per year):**")
+        st.bar_chart({f"{edges[i] * 100:.0f}-{edges[i + 1] * 100:.0f}%": int(count) for i, count in enumerate(counts)})
+    st.caption("Idealised clear-sky irradiance; the same daily usage every day of the year.")
+
+    # Reliability under real weather, when a local irradiance dataset is configured
+    if IRRADIANCE_PATH and st.button("🎲 Estimate loss-of-load probability", key="estimate_lolp"):
+        with st.spinner("Sampling weather years..."):
+            estimate = loss_of_load_probability(model, sim_load, IRRADIANCE_PATH, workers=SAMPLER_WORKERS,
+                                                executor=get_sampler_pool() if SAMPLER_WORKERS > 1 else None)
+        st.write(f"**Loss-of-Load Probability:** {estimate.lolp * 100:.2f}% of usage hours "
+                 f"({estimate.ci_low * 100:.2f}–{estimate.ci_high * 100:.2f}% at {estimate.confidence:.0%} confidence)")
+        st.write(f"**Years With Any Shortfall:** {estimate.shortfall_year_probability * 100:.0f}% of {estimate.samples} sampled years")
+
+
+profile.lap("simulation")
+
+# --- Automatic System Sizing ---
+st.markdown("---")
+st.subheader("🧮 Automatic System Sizing")
 
+with st.expander("Find the cheapest viable system for this product"):
+    target_runtime = st.number_input("Target runtime at full load (hours):", min_value=0.0, value=4.0, step=0.5, key="sizer_runtime")
+    sun_hours = st.number_input("Peak sun hours to recharge (0 = any solar array):", min_value=0.0, value=DEFAULT_SUN_HOURS, step=0.5, key="sizer_sun_hours")
 
-    if has_battery and not has_controller and not any(b.get("includes_controller", False) for b in batteries):
-        st.info("Consider adding a Solar Controller for better battery charging efficiency")
-    
-    if has_solar_panels and not has_controller and not has_battery:
-        st.info("Solar panels work best with a battery and controller system for energy storage")
-    
-    if motor_attachments and len(motor_attachments) > 1:
-        st.info("Multiple motor attachments selected - ensure they are compatible with each other")
-    
-    if any("Ice-maker" in appliance["name"] for appliance in appliances) and not iceboxes:
-        st.info("Ice-maker works best with an insulated icebox to maintain ice quality")
-    
-    if total_appliance_power > 0 and has_battery:
-        total_battery_capacity = sum(float(b.get("battery_capacity", 0)) for b in batteries)
-        runtime_hours = total_battery_capacity / total_appliance_power
-        st.info(f"Estimated battery runtime: {runtime_hours:.1f} hours at full load")
-    
-    # Cable recommendations
-    cables_count = len([c for c in user_components if c["category"] == "Cables & Mounting"])
-    if solar_panels and cables_count == 0:
-        st.info("Consider adding solar cables and mounting hardware for your solar panels")
-    
-    if batteries and not any("Battery cable" in c["name"] for c in user_components):
-        st.info("Consider adding battery cables for proper battery connections")
\ No newline at end of file
+    # Selected appliances are part of the load; everything else is chosen by the sizer
+    sized = get_sized_system(product_info, target_runtime, index[Role.APPLIANCE], sun_hours or None)
+    if sized is None:
+        st.warning("⚠️ No combination of catalog parts meets this runtime and recharge target while passing all rules")
+    else:
+        for c in sized.components:
+            if c["role"] is not Role.APPLIANCE:
+                st.write(f"- {c['name']} × {c['quantity']} (${c['price'] * c['quantity']})")
+        st.write(f"**Total Cost:** ${sized.total_cost}")
+        st.write(f"**Battery Capacity:** {sized.battery_wh}Wh ({sized.runtime_hours:.1f} hours at full load)")
+        st.write(f"**Solar Power:** {sized.solar_watts}Wp")
+profile.lap("sizing")
+
+# --- Saved Quotes ---
+st.markdown("---")
+st.subheader("💾 Saved Quotes")
+
+quotes = get_quote_store()
+with st.expander("🧭 Similar validated quotes"):
+    nearest = get_similar_quotes().nearest(configuration_features(product_info, user_components), k=SIMILAR_RESULTS)
+    if nearest:
+        st.caption("Viable saved quotes closest to this configuration by load, solar Wp, battery Wh, "
+                   "inverter capacity and voltage (distance 0 = the same sizes)")
+        for quote_id, distance in nearest:
+            row = quotes.get(quote_id)
+            if row is None:  # deleted since the index saw it
+                continue
+            column, button = st.columns([4, 1])
+            column.write(f"#{quote_id} {row['reference'] or ''} — {row['product']}, ${row['total_cost']:g} "
+                         f"(distance {distance:.2f})")
+            button.button("📂 Load", key=f"load_similar_{quote_id}", on_click=load_quote, args=(quote_id,))
+    else:
+        st.info("No viable quotes have been saved yet")
+
+with st.expander("Save this configuration or load a saved quote"):
+    reference = st.text_input("Quote reference (optional):", key="quote_reference")
+    if st.button("💾 Save quote", key="save_quote"):
+        saved_store = store if user_components else ConfigStore(catalog)
+        quote_id = quotes.save(quote_from_ui(product_info, saved_store, reference.strip() or None))
+        st.success(f"✅ Saved as quote #{quote_id}")
+
+    st.markdown("**Find a saved quote**")
+    find_product = st.selectbox("Product:", ["Any"] + product_names, key="find_product")
+    find_sku = st.text_input("Contains SKU (code or name):", key="find_sku")
+    find_max_cost = st.number_input("Maximum total cost ($, 0 = any):", min_value=0, value=0, step=100, key="find_max_cost")
+    find_order = st.radio("Sort by:", ["Newest", "Cheapest"], horizontal=True, key="find_order")
+    filters = {
+        "product": None if find_product == "Any" else find_product,
+        "sku": find_sku.strip() or None,
+        "max_cost": find_max_cost or None,
+    }
+    found = quotes.find(order="recent" if find_order == "Newest" else "cost", limit=QUOTE_RESULTS, **filters)
+    if found:
+        st.dataframe([{"quote": row["id"], "reference": row["reference"], "product": row["product"],
+                       "total cost ($)": row["total_cost"], "viable": bool(row["viable"])} for row in found],
+                     hide_index=True)
+        labels = {row["id"]: f"#{row['id']} {row['reference'] or ''} — {row['product']}, ${row['total_cost']:g}" for row in found}
+        st.selectbox("Quote to load:", list(labels), format_func=labels.get, key="load_quote_id")
+        st.button("📂 Load into the configurator", key="load_quote", on_click=on_load_quote, args=("load_quote_id",))
+    else:
+        st.info("No saved quotes match these filters")
+    st.download_button("⬇️ Export matching quotes (JSONL)", data=lambda: export_quotes(filters),
+                       file_name="quotes.jsonl", mime="application/x-ndjson", on_click="ignore", key="export_quotes")
+profile.lap("quotes")
+
+# --- Debug panel ---
+profile.finish()
+if show_profile:
+    with st.expander("🛠️ Debug: stage timings for this rerun"):
+        st.table(profile.rows())
+        st.caption("Wall time and net allocated memory blocks per section since the previous one. "
+                   "Run with PYTHONTRACEMALLOC=1 to add peak memory per section.")
+        st.download_button("Download Prometheus metrics", REGISTRY.prometheus(),
+                           file_name="solarcomp_metrics.prom", mime="text/plain", key="download_metrics")
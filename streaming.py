@@ -0,0 +1,302 @@
+"""Streaming validation of large quote uploads over HTTP, with asyncio.
+
+POST /validate/stream (or PUT, as ``curl -T`` sends) takes a whole quote
+file as the request body: JSONL by default, CSV with ``?format=csv`` or a
+``text/csv`` Content-Type, in the formats batch.py reads (one record per
+line). The body may be sent with
+Content-Length or chunked transfer encoding. Result rows come back as NDJSON
+in a chunked response, in input order, as each group of quotes finishes.
+
+The body is read a block at a time and cut into groups of quotes, which are
+validated on a process pool. Groups start at one quote and double up to
+--group-size. The first result therefore arrives after a single validation
+whatever the file size, while later groups amortise the trip to the pool. At
+most --max-in-flight groups are queued or running. While that window is full
+the upload is not read, and TCP flow control holds the client back, so
+server memory stays flat however large the file is.
+
+Usage::
+
+    python streaming.py --port 8001 --workers 2
+    curl -sN -T quote_book.jsonl http://127.0.0.1:8001/validate/stream
+    curl -sN -T orders.csv -H "Content-Type: text/csv" http://127.0.0.1:8001/validate/stream
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from batch import quote_id, read_quote_line, read_quotes, validate_quote
+from catalog import load_catalog
+
+READ_BLOCK = 1 << 16
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+def _validate_record(quote, catalog):
+    """validate_quote(), with anything it lets through (a bug) reported as the quote's error row"""
+    try:
+        return validate_quote(quote, catalog)
+    except Exception as exc:
+        return {"quote_id": quote_id(quote), "error": f"Internal error: {exc}"}
+
+
+def _validate_group(fmt, header, records):
+    """Executor entry point: NDJSON result lines for one group of raw records
+
+    JSONL records are (line_number, line) pairs; CSV records are raw lines that
+    parse under header.
+    """
+    catalog = load_catalog()
+    if fmt == "csv":
+        quotes = read_quotes(itertools.chain((header,), records), "csv")
+    else:
+        quotes = (read_quote_line(line, line_number) for line_number, line in records)
+    # Every quote gets a row, an error row when it cannot be built or validated, so one bad
+    # quote never cuts the stream short
+    return _ndjson([_validate_record(quote, catalog) for quote in quotes])
+
+
+def _group_error(fmt, header, records, exc):
+    """NDJSON error rows for a group whose task failed as a whole, one per quote as far as they can be told apart"""
+    error = f"Internal error: {exc}"
+    if fmt != "csv":
+        return _ndjson({"quote_id": quote_id(read_quote_line(line, line_number)), "error": error}
+                       for line_number, line in records)
+    fields = next(csv.reader([header]), [])
+    key = fields.index("quote_id") if "quote_id" in fields else None
+    cells = (next(csv.reader([line]), []) for line in records)
+    ids = (row[key] if key is not None and key < len(row) else "" for row in cells)
+    return _ndjson({"quote_id": ident, "error": error} for ident, _ in itertools.groupby(ids))
+
+
+# --- Request body ---
+
+async def _sized_body(reader, length):
+    while length > 0:
+        block = await reader.read(min(READ_BLOCK, length))
+        if not block:
+            raise ConnectionError("upload ended before Content-Length bytes")
+        length -= len(block)
+        yield block
+
+
+async def _chunked_body(reader):
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # trailers
+            return
+        while size > 0:
+            block = await reader.read(min(READ_BLOCK, size))
+            if not block:
+                raise ConnectionError("upload ended inside a chunk")
+            size -= len(block)
+            yield block
+        await reader.readline()
+
+
+def _body(reader, headers):
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        return _chunked_body(reader)
+    return _sized_body(reader, int(headers.get("content-length") or 0))
+
+
+async def _lines(blocks):
+    """Text lines (with their newline) from a stream of byte blocks"""
+    tail = b""
+    async for block in blocks:
+        lines = (tail + block).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
+    if tail:
+        yield tail.decode("utf-8")
+
+
+async def _groups(lines, fmt, group_size):
+    """(header, records) groups of 1, 2, 4, ... up to group_size quotes, never splitting a CSV quote"""
+    target = 1
+    records = []
+    quotes = 0
+    if fmt == "csv":
+        header = None
+        key = None
+        previous = object()
+        async for line in lines:
+            if header is None:
+                header = line
+                fields = next(csv.reader([line]), [])
+                key = fields.index("quote_id") if "quote_id" in fields else None
+                continue
+            if not line.strip():
+                continue
+            cells = next(csv.reader([line]), [])
+            quote_id = cells[key] if key is not None and key < len(cells) else ""
+            if quote_id != previous:
+                if quotes >= target:
+                    yield header, records
+                    records, quotes, target = [], 0, min(target * 2, group_size)
+                quotes += 1
+                previous = quote_id
+            records.append(line)
+    else:
+        header = None
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            records.append((line_number, line))
+            quotes += 1
+            if quotes >= target:
+                yield header, records
+                records, quotes, target = [], 0, min(target * 2, group_size)
+    if records:
+        yield header, records
+
+
+# --- Response ---
+
+async def _send_chunk(writer, data):
+    if data:
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await writer.drain()
+
+
+def _send_json(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+
+
+async def stream_validation(blocks, fmt, writer, executor, group_size=256, max_in_flight=8):
+    """Validate an uploaded quote file block by block, writing NDJSON chunks to writer in input order"""
+    loop = asyncio.get_running_loop()
+    window = asyncio.Semaphore(max_in_flight)
+    pending = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for header, records in _groups(_lines(blocks), fmt, group_size):
+                await window.acquire()  # full window: stop reading the upload
+                future = loop.run_in_executor(executor, _validate_group, fmt, header, records)
+                pending.put_nowait((future, header, records))
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (task := await pending.get()) is not None:
+            future, header, records = task
+            try:
+                data = await future
+            except Exception as exc:  # e.g. a worker died: the group's quotes still get rows
+                data = _group_error(fmt, header, records, exc)
+            await _send_chunk(writer, data)
+            window.release()
+        await producer  # re-raise a failed upload
+    finally:
+        producer.cancel()
+
+
+class StreamingServer:
+    """asyncio HTTP/1.1 server for /validate/stream with a pre-warmed process pool"""
+
+    def __init__(self, workers=1, group_size=256, max_in_flight=8):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=load_catalog)
+        # Start every worker and load its catalog before the first upload arrives
+        for future in [self.executor.submit(load_catalog) for _ in range(workers)]:
+            future.result()
+        self.group_size = group_size
+        self.max_in_flight = max_in_flight
+
+    async def handle(self, reader, writer):
+        try:
+            while await self._request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _request(self, reader, writer):
+        """Serve one request; True when the connection stays open for another"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return False
+        method, target, version = request_line.decode("latin-1").split()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        url = urlsplit(target)
+
+        if method == "GET" and url.path == "/health":
+            _send_json(writer, "200 OK", {"status": "ok", "pid": os.getpid()}, keep_alive)
+        elif method in ("POST", "PUT") and url.path == "/validate/stream":
+            fmt = parse_qs(url.query).get("format", [None])[0]
+            if fmt is None:
+                fmt = "csv" if headers.get("content-type", "").startswith("text/csv") else "jsonl"
+            if fmt not in ("csv", "jsonl"):
+                _send_json(writer, "400 Bad Request", {"error": f"Unknown quote format: {fmt}"}, False)
+                return False
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"
+                         + (b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n"))
+            try:
+                await stream_validation(_body(reader, headers), fmt, writer, self.executor,
+                                        self.group_size, self.max_in_flight)
+            except (ValueError, UnicodeDecodeError) as exc:
+                # Headers are already sent; report the failure as a last row and end the stream
+                await _send_chunk(writer, _ndjson([{"error": f"Invalid upload: {exc}"}]))
+                keep_alive = False
+            finally:
+                writer.write(b"0\r\n\r\n")  # the response always ends, whatever cut it short
+        else:
+            async for _ in _body(reader, headers):
+                pass  # drain so the connection can be reused
+            _send_json(writer, "404 Not Found", {"error": f"Unknown path: {url.path}"}, keep_alive)
+        await writer.drain()
+        return keep_alive
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Streaming on http://{host}:{port}/validate/stream", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream validation results for large quote uploads over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1, help="validation processes; 0 means one per CPU (default: 1)")
+    parser.add_argument("--group-size", type=int, default=256, help="largest number of quotes per pool task")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="pool tasks queued or running per upload")
+    args = parser.parse_args(argv)
+
+    server = StreamingServer(args.workers or os.cpu_count() or 1, args.group_size, args.max_in_flight)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
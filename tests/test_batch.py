@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from batch import read_quotes, validate_quotes, write_results
+
+GOOD = {"quote_id": "good", "product": {"name": "Custom Product"},
+        "components": [{"name": "CBA20001 - Battery 5kWh"}, {"name": "CSC04001 - Controller Pod"},
+                       {"name": "CSP12501 - Solar panel 125W", "quantity": 2}]}
+
+BAD = [
+    {"quote_id": "unknown product", "product": {"name": "Nope"}, "components": []},
+    {"quote_id": "unknown component", "product": {"name": "Rice Mill"}, "components": [{"name": "Nope"}]},
+    {"quote_id": "components not a list", "product": {"name": "Rice Mill"}, "components": {"name": "Inverter"}},
+    {"quote_id": "zero quantity", "product": {"name": "Rice Mill"}, "components": [{"name": "Inverter", "quantity": 0}]},
+    {"quote_id": "float quantity", "product": {"name": "Rice Mill"}, "components": [{"name": "Inverter", "quantity": 1.5}]},
+    {"quote_id": "text power", "product": {"name": "Rice Mill", "power_watts": "lots"}, "components": []},
+    {"quote_id": "bool price", "product": {"name": "Rice Mill", "price": True}, "components": []},
+    {"quote_id": "no product"},
+    ["not", "an", "object"],
+]
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_bad_quotes_become_error_rows(vectorized):
+    quotes = [GOOD] + BAD + [GOOD]
+    rows = list(validate_quotes(quotes, vectorized=vectorized, chunk_size=4))
+    assert len(rows) == len(quotes)
+    assert [row["quote_id"] for row in rows[1:-1]] == [quote_id for quote_id in
+                                                       (q["quote_id"] if isinstance(q, dict) else None for q in BAD)]
+    assert all(row.get("error") for row in rows[1:-1])
+    assert rows[0] == rows[-1]
+    assert "error" not in rows[-1] and rows[-1]["viable"] is True
+
+
+def test_invalid_jsonl_lines_become_error_rows():
+    stream = io.StringIO('{"product": {"name": "Rice Mill"}}\n{not json\n[1, 2]\n\n{"product": {"name": "Rice Mill"}}\n')
+    rows = list(validate_quotes(read_quotes(stream, "jsonl")))
+    assert [row["quote_id"] for row in rows] == ["1", "2", "3", "5"]
+    assert [bool(row.get("error")) for row in rows] == [False, True, True, False]
+
+
+def test_error_rows_write_as_csv_and_jsonl():
+    rows = list(validate_quotes([GOOD] + BAD))
+    for fmt in ("csv", "jsonl"):
+        out = io.StringIO()
+        assert write_results(rows, out, fmt) == len(rows)
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+@pytest.mark.parametrize("field, value", [("power_rating", 10 ** 400), ("quantity", 10 ** 400), ("price", float("inf")),
+                                          ("rating", float("nan")), ("quantity", 10 ** 6)])
+def test_out_of_range_numbers_become_error_rows(vectorized, field, value):
+    bad = {"quote_id": "bad", "product": {"name": "Custom Product"},
+           "components": [dict(GOOD["components"][2], **{field: value})]}
+    rows = list(validate_quotes([GOOD, bad, GOOD], vectorized=vectorized))
+    assert "out of range" in rows[1]["error"] or "quantity must be" in rows[1]["error"]
+    assert rows[0] == rows[2] and rows[2]["viable"] is True
+
+
+def test_out_of_range_csv_cells_become_error_rows():
+    stream = io.StringIO("quote_id,product,component,quantity,power_rating\n"
+                         f"a,Custom Product,CSP12501 - Solar panel 125W,1,{'9' * 400}\n"
+                         "b,Custom Product,CSP12501 - Solar panel 125W,1,inf\n"
+                         "c,Custom Product,CSP12501 - Solar panel 125W,1,125\n")
+    rows = list(validate_quotes(read_quotes(stream, "csv")))
+    assert [row["quote_id"] for row in rows] == ["a", "b", "c"]
+    assert [bool(row.get("error")) for row in rows] == [True, True, False]
@@ -0,0 +1,39 @@
+import base64
+import json
+import zlib
+
+import pytest
+
+from catalog import load_catalog
+from configstore import MAX_PAYLOAD, ConfigStore
+
+CATALOG = load_catalog()
+BATTERY = "CBA20001 - Battery 5kWh"
+
+
+def encoded(payload):
+    return base64.urlsafe_b64encode(zlib.compress(json.dumps(payload).encode("utf-8"))).decode("ascii").rstrip("=")
+
+
+def test_round_trip():
+    store = ConfigStore(CATALOG)
+    store.select(BATTERY, quantity=3)
+    store.select("CSC04001 - Controller Pod")
+    restored = ConfigStore.decode(CATALOG, store.encode())
+    assert restored.components() == store.components()
+    assert restored.total_cost.value == store.total_cost.value
+
+
+@pytest.mark.parametrize("settings", [{"quantity": 10 ** 400}, {"quantity": 0}, {"price": 10 ** 400},
+                                      {"charge_c_rating": float("inf")}, {"discharge_c_rating": float("nan")},
+                                      {"capacity_ah": -1}])
+def test_out_of_range_settings_are_dropped(settings):
+    store = ConfigStore.decode(CATALOG, encoded({"v": 1, "lines": {BATTERY: settings}}))
+    assert store.settings == {BATTERY: {}}
+    assert store.total_cost.value == CATALOG.components[BATTERY]["base_price"]
+
+
+@pytest.mark.parametrize("text", ["", "not base64!", encoded({"v": 2, "lines": {BATTERY: {}}}), encoded([1, 2]),
+                                  base64.urlsafe_b64encode(zlib.compress(b" " * (MAX_PAYLOAD + 1))).decode("ascii")])
+def test_undecodable_text_gives_an_empty_store(text):
+    assert len(ConfigStore.decode(CATALOG, text)) == 0
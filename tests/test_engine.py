@@ -0,0 +1,164 @@
+import random
+
+import pytest
+
+from catalog import load_catalog
+from engine import (RULE_PLAN, IncrementalValidator, RuleReport, ValidationCache, build_context, canonical_config, make_component,
+                    make_product, validate, validate_cached)
+from vectorized import validate_many
+
+CATALOG = load_catalog()
+
+
+def line(name, **settings):
+    return make_component(name, CATALOG.components[name], **settings)
+
+
+def product(name, **overrides):
+    return make_product(name, CATALOG.products[name], **overrides)
+
+
+def result_fields(result):
+    return (result.viable, result.messages, result.warnings, result.status_color, result.status_message,
+            result.system_limits, result.total_cost, result.total_weight, result.recommendations)
+
+
+# (product, lines) -> (viable, messages, warnings, status_message, total_cost)
+EXPECTED = [
+    (lambda: (product("Rice Mill"), []),
+     (True, [], [], "❌ No energy source (needs battery, solar panels, or solar inverter)", 800)),
+    (lambda: (product("Custom Product"), [line("CBA15001 - Battery 1.5kWh"), line("CSC48401 - Controller Beast"),
+                                          line("CSP32501 - Solar panel 325W", quantity=2)]),
+     (False, ["⚠️ CBA15001 - Battery 1.5kWh (24V) not compatible with CSC48401 - Controller Beast (48V system only)"], [],
+      "✅ Complete solar system with energy source and storage", 820)),
+    (lambda: (product("Rice Mill"), [line("CBA20001 - Battery 5kWh"), line("CSP50001 - Solar panel 500W")]),
+     (False, ["⚠️ AC product requires either Inverter or Solar Inverter when using DC components like Battery or DC appliances",
+              "⚠️ AC system requires either Inverter or Solar Inverter with battery"], [],
+      "✅ Complete solar system with energy source and storage", 1890)),
+    (lambda: (product("Custom Product"), [line("Inverter"), line("CBA75001 - Battery 750Wh")]),
+     (False, ["⚠️ DC product cannot use Inverter (already DC-compatible)"], [],
+      "⚠️ System will work but needs external energy source (grid/generator) or user-provided solar panels", 650)),
+    (lambda: (product("Custom Product"), [line("CGB00101 - Gearbox"), line("CCP00001 - Spare pot 6L"),
+                                          line("CIM00501 - Ice-maker 50kg")]),
+     (False, ["⚠️ Motor attachments require a Mighty Motor appliance in the system",
+              "⚠️ Cooker accessories require a SunPot or SolarEPC appliance in the system"],
+      ["💡 Consider adding an insulated icebox for optimal ice-maker performance"],
+      "❌ No energy source (needs battery, solar panels, or solar inverter)", 1907)),
+    (lambda: (product("Rice Mill"), [line("Solar Inverter"), line("Inverter"), line("CBA20001 - Battery 5kWh", quantity=2)]),
+     (False, ["⚠️ Rice Mill (1500W) exceeds Inverter capacity (500.0W)",
+              "⚠️ Solar Inverter cannot be used with a plain Inverter (redundant)"], [],
+      "✅ Complete solar system with Solar Inverter (all-in-one unit)", 3500)),
+    (lambda: (product("Custom Product"), [line("CBA20001 - Battery 5kWh"), line("CSC04001 - Controller Pod"),
+                                          line("CSP12501 - Solar panel 125W", quantity=2)]),
+     (True, [], [], "✅ Complete solar system with energy source and storage", 1540)),
+]
+
+
+@pytest.mark.parametrize("configuration, expected", EXPECTED)
+def test_validate_reports(configuration, expected):
+    result = validate(*configuration())
+    assert (result.viable, result.messages, result.warnings, result.status_message, result.total_cost) == expected
+
+
+def test_system_limits_keep_rating_format():
+    battery = "CBA75001 - Battery 750Wh"
+    assert validate(product("Custom Product"), [line(battery)]).system_limits["Battery Voltage"] == "24V"
+    assert validate(product("Custom Product"), [line(battery, rating=24.0)]).system_limits["Battery Voltage"] == "24.0V"
+
+
+def random_configurations(count, seed=0):
+    rng = random.Random(seed)
+    names = list(CATALOG.components)
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(0, 8)):
+            settings = {"quantity": rng.randint(1, 3)}
+            if rng.random() < 0.2:
+                settings["rating"] = rng.choice([12, 24, 48, 51.2, "12, 24", "24, 48"])
+            lines.append(line(rng.choice(names), **settings))
+        yield product(rng.choice(list(CATALOG.products)), voltage=rng.choice(["AC", "DC"])), lines
+
+
+def test_rules_run_one_at_a_time_match_validate():
+    for product_info, lines in random_configurations(200, seed=1):
+        ctx = build_context(product_info, lines)
+        report = RuleReport()
+        for rule_id in RULE_PLAN.rule_ids:
+            RULE_PLAN.run_rule(rule_id, ctx, report)
+        result = validate(product_info, lines)
+        assert (report.viable, report.messages, report.warnings) == (result.viable, result.messages, result.warnings)
+        assert RULE_PLAN.viable(ctx) == result.viable
+
+
+def test_vectorized_matches_scalar():
+    configurations = list(random_configurations(300, seed=2))
+    for (product_info, lines), vector in zip(configurations, validate_many(configurations)):
+        assert result_fields(vector) == result_fields(validate(product_info, lines))
+
+
+def test_incremental_matches_validate():
+    rng = random.Random(3)
+    validator = IncrementalValidator()
+    for product_info, lines in random_configurations(100, seed=3):
+        for _ in range(5):
+            if lines:
+                i = rng.randrange(len(lines))
+                lines[i] = dict(lines[i], rating=rng.choice([24, 24.0, 12, "12, 24"]), quantity=rng.randint(1, 3))
+            assert result_fields(validator.validate(product_info, lines)) == result_fields(validate(product_info, lines))
+
+
+def test_changed_input_reruns_dependent_stages():
+    validator = IncrementalValidator()
+    battery = line("CBA75001 - Battery 750Wh")
+    lines = [battery, line("CSC04001 - Controller Pod")]
+    validator.validate(product("Custom Product"), lines)
+    assert not validator.reused
+
+    validator.validate(product("Custom Product"), lines)
+    assert not validator.evaluated
+
+    # A battery rating feeds Rules 4 and 4.5 and the system limits only
+    validator.validate(product("Custom Product"), [dict(battery, rating=12), lines[1]])
+    assert set(validator.evaluated) == {"4", "4.5", "limits"}
+
+    # Same value, different type: still a change
+    validator.validate(product("Custom Product"), [dict(battery, rating=12.0), lines[1]])
+    assert set(validator.evaluated) == {"4", "4.5", "limits"}
+
+    # The product's power feeds the power rules
+    validator.validate(product("Custom Product", power_watts=5000), [dict(battery, rating=12.0), lines[1]])
+    assert {"5", "6"} <= set(validator.evaluated)
+    assert "4" in validator.reused
+
+
+@pytest.mark.parametrize("field, a, b", [("quantity", 1, 1.0), ("rating", "24", 24), ("rating", 24, 24.0), ("rating", 1, True)])
+def test_cache_key_distinguishes_types(field, a, b):
+    base = line("CBA75001 - Battery 750Wh")
+    key_a = canonical_config(product("Custom Product"), [dict(base, **{field: a})])
+    key_b = canonical_config(product("Custom Product"), [dict(base, **{field: b})])
+    assert key_a != key_b
+
+
+def test_cache_key_ignores_line_order_and_accepts_unhashable_values():
+    lines = [line("CBA75001 - Battery 750Wh"), line("CSC04001 - Controller Pod"), line("CSP12501 - Solar panel 125W")]
+    assert canonical_config(product("Rice Mill"), lines) == canonical_config(product("Rice Mill"), lines[::-1])
+    hash(canonical_config(product("Rice Mill"), [dict(lines[0], rating=[12, 24])]))
+
+
+def test_validate_cached_matches_validate():
+    cache = ValidationCache()
+    battery = line("CBA75001 - Battery 750Wh")
+    for rating in (24, 24.0, "24"):
+        lines = [dict(battery, rating=rating), line("CSC04001 - Controller Pod")]
+        assert result_fields(cache.validate(product("Custom Product"), lines)) == result_fields(
+            validate(product("Custom Product"), lines))
+
+
+def test_load_management_counts_appliance_quantities():
+    # One AC appliance line of two units: two devices whose total exceeds the inverter
+    appliance = dict(line("CMM75001 - Mighty Motor 750W", quantity=2), voltage="AC", power_rating=2000)
+    lines = [line("Solar Inverter"), line("CBA20001 - Battery 5kWh"), appliance]
+    result = validate(product("Custom Product"), lines)
+    assert any("Load management needed" in text for _, text in result.recommendations)
+    single = validate(product("Custom Product"), lines[:2] + [dict(appliance, quantity=1)])
+    assert not any("Load management needed" in text for _, text in single.recommendations)
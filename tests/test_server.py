@@ -0,0 +1,58 @@
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from server import ENDPOINTS, LatencyStats, QuoteServer
+
+QUOTE = {"product": "Custom Product", "components": [{"name": "CBA20001 - Battery 5kWh"}, {"name": "CSC04001 - Controller Pod"}]}
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = QuoteServer(("127.0.0.1", 0), LatencyStats(ENDPOINTS, 1), max_body=4096)
+    server.warm()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def raw_post(server, content_length, body=b""):
+    """Status line and JSON body of a POST /validate sent with a literal Content-Length header"""
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(b"POST /validate HTTP/1.1\r\nHost: x\r\nContent-Length: %s\r\n\r\n" % content_length + body)
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        return response.status, json.loads(response.read()), response.getheader("Connection")
+
+
+def test_valid_request(server):
+    body = json.dumps(QUOTE).encode("utf-8")
+    status, payload, _ = raw_post(server, b"%d" % len(body), body)
+    assert status == 200 and payload["viable"] is True
+
+
+@pytest.mark.parametrize("content_length", [b"abc", b"-1", b"1.5", b"0x10", b"\xb2"])
+def test_malformed_content_length_gets_400(server, content_length):
+    status, payload, connection = raw_post(server, content_length)
+    assert status == 400 and "Content-Length" in payload["error"]
+    assert connection == "close"
+
+
+def test_oversized_body_gets_413(server):
+    status, payload, connection = raw_post(server, b"%d" % (server.max_body + 1))
+    assert status == 413 and connection == "close"
+
+
+def test_rejected_requests_are_counted(server):
+    before = server.stats.report()["/validate"]["requests"]
+    raw_post(server, b"-1")
+    deadline = time.monotonic() + 5  # the handler records the request after answering it
+    while server.stats.report()["/validate"]["requests"] == before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.stats.report()["/validate"]["requests"] == before + 1
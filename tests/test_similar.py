@@ -0,0 +1,30 @@
+import numpy as np
+
+from similar import KDTree
+
+
+def brute_force(points, point, k):
+    distances = np.sqrt(((points - point) ** 2).sum(axis=1))
+    rows = np.lexsort((np.arange(len(points)), distances))[:k]
+    return distances[rows], rows
+
+
+def test_kdtree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for n, dims in ((1, 3), (10, 2), (500, 5), (2000, 8)):
+        points = rng.normal(size=(n, dims))
+        tree = KDTree(points, leaf_size=8)
+        for _ in range(20):
+            point = rng.normal(size=dims)
+            for k in (1, 5, n):
+                distances, rows = tree.query(point, k=k)
+                expected_distances, expected_rows = brute_force(points, point, min(k, n))
+                np.testing.assert_allclose(distances, expected_distances)
+                assert rows.tolist() == expected_rows.tolist()
+
+
+def test_kdtree_with_duplicate_points():
+    points = np.zeros((30, 3))
+    distances, rows = KDTree(points, leaf_size=4).query(np.ones(3), k=5)
+    np.testing.assert_allclose(distances, np.sqrt(3))
+    assert len(set(rows.tolist())) == 5
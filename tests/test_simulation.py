@@ -0,0 +1,31 @@
+import numpy as np
+
+from simulation import _clamped_prefix
+
+
+def clamped_loop(net, low, high, initial):
+    soc = []
+    level = initial
+    for value in net:
+        level = min(max(level + value, low), high)
+        soc.append(level)
+    return soc
+
+
+def test_clamped_prefix_matches_loop():
+    rng = np.random.default_rng(0)
+    for n in (1, 2, 3, 7, 24, 100, 8760):
+        for _ in range(5):
+            net = rng.normal(0, 0.3, n)
+            low, high = sorted(rng.uniform(0, 1, 2))
+            initial = rng.uniform(low, high)
+            np.testing.assert_allclose(_clamped_prefix(net, low, high, initial), clamped_loop(net, low, high, initial),
+                                       atol=1e-9)
+
+
+def test_clamped_prefix_batches_rows():
+    rng = np.random.default_rng(1)
+    net = rng.normal(0, 0.3, (4, 50))
+    scanned = _clamped_prefix(net, 0.1, 0.9, 0.5)
+    for row, expected in zip(net, scanned):
+        np.testing.assert_allclose(expected, clamped_loop(row, 0.1, 0.9, 0.5), atol=1e-9)
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from catalog import load_catalog
+from engine import make_product
+from sizer import size_system
+
+CATALOG = load_catalog()
+
+
+def product(name):
+    return make_product(name, CATALOG.products[name])
+
+
+@pytest.mark.parametrize("sun_hours", [5, 1])
+def test_infeasible_target_returns_none_quickly(sun_hours):
+    start = time.perf_counter()
+    assert size_system(product("Custom Product"), 500, sun_hours=sun_hours, catalog=CATALOG) is None
+    assert time.perf_counter() - start < 1.0
+
+
+def test_sized_system_is_viable_and_covers_runtime():
+    sized = size_system(product("Custom Product"), 24, catalog=CATALOG)
+    assert sized.result.viable and sized.result.status_color == "green"
+    assert sized.runtime_hours >= 24
+    assert sized.total_cost == 5770
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import streaming
+from streaming import StreamingServer, stream_validation
+
+GOOD = json.dumps({"quote_id": "good", "product": {"name": "Custom Product"},
+                   "components": [{"name": "CBA20001 - Battery 5kWh"}, {"name": "CSC04001 - Controller Pod"}]})
+
+
+class Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FailingExecutor(ThreadPoolExecutor):
+    """Runs tasks in a thread, except the group holding a line with "boom", whose worker 'dies'"""
+
+    def submit(self, fn, *args):
+        if any("boom" in str(record) for record in args[-1]):
+            future = Future()
+            future.set_exception(RuntimeError("worker died"))
+            return future
+        return super().submit(fn, *args)
+
+
+def chunks(data):
+    """Rows of a chunked NDJSON body, and whether the terminating chunk was sent"""
+    rows = []
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line, 16)
+        if size == 0:
+            return rows, data == b"\r\n"
+        rows += [json.loads(line) for line in data[:size].decode("utf-8").splitlines()]
+        data = data[size + 2:]
+    return rows, False
+
+
+async def blocks(text):
+    yield text.encode("utf-8")
+
+
+def run(text, fmt="jsonl", executor=None, group_size=2):
+    writer = Writer()
+    with executor or ThreadPoolExecutor(1) as pool:
+        asyncio.run(stream_validation(blocks(text), fmt, writer, pool, group_size=group_size))
+    return chunks(writer.data + b"0\r\n\r\n")[0]
+
+
+def test_bad_quotes_get_error_rows_in_order():
+    text = "\n".join([GOOD, "{not json", "[" * 100000, '{"quote_id": "q", "product": {"name": "Nope"}}', GOOD])
+    rows = run(text)
+    assert [row["quote_id"] for row in rows] == ["good", "2", "3", "q", "good"]
+    assert [bool(row.get("error")) for row in rows] == [False, True, True, True, False]
+
+
+def test_failed_group_gets_error_rows_and_later_groups_continue():
+    lines = [GOOD, json.dumps({"quote_id": "boom", "product": {"name": "Rice Mill"}}), GOOD, GOOD, GOOD, GOOD]
+    rows = run("\n".join(lines), executor=FailingExecutor(1))
+    # Groups of 1, 2, 2, 1: the second group holds "boom"
+    assert [row["quote_id"] for row in rows] == ["good", "boom", "good", "good", "good", "good"]
+    assert [row.get("error", "") for row in rows][1:3] == ["Internal error: worker died"] * 2
+    assert all("error" not in row for row in rows[3:])
+
+
+def test_failed_csv_group_gets_a_row_per_quote():
+    text = ("quote_id,product,component\n"
+            "a,Custom Product,CBA20001 - Battery 5kWh\n"
+            "boom,Custom Product,CBA20001 - Battery 5kWh\nboom,Custom Product,Inverter\n"
+            "c,Custom Product,CBA20001 - Battery 5kWh\nd,Custom Product,CBA20001 - Battery 5kWh\n")
+    rows = run(text, "csv", FailingExecutor(1))
+    # Groups of 1, 2, 1 quotes: "boom" and "c" share a group
+    assert [row["quote_id"] for row in rows] == ["a", "boom", "c", "d"]
+    assert ["error" in row for row in rows] == [False, True, True, False]
+
+
+def test_response_ends_when_the_upload_is_cut_short():
+    server = object.__new__(StreamingServer)
+    server.executor, server.group_size, server.max_in_flight = ThreadPoolExecutor(1), 2, 2
+    body = (GOOD + "\n").encode("utf-8")
+
+    async def request():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"POST /validate/stream HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (len(body) + 100) + body)
+        reader.feed_eof()
+        writer = Writer()
+        await server.handle(reader, writer)
+        return writer.data
+
+    with server.executor:
+        data = asyncio.run(request())
+    rows, ended = chunks(data.partition(b"\r\n\r\n")[2])
+    assert ended
+    assert [row["quote_id"] for row in rows] == ["good"]
+
+
+def test_group_error_rows_for_jsonl():
+    data = streaming._group_error("jsonl", None, [(1, GOOD), (2, "{bad"), (3, "[]")], RuntimeError("x"))
+    assert [row["quote_id"] for row in map(json.loads, data.decode("utf-8").splitlines())] == ["good", "2", "3"]
@@ -0,0 +1,178 @@
+"""Vectorized evaluation of the arithmetic power rules over batches of configurations.
+
+Rules 5, 6, 9 and 11 only compare totals against ratings, so a batch is laid
+out as columns: one entry per configuration for the totals, plus flat
+controller and battery line arrays tagged with the configuration they belong
+to. Each rule is then a few array comparisons, and Python only runs to format
+the messages of the checks that fail, using the same wording and number
+formatting as engine.RULE_SET.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from engine import RULE_PLAN, RuleReport, build_context, build_result
+
+VECTOR_RULES = ("5", "6", "9", "11")
+
+
+@dataclass
+class ColumnarBatch:
+    """Columnar view of a batch; *_is_float flags keep the scalar path's int/float formatting"""
+    # One entry per configuration
+    total_load: np.ndarray
+    total_load_is_float: np.ndarray
+    total_solar: np.ndarray
+    has_solar: np.ndarray
+    inverter_power: np.ndarray  # NaN when there is no plain Inverter
+    has_ac_load: np.ndarray
+    ac_biggest: np.ndarray
+    ac_biggest_is_float: np.ndarray
+    ac_biggest_name: np.ndarray
+    ac_total: np.ndarray
+    ac_total_is_float: np.ndarray
+    ac_count: np.ndarray
+
+    # One entry per controller line
+    controller_row: np.ndarray
+    controller_power: np.ndarray
+    controller_name: np.ndarray
+
+    # One entry per battery line
+    battery_row: np.ndarray
+    battery_capacity: np.ndarray
+    battery_charge_c: np.ndarray
+    battery_discharge_c: np.ndarray
+    battery_name: np.ndarray
+
+    @property
+    def rows(self):
+        return len(self.total_load)
+
+    @classmethod
+    def from_contexts(cls, contexts):
+        """Lay out engine.SystemContext objects as columns"""
+        totals = []
+        controllers = []
+        batteries = []
+        for row, ctx in enumerate(contexts):
+            inverter_power = float(ctx.inverter.get("power_rating", 0)) if ctx.inverter else np.nan
+            totals.append((
+                ctx.total_appliance_power, ctx.total_solar_power, bool(ctx.solar_panels), inverter_power,
+                bool(ctx.all_ac_loads), ctx.biggest_ac_load_power, ctx.biggest_ac_load_name,
+                ctx.total_ac_load_power, ctx.ac_device_count,
+            ))
+            for controller in ctx.controllers:
+                controllers.append((row, float(controller.get("power_rating", 0)), controller["name"]))
+            for battery in ctx.batteries:
+                batteries.append((
+                    row,
+                    float(battery.get("battery_capacity", 0)),
+                    float(battery.get("battery_charge_c_rating", 1.0)),
+                    float(battery.get("battery_discharge_c_rating", 1.0)),
+                    battery["name"],
+                ))
+
+        load, solar, has_solar, inverter, has_ac, biggest, biggest_name, ac_total, ac_count = (
+            list(column) for column in zip(*totals)
+        ) if totals else ([] for _ in range(9))
+        controller_columns = list(zip(*controllers)) or [(), (), ()]
+        battery_columns = list(zip(*batteries)) or [(), (), (), (), ()]
+
+        return cls(
+            total_load=np.array(load, dtype=float),
+            total_load_is_float=np.array([isinstance(v, float) for v in load], dtype=bool),
+            total_solar=np.array(solar, dtype=float),
+            has_solar=np.array(has_solar, dtype=bool),
+            inverter_power=np.array(inverter, dtype=float),
+            has_ac_load=np.array(has_ac, dtype=bool),
+            ac_biggest=np.array(biggest, dtype=float),
+            ac_biggest_is_float=np.array([isinstance(v, float) for v in biggest], dtype=bool),
+            ac_biggest_name=np.array(biggest_name, dtype=object),
+            ac_total=np.array(ac_total, dtype=float),
+            ac_total_is_float=np.array([isinstance(v, float) for v in ac_total], dtype=bool),
+            ac_count=np.array(ac_count, dtype=np.int64),
+            controller_row=np.array(controller_columns[0], dtype=np.int64),
+            controller_power=np.array(controller_columns[1], dtype=float),
+            controller_name=np.array(controller_columns[2], dtype=object),
+            battery_row=np.array(battery_columns[0], dtype=np.int64),
+            battery_capacity=np.array(battery_columns[1], dtype=float),
+            battery_charge_c=np.array(battery_columns[2], dtype=float),
+            battery_discharge_c=np.array(battery_columns[3], dtype=float),
+            battery_name=np.array(battery_columns[4], dtype=object),
+        )
+
+
+def _number(value, is_float):
+    """Format a total the way an f-string formats the scalar path's int or float"""
+    return str(float(value)) if is_float else str(int(value))
+
+
+def evaluate(batch):
+    """Messages of Rules 5, 6, 9 and 11 for every configuration in the batch
+
+    Returns {rule_id: [[(fatal, message), ...] for each row]}.
+    """
+    out = {rule_id: [[] for _ in range(batch.rows)] for rule_id in VECTOR_RULES}
+
+    # --- Rules 5 and 9: totals against each controller ---
+    row = batch.controller_row
+    power = batch.controller_power
+    over_output = batch.total_load[row] > power
+    over_input = batch.has_solar[row] & (batch.total_solar[row] > power)
+    for i in np.flatnonzero(over_output):
+        r = row[i]
+        out["5"][r].append((True, f"⚠️ Total appliance power ({_number(batch.total_load[r], batch.total_load_is_float[r])}W) exceeds {batch.controller_name[i]} max output ({float(power[i])}W)"))
+    for i in np.flatnonzero(over_input):
+        r = row[i]
+        out["9"][r].append((True, f"⚠️ Total solar panel power ({float(batch.total_solar[r])}W) exceeds {batch.controller_name[i]} max input ({float(power[i])}W)"))
+
+    # --- Rule 6: totals against each battery's C-rated charge/discharge power ---
+    row = batch.battery_row
+    max_charge = batch.battery_capacity * batch.battery_charge_c
+    max_discharge = batch.battery_capacity * batch.battery_discharge_c
+    over_charge = batch.has_solar[row] & (batch.total_solar[row] > max_charge)
+    over_discharge = batch.total_load[row] > max_discharge
+    for i in np.flatnonzero(over_charge | over_discharge):
+        r = row[i]
+        if over_charge[i]:
+            out["6"][r].append((True, f"⚠️ Total solar power ({float(batch.total_solar[r])}W) exceeds {batch.battery_name[i]} max charge rate ({max_charge[i]:.0f}W)"))
+        if over_discharge[i]:
+            out["6"][r].append((True, f"⚠️ Total load ({_number(batch.total_load[r], batch.total_load_is_float[r])}W) exceeds {batch.battery_name[i]} max discharge rate ({max_discharge[i]:.0f}W)"))
+
+    # --- Rule 11: biggest AC load against the plain Inverter ---
+    checked = ~np.isnan(batch.inverter_power) & batch.has_ac_load
+    overloaded = checked & (batch.ac_biggest > batch.inverter_power)
+    several = checked & (batch.ac_count > 1)
+    for r in np.flatnonzero(overloaded | several):
+        if overloaded[r]:
+            out["11"][r].append((True, f"⚠️ {batch.ac_biggest_name[r]} ({_number(batch.ac_biggest[r], batch.ac_biggest_is_float[r])}W) exceeds Inverter capacity ({float(batch.inverter_power[r])}W)"))
+        if several[r]:
+            out["11"][r].append((False, f"ℹ️ Total AC load: {_number(batch.ac_total[r], batch.ac_total_is_float[r])}W (across {int(batch.ac_count[r])} devices)"))
+
+    return out
+
+
+def validate_many(configurations):
+    """engine.validate over (product_info, components) pairs, with Rules 5, 6, 9 and 11 vectorized
+
+    Results are identical to calling engine.validate on each pair.
+    """
+    contexts = [build_context(product_info, components) for product_info, components in configurations]
+    vector = evaluate(ColumnarBatch.from_contexts(contexts))
+
+    results = []
+    for row, ctx in enumerate(contexts):
+        report = RuleReport()
+        for rule_id in RULE_PLAN.rule_ids:
+            if rule_id in vector:
+                for fatal, message in vector[rule_id][row]:
+                    if fatal:
+                        report.fail(message)
+                    else:
+                        report.info(message)
+            else:
+                RULE_PLAN.run_rule(rule_id, ctx, report)
+        results.append(build_result(ctx, report))
+    return results